@@ -8,12 +8,14 @@ from firebase_admin import credentials, db, auth
 import cv2
 import sys
 import os
+import threading
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from AdminUtilities.SignUp import sign_up_lecturer, sign_up_student
 from GeneralUtilities.UtilityChecks import check_student_info
 from GeneralUtilities.Detection import FaceRecognitionSystem
+from GeneralUtilities.ModelRegistry import model_registry
 
 # Define a class for the SignUp GUI
 class SignUpApp:
@@ -61,6 +63,10 @@ class SignUpApp:
                   foreground=[('active', 'white'), 
                               ('pressed', 'white')])
 
+        # Face recognition system shared by every uploaded image, its models are
+        # loaded and warmed up in the background
+        self.face_recognition_system = FaceRecognitionSystem()
+        threading.Thread(target=model_registry.warm_up, daemon=True).start()
         
         # Show the role selection frame first
         self.show_role_selection_frame()
@@ -467,8 +473,8 @@ class SignUpApp:
 
         # Process the image to extract embedding
         try:
-            # Load the face recognition system
-            face_recognition_system = FaceRecognitionSystem()
+            # Reuse the face recognition system, the models are only loaded once
+            face_recognition_system = self.face_recognition_system
 
             # Load the image
             image = cv2.imread(self.face_image_path)
@@ -483,8 +489,9 @@ class SignUpApp:
             self.image_preview_label.config(image=display_photo)
             self.image_preview_label.image = display_photo
 
-            # Check if image contains a face
-            faces = face_recognition_system.detect_faces(image)
+            # Check if image contains a face, the context keeps the detector keypoints for alignment
+            context = face_recognition_system.new_frame_context(image)
+            faces = face_recognition_system.detect_faces(image, context=context)
             if faces.size == 0 or len(faces) == 0:
                 messagebox.showwarning("Warning", "No face detected in the image.")
                 return
@@ -495,7 +502,7 @@ class SignUpApp:
                 return
 
             # Align the face
-            aligned_face = face_recognition_system.align_face(image, faces[0])
+            aligned_face = face_recognition_system.align_face(image, faces[0], context=context)
 
             # Check face quality
             if not face_recognition_system.assess_face_quality(aligned_face):
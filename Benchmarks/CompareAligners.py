@@ -0,0 +1,124 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from GeneralUtilities.Detection import FaceRecognitionSystem
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def load_image_set(image_dir):
+    '''Map every person to their sorted image paths, images are laid out as <image_dir>/<person_id>/<image>.'''
+    image_set = {}
+    for person_dir in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        if not os.path.isdir(person_dir):
+            continue
+        paths = sorted(
+            path for path in glob.glob(os.path.join(person_dir, "*"))
+            if path.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        if paths:
+            image_set[os.path.basename(person_dir)] = paths
+    return image_set
+
+
+def align_image(system, path, latencies):
+    '''Detect the largest face of an image and align it, the alignment time is added to latencies.'''
+    image = cv2.imread(path)
+    if image is None:
+        return None
+
+    context = system.new_frame_context(image)
+    faces = system.detect_faces(image, context=context)
+    if len(faces) == 0:
+        return None
+
+    largest = int(np.argmax(faces[:, 2] * faces[:, 3]))
+    start = time.perf_counter()
+    aligned_face = system.align_face(image, faces[largest], context=context, keypoints=context.keypoints[largest])
+    latencies.append(time.perf_counter() - start)
+    return aligned_face
+
+
+def evaluate_aligner(aligner, image_set, enroll_count, threshold):
+    '''Enroll the first images of every person with one aligner and match the others.'''
+    system = FaceRecognitionSystem(aligner=aligner)
+    system.match_threshold = threshold
+    latencies = []
+    skipped = 0
+
+    # Enroll
+    for person_id, paths in image_set.items():
+        aligned_faces = [align_image(system, path, latencies) for path in paths[:enroll_count]]
+        aligned_faces = [face for face in aligned_faces if face is not None]
+        skipped += enroll_count - len(aligned_faces)
+        if aligned_faces:
+            for embedding in system.extract_features_batch(aligned_faces):
+                system.add_to_database(person_id, embedding)
+
+    # Probe
+    probe_ids = []
+    probe_faces = []
+    for person_id, paths in image_set.items():
+        for path in paths[enroll_count:]:
+            aligned_face = align_image(system, path, latencies)
+            if aligned_face is None:
+                skipped += 1
+                continue
+            probe_ids.append(person_id)
+            probe_faces.append(aligned_face)
+
+    results = system.match_faces(system.extract_features_batch(probe_faces), threshold) if probe_faces else []
+    correct = sum(result["match"] == person_id for result, person_id in zip(results, probe_ids))
+    latencies_ms = 1000.0 * np.array(latencies) if latencies else np.zeros(1)
+
+    return {
+        "aligner": aligner,
+        "enrolled_ids": len(system.face_database),
+        "probes": len(probe_ids),
+        "skipped_images": skipped,
+        "accuracy": correct / len(probe_ids) if probe_ids else 0.0,
+        "align_ms_mean": float(latencies_ms.mean()),
+        "align_ms_p50": float(np.percentile(latencies_ms, 50)),
+        "align_ms_p95": float(np.percentile(latencies_ms, 95))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare face aligners on the same image set")
+    parser.add_argument("--images", required=True, help="Image folder laid out as <images>/<person_id>/<image>")
+    parser.add_argument("--enroll", type=int, default=2, help="Images per person used for enrollment")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Match threshold (average cosine distance)")
+    parser.add_argument("--aligners", nargs="+", default=["dlib", "keypoints"], help="Aligners to compare")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    image_set = load_image_set(args.images)
+    if not image_set:
+        print(f"No images found in {args.images}")
+        return
+
+    report = []
+    for aligner in args.aligners:
+        result = evaluate_aligner(aligner, image_set, args.enroll, args.threshold)
+        report.append(result)
+        print(f"{aligner:>10}: accuracy {result['accuracy']:.3f} on {result['probes']} probes, "
+              f"align {result['align_ms_mean']:.2f} ms mean / {result['align_ms_p50']:.2f} p50 / "
+              f"{result['align_ms_p95']:.2f} p95")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
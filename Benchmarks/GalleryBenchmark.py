@@ -0,0 +1,279 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from GeneralUtilities.Detection import FaceRecognitionSystem
+from LecturerUtilities.StudentJSON import AttendanceManager
+
+CLASS_NAME = "Benchmark Class"
+
+
+def git_commit():
+    '''Commit hash of the working tree and whether it has uncommitted changes, None outside a git checkout.'''
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def unit_vectors(rng, count, dim):
+    '''Random unit vectors, like L2-normalized Facenet embeddings.'''
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def synthetic_database(rng, n_ids, dim, max_embeddings):
+    '''Face database of n_ids synthetic students with 1 to max_embeddings embeddings each.'''
+    counts = rng.integers(1, max_embeddings + 1, size=n_ids)
+    vectors = unit_vectors(rng, int(counts.sum()), dim)
+    database = {}
+    start = 0
+    for i, count in enumerate(counts):
+        database[f"student_{i:06d}"] = vectors[start:start + count]
+        start += count
+    return database
+
+
+def synthetic_students(database):
+    '''Students data in the AttendanceManager format, every student enrolled in CLASS_NAME.'''
+    students = {}
+    for student_id, embeddings in database.items():
+        students[student_id] = {
+            "name": f"Student {student_id}",
+            "classes": {CLASS_NAME: [0] * 13},
+            "embedding": embeddings.tolist()
+        }
+    return {
+        "lecturer_info": {"id": "benchmark", "name": "Benchmark", "classes": [CLASS_NAME]},
+        "students": {"Undergraduate": {"General": students}}
+    }
+
+
+def new_system(ann=False):
+    '''Face system for matching only, the keypoint aligner needs no dlib model.'''
+    system = FaceRecognitionSystem(aligner="keypoints")
+    if ann:
+        system.enable_ann_index()
+    return system
+
+
+@contextlib.contextmanager
+def quiet():
+    '''Discard the console output of the benchmarked calls.'''
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def fill_system(system, database):
+    with quiet():
+        for student_id, embeddings in database.items():
+            for embedding in embeddings:
+                system.add_to_database(student_id, embedding)
+        system.refresh_gallery()
+
+
+def best_time(function, *args, repeat=1):
+    '''Best wall time of repeat calls, output of the calls is discarded.'''
+    best = float("inf")
+    with quiet():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(*args)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(function, *args):
+    '''Peak Python and numpy memory allocated by one call, in MB.'''
+    with quiet():
+        tracemalloc.start()
+        try:
+            function(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return peak / 1e6
+
+
+def latency_summary(latencies):
+    latencies_ms = 1000.0 * np.asarray(latencies)
+    return {
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "max_ms": float(latencies_ms.max())
+    }
+
+
+def bench_matching(system, probes, batch_size):
+    '''Per-probe match_face latency and match_faces throughput.'''
+    # First call outside the measurement (gallery and index are already built)
+    system.match_face(probes[0])
+
+    latencies = []
+    for probe in probes:
+        start = time.perf_counter()
+        system.match_face(probe)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, len(probes), batch_size):
+        system.match_faces(probes[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "match_face": latency_summary(latencies),
+        "match_faces": {
+            "batch_size": batch_size,
+            "probes_per_second": len(probes) / elapsed if elapsed > 0 else 0.0
+        }
+    }
+
+
+def bench_storage(system, database, work_dir, repeat, json_limit):
+    '''save_database/load_database time for the binary gallery, and the JSON format on smaller galleries.'''
+    results = {}
+    formats = [("binary", os.path.join(work_dir, "gallery"))]
+    if len(database) <= json_limit:
+        formats.append(("json", os.path.join(work_dir, "gallery.json")))
+
+    for name, path in formats:
+        results[f"save_database_{name}_s"] = best_time(lambda: system.save_database(path, format=name), repeat=repeat)
+        results[f"load_database_{name}_s"] = best_time(lambda: new_system().load_database(path), repeat=repeat)
+        results[f"load_database_{name}_peak_mb"] = peak_memory(lambda: new_system().load_database(path))
+
+    # The binary gallery is memory-mapped, time a first match too so the load is not free on paper
+    def load_and_match():
+        loaded = new_system()
+        loaded.load_database(formats[0][1])
+        loaded.match_faces(next(iter(database.values()))[:1])
+    results["load_binary_and_match_s"] = best_time(load_and_match, repeat=repeat)
+    return results
+
+
+def bench_students_json(database, work_dir, repeat):
+    '''AttendanceManager save/load and load_students_from_json on a synthetic students.json.'''
+    results = {}
+    manager = AttendanceManager(None, None, local_data_path=work_dir)
+    manager.local_students = synthetic_students(database)
+
+    results["save_students_locally_s"] = best_time(manager.save_students_locally, "students.json", repeat=repeat)
+    json_path = os.path.join(work_dir, "students.json")
+    results["students_json_mb"] = os.path.getsize(json_path) / 1e6
+    results["load_local_students_s"] = best_time(manager.load_local_students, "students.json", repeat=repeat)
+    results["load_local_students_peak_mb"] = peak_memory(manager.load_local_students, "students.json")
+
+    cache_dir = os.path.join(work_dir, "cache")
+
+    def load_uncached():
+        new_system().load_students_from_json(json_path, CLASS_NAME, use_cache=False)
+
+    def load_cached():
+        new_system().load_students_from_json(json_path, CLASS_NAME, cache_dir=cache_dir)
+
+    results["load_students_from_json_s"] = best_time(load_uncached, repeat=repeat)
+    results["load_students_from_json_peak_mb"] = peak_memory(load_uncached)
+
+    # The first call writes the class gallery cache, the timed ones read it
+    with quiet():
+        load_cached()
+    results["load_students_from_json_cached_s"] = best_time(load_cached, repeat=repeat)
+    return results
+
+
+def run_size(n_ids, args, rng):
+    print(f"{n_ids} IDs ...", flush=True)
+    database = synthetic_database(rng, n_ids, args.dim, args.max_embeddings)
+    probes = unit_vectors(rng, args.probes, args.dim)
+
+    # Half of the probes are noisy copies of enrolled embeddings, like real recognitions
+    enrolled = np.concatenate(list(database.values()))
+    genuine = enrolled[rng.integers(0, len(enrolled), size=args.probes // 2)]
+    genuine = genuine + 0.3 * unit_vectors(rng, len(genuine), args.dim)
+    probes[:len(genuine)] = genuine / np.linalg.norm(genuine, axis=1, keepdims=True)
+
+    result = {
+        "ids": n_ids,
+        "embeddings": int(len(enrolled)),
+        "gallery_build_s": best_time(lambda: fill_system(new_system(), database))
+    }
+
+    system = new_system()
+    fill_system(system, database)
+    result["exact"] = bench_matching(system, probes, args.batch_size)
+
+    if args.ann:
+        ann_system = new_system(ann=True)
+        fill_system(ann_system, database)
+        result["ann"] = bench_matching(ann_system, probes, args.batch_size)
+        # Recall check of enable_ann_index, matching stays exact when the index falls short
+        result["ann"]["index"] = ann_system.ann_report
+        result["ann"]["active"] = ann_system._ann_active()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        result.update(bench_storage(system, database, work_dir, args.repeat, args.json_max_ids))
+        if n_ids <= args.json_max_ids:
+            result.update(bench_students_json(database, work_dir, args.repeat))
+
+    print(f"  match_face {result['exact']['match_face']['mean_ms']:.3f} ms mean, "
+          f"{result['exact']['match_faces']['probes_per_second']:.0f} probes/s batched, "
+          f"load {result['load_database_binary_s'] * 1000:.1f} ms binary")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gallery matching and storage on synthetic galleries")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000], help="Gallery sizes (IDs)")
+    parser.add_argument("--dim", type=int, default=128, help="Embedding dimension (Facenet: 128)")
+    parser.add_argument("--max-embeddings", type=int, default=5, help="Embeddings per ID, drawn from 1 to this")
+    parser.add_argument("--probes", type=int, default=200, help="Probe embeddings matched per gallery")
+    parser.add_argument("--batch-size", type=int, default=32, help="Probes per match_faces call")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions of the storage benchmarks, the best is kept")
+    parser.add_argument("--json-max-ids", type=int, default=10000, help="Largest gallery for the JSON file benchmarks")
+    parser.add_argument("--ann", action="store_true", help="Also benchmark matching with the approximate index")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic galleries")
+    parser.add_argument("--output", help="Results JSON file, by default Benchmarks/results/gallery-<commit>.json")
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    rng = np.random.default_rng(args.seed)
+
+    report = {
+        "benchmark": "gallery",
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "config": vars(args),
+        "results": [run_size(n_ids, args, rng) for n_ids in args.sizes]
+    }
+
+    output = args.output
+    if output is None:
+        output = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", f"gallery-{(commit or 'unknown')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
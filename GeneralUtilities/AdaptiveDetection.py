@@ -0,0 +1,245 @@
+import numpy as np
+import time
+from typing import Dict, List, Optional, Tuple
+
+from GeneralUtilities.FrameContext import FrameContext
+from GeneralUtilities.Tracking import box_iou
+
+
+class AdaptiveFaceDetector:
+    """
+    Face detection that only spends full resolution where faces are.
+
+    Each frame gets one full-frame YuNet pass at a reduced scale, picked so
+    the smallest recently tracked face is still about ``min_face_pixels``
+    wide in the detector input, plus full-resolution passes on regions
+    around the recently tracked faces for accurate boxes and keypoints.
+    Every ``discovery_interval`` frames a full-resolution full-frame pass
+    looks for new faces too small for the reduced scale.
+
+    The results are merged with non-maximum suppression (region results
+    first) and stored in the frame context like ``detect_faces`` does.
+    Regions are squares of a few fixed sizes (ROI_SIZES), and every size
+    runs on its own private YuNet instance whose input size is set once, so
+    no detector has its input size reconfigured back and forth within a frame.
+    """
+
+    # Detector scales, few levels so the YuNet input size rarely changes
+    SCALES = (0.25, 0.375, 0.5, 0.75, 1.0)
+
+    # Region side lengths, each with its own detector
+    ROI_SIZES = (96, 128, 192, 256, 384, 512, 768)
+
+    def __init__(self,
+                 face_system,
+                 min_face_pixels: int = 40,
+                 idle_scale: float = 0.5,
+                 discovery_interval: int = 15,
+                 roi_margin: float = 0.5,
+                 roi_sizes: Tuple[int, ...] = ROI_SIZES,
+                 max_roi_area: float = 0.5,
+                 nms_threshold: float = 0.3,
+                 frame_detector=None):
+        """
+        Parameters
+        ----------
+        face_system : FaceRecognitionSystem
+            System whose YuNet detector is used
+        min_face_pixels : int, optional
+            Face width the reduced scale keeps in the detector input, by default 40
+        idle_scale : float, optional
+            Full-frame scale when no face is tracked, by default 0.5
+        discovery_interval : int, optional
+            Frames between full-resolution full-frame passes, by default 15
+        roi_margin : float, optional
+            Region margin around a tracked face, relative to its size, by default 0.5
+        roi_sizes : Tuple[int, ...], optional
+            Region side lengths, a region gets the smallest one that holds the
+            face and its margin, by default ROI_SIZES
+        max_roi_area : float, optional
+            Above this share of the frame area, regions are replaced by one
+            full-resolution pass, by default 0.5
+        nms_threshold : float, optional
+            IoU above which two detections are the same face, by default 0.3
+        frame_detector : cv2.FaceDetectorYN, optional
+            YuNet instance for the full-frame passes, by default the face system's
+            shared one. Give each camera its own when several cameras are detected
+            on concurrently
+        """
+        self.face_system = face_system
+        self.min_face_pixels = min_face_pixels
+        self.idle_scale = idle_scale
+        self.discovery_interval = discovery_interval
+        self.roi_margin = roi_margin
+        self.roi_sizes = tuple(sorted(roi_sizes))
+        self.max_roi_area = max_roi_area
+        self.nms_threshold = nms_threshold
+        self.frame_detector = frame_detector
+
+        self.scale = 1.0
+        self.frames = 0
+        self.discovery_frames = 0
+        self.roi_passes = 0
+        self.total_cost = 0.0
+        self._region_detectors: Dict[Tuple[int, int], object] = {}
+
+    def choose_scale(self, tracked_boxes: np.ndarray) -> float:
+        """
+        Smallest scale that keeps the smallest tracked face detectable
+
+        Parameters
+        ----------
+        tracked_boxes : numpy.ndarray
+            (N, 4) boxes of the recently tracked faces
+
+        Returns
+        -------
+        float
+            One of SCALES
+        """
+        if len(tracked_boxes) == 0:
+            return self.idle_scale
+
+        needed = self.min_face_pixels / max(float(np.min(tracked_boxes[:, 2])), 1.0)
+        for scale in self.SCALES:
+            if scale >= needed:
+                return scale
+        return 1.0
+
+    def detect(self,
+               frame: np.ndarray,
+               context: Optional[FrameContext] = None,
+               tracked_boxes: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Detect faces in a frame
+
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            BGR frame
+        context : FrameContext, optional
+            Frame context of frame, receives the boxes, keypoints and scores
+        tracked_boxes : numpy.ndarray, optional
+            (N, 4) boxes of the recently tracked faces, see FaceTracker.recent_boxes
+
+        Returns
+        -------
+        numpy.ndarray
+            Detected face boxes [x, y, width, height], like detect_faces
+        """
+        start = time.perf_counter()
+        if context is None:
+            context = FrameContext(frame)
+        if tracked_boxes is None:
+            tracked_boxes = np.zeros((0, 4))
+
+        height, width = frame.shape[:2]
+        self.frames += 1
+
+        regions = []
+        if self.frames % self.discovery_interval == 0:
+            scale = 1.0
+            self.discovery_frames += 1
+        else:
+            scale = self.choose_scale(tracked_boxes)
+            if scale < 1.0:
+                regions = [self._region(box, width, height) for box in tracked_boxes]
+                region_area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+                if region_area > self.max_roi_area * width * height:
+                    scale, regions = 1.0, []
+        self.scale = scale
+
+        # Full-resolution passes on the regions around tracked faces
+        region_results = []
+        for x0, y0, x1, y1 in regions:
+            detector = self._region_detector((x1 - x0, y1 - y0))
+            results = self.face_system.detect_raw(frame[y0:y1, x0:x1], detector=detector)
+            results[:, 0:14:2] += x0
+            results[:, 1:14:2] += y0
+            region_results.append(results)
+        self.roi_passes += len(regions)
+
+        # Reduced-scale pass on the whole frame
+        frame_results = self.face_system.detect_raw(frame, scale, context, self.frame_detector)
+
+        self.total_cost += scale * scale + sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions) / float(width * height)
+
+        results = non_max_suppression(region_results + [frame_results], self.nms_threshold)
+        faces = self.face_system.store_detections(context, results)
+
+        metrics = self.face_system.metrics
+        if metrics.enabled:
+            metrics.record("adaptive_detect", time.perf_counter() - start)
+            metrics.count_frame(len(faces))
+        return faces
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Detection cost relative to a full-resolution full-frame pass
+
+        Returns
+        -------
+        Dict[str, float]
+            frames, discovery_frames, roi_passes, scale and mean_cost
+        """
+        return {
+            "frames": self.frames,
+            "discovery_frames": self.discovery_frames,
+            "roi_passes": self.roi_passes,
+            "scale": self.scale,
+            "mean_cost": self.total_cost / self.frames if self.frames else 0.0
+        }
+
+    def _region(self, box: np.ndarray, width: int, height: int) -> Tuple[int, int, int, int]:
+        """Square region around a face, of the smallest roi_sizes side that holds it, shifted inside the frame"""
+        x, y, w, h = box[:4]
+        needed = max(w, h) * (1 + 2 * self.roi_margin)
+        side = next((size for size in self.roi_sizes if size >= needed), max(width, height))
+
+        # Frames smaller than the side clip it the same way every time, the size stays fixed per camera
+        region_width = min(side, width)
+        region_height = min(side, height)
+
+        x0 = int(np.clip(x + w / 2 - region_width / 2, 0, width - region_width))
+        y0 = int(np.clip(y + h / 2 - region_height / 2, 0, height - region_height))
+        return x0, y0, x0 + region_width, y0 + region_height
+
+    def _region_detector(self, size: Tuple[int, int]):
+        """Private YuNet instance for regions of one size, created on first use"""
+        detector = self._region_detectors.get(size)
+        if detector is None:
+            detector = self.face_system.registry.create_face_detector(self.face_system.model_path, size)
+            self._region_detectors[size] = detector
+        return detector
+
+
+def non_max_suppression(result_groups: List[np.ndarray], threshold: float = 0.3) -> np.ndarray:
+    """
+    Merge detector results, dropping detections of a face already kept
+
+    Parameters
+    ----------
+    result_groups : List[numpy.ndarray]
+        (N, 15) detector results, earlier groups win over later ones and
+        higher scores win within a group
+    threshold : float, optional
+        IoU above which two detections are the same face, by default 0.3
+
+    Returns
+    -------
+    numpy.ndarray
+        (M, 15) kept results
+    """
+    ordered = [group[np.argsort(-group[:, 14], kind="stable")] for group in result_groups if len(group)]
+    if not ordered:
+        return np.zeros((0, 15), dtype=np.float32)
+
+    results = np.concatenate(ordered, axis=0)
+    iou = box_iou(results[:, :4], results[:, :4])
+
+    keep = []
+    for i in range(results.shape[0]):
+        if not keep or iou[i, keep].max() <= threshold:
+            keep.append(i)
+    return results[keep]
+
@@ -0,0 +1,219 @@
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+from GeneralUtilities.FrameContext import FrameContext
+
+# dlib is only needed by the landmark aligner
+try:
+    import dlib
+except ImportError:
+    dlib = None
+
+
+class FaceAligner:
+    """
+    Base class for face aligners.
+
+    An aligner finds the two eye centers of a detected face, and the face is
+    then rotated, scaled and cropped so the eyes land on fixed positions of
+    the aligned image. Subclasses only implement ``eye_centers``.
+    """
+
+    name = "base"
+    needs_keypoints = False
+
+    def eye_centers(self,
+                    context: FrameContext,
+                    face: np.ndarray,
+                    keypoints: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Eye centers of a face in frame coordinates
+
+        Parameters
+        ----------
+        context : FrameContext
+            Context of the frame containing the face
+        face : numpy.ndarray
+            Face bounding box [x, y, width, height]
+        keypoints : numpy.ndarray, optional
+            (5, 2) detector keypoints of the face
+
+        Returns
+        -------
+        Tuple[numpy.ndarray, numpy.ndarray]
+            Centers of the eye on the left and on the right of the image
+        """
+        raise NotImplementedError
+
+    def align(self,
+              context: FrameContext,
+              face: np.ndarray,
+              keypoints: Optional[np.ndarray] = None,
+              scale_factor: float = 0.27) -> np.ndarray:
+        """
+        Align a detected face based on eye positions
+
+        Parameters
+        ----------
+        context : FrameContext
+            Context of the frame containing the face
+        face : numpy.ndarray
+            Face bounding box [x, y, width, height]
+        keypoints : numpy.ndarray, optional
+            (5, 2) detector keypoints of the face
+        scale_factor : float, optional
+            Distance between the eyes relative to the output width, by default 0.27
+
+        Returns
+        -------
+        numpy.ndarray
+            256x256 aligned face image
+        """
+        left_eye_center, right_eye_center = self.eye_centers(context, face, keypoints)
+        return warp_by_eyes(context.frame, left_eye_center, right_eye_center, scale_factor)
+
+
+class DlibAligner(FaceAligner):
+    """
+    Finds the eyes with the dlib 68-point landmarks predictor
+    """
+
+    name = "dlib"
+
+    def __init__(self, registry, landmarks_path: str):
+        """
+        Parameters
+        ----------
+        registry : ModelRegistry
+            Registry the predictor is loaded from
+        landmarks_path : str
+            Path to the dlib facial landmarks predictor file
+        """
+        if dlib is None:
+            raise ImportError("dlib is required for the dlib aligner")
+        self.registry = registry
+        self.landmarks_path = landmarks_path
+
+    def eye_centers(self, context, face, keypoints=None):
+        # Create dlib rectangle
+        x, y, w, h = face[:4]
+        rect = dlib.rectangle(
+            int(x), int(y),
+            int(x + w), int(y + h)
+        )
+
+        # Detect facial landmarks, only the 12 eye points (36-47) are needed
+        predictor = self.registry.landmark_predictor(self.landmarks_path)
+        shape = predictor(context.gray, rect)
+        eye_points = np.array(
+            [(shape.part(j).x, shape.part(j).y) for j in range(36, 48)]
+        )
+
+        # Calculate eye centers (landmarks 36-41 and 42-47)
+        left_eye_center = np.mean(eye_points[:6], axis=0).astype(int)
+        right_eye_center = np.mean(eye_points[6:], axis=0).astype(int)
+        return left_eye_center, right_eye_center
+
+
+class KeypointAligner(FaceAligner):
+    """
+    Uses the eye keypoints YuNet returns with each detection, no extra model needed
+    """
+
+    name = "keypoints"
+    needs_keypoints = True
+
+    def eye_centers(self, context, face, keypoints=None):
+        if keypoints is None:
+            raise ValueError("Keypoint alignment needs the detector keypoints of the face")
+
+        # YuNet lists the subject's right eye first, which is the eye on the left of the image
+        left_eye_center = np.asarray(keypoints[0]).astype(int)
+        right_eye_center = np.asarray(keypoints[1]).astype(int)
+        return left_eye_center, right_eye_center
+
+
+def warp_by_eyes(img: np.ndarray,
+                 left_eye_center: np.ndarray,
+                 right_eye_center: np.ndarray,
+                 scale_factor: float = 0.27,
+                 size: Tuple[int, int] = (256, 256)) -> np.ndarray:
+    """
+    Rotate, scale and crop an image so the eyes are level at fixed positions
+
+    Parameters
+    ----------
+    img : numpy.ndarray
+        Input image containing the face
+    left_eye_center : numpy.ndarray
+        Center of the eye on the left of the image
+    right_eye_center : numpy.ndarray
+        Center of the eye on the right of the image
+    scale_factor : float, optional
+        Distance between the eyes relative to the output width, by default 0.27
+    size : Tuple[int, int], optional
+        (width, height) of the aligned face, by default (256, 256)
+
+    Returns
+    -------
+    numpy.ndarray
+        Aligned face image
+    """
+    desired_face_width, desired_face_height = size
+
+    # Calculate rotation angle
+    dY = right_eye_center[1] - left_eye_center[1]
+    dX = right_eye_center[0] - left_eye_center[0]
+    angle = np.degrees(np.arctan2(dY, dX))
+
+    # Calculate scale
+    dist = np.sqrt((dX**2) + (dY**2))
+    desired_dist = desired_face_width * scale_factor
+    scale = desired_dist / dist
+
+    # Calculate eye center
+    eyes_center = (
+        int((left_eye_center[0] + right_eye_center[0]) // 2),
+        int((left_eye_center[1] + right_eye_center[1]) // 2),
+    )
+
+    # Get rotation matrix
+    M = cv2.getRotationMatrix2D(eyes_center, angle, scale)
+
+    # Update translation
+    tX = desired_face_width * 0.5
+    tY = desired_face_height * 0.3
+    M[0, 2] += tX - eyes_center[0]
+    M[1, 2] += tY - eyes_center[1]
+
+    # Apply transformation (the cost is set by the output size, not the source frame)
+    return cv2.warpAffine(
+        img, M, (desired_face_width, desired_face_height),
+        flags=cv2.INTER_CUBIC
+    )
+
+
+def create_aligner(name: str, registry, landmarks_path: str) -> FaceAligner:
+    """
+    Build an aligner by name
+
+    Parameters
+    ----------
+    name : str
+        "dlib" (68-point landmarks) or "keypoints" (YuNet keypoints)
+    registry : ModelRegistry
+        Registry models are loaded from
+    landmarks_path : str
+        Path to the dlib facial landmarks predictor file
+
+    Returns
+    -------
+    FaceAligner
+        The aligner
+    """
+    if name == DlibAligner.name:
+        return DlibAligner(registry, landmarks_path)
+    if name == KeypointAligner.name:
+        return KeypointAligner()
+    raise ValueError(f"Unknown aligner '{name}'. Must be one of ['dlib', 'keypoints'].")
@@ -0,0 +1,443 @@
+import cv2
+import numpy as np
+import glob
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def list_images(folder: str) -> List[str]:
+    """Image files of a folder, sorted by name so every run sees the same order"""
+    return sorted(
+        path for path in glob.glob(os.path.join(folder, "*"))
+        if path.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def video_info(path: str) -> Dict[str, float]:
+    """
+    Frame count and frame rate of a video file
+
+    Parameters
+    ----------
+    path : str
+        Video file path
+
+    Returns
+    -------
+    Dict[str, float]
+        "frame_count" and "fps"
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        return {"frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), "fps": fps}
+    finally:
+        cap.release()
+
+
+def sample_step(fps: float, sample_fps: Optional[float]) -> int:
+    """Keep one frame every this many frames to process about sample_fps frames per second"""
+    if not sample_fps or sample_fps <= 0:
+        return 1
+    return max(1, int(round(fps / sample_fps)))
+
+
+def iter_video_frames(path: str,
+                      step: int = 1,
+                      start_frame: int = 0,
+                      end_frame: Optional[int] = None) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Sampled frames of a video
+
+    Frames are sampled on their global index (index % step == 0), so any
+    split of the video into segments samples exactly the same frames.
+    Skipped frames are only grabbed, not decoded.
+
+    Parameters
+    ----------
+    path : str
+        Video file path
+    step : int, optional
+        Keep one frame every step frames, by default 1
+    start_frame : int, optional
+        First frame index, by default 0
+    end_frame : int, optional
+        Frame index to stop before, by default the end of the video
+
+    Yields
+    ------
+    Tuple[int, float, numpy.ndarray]
+        Frame index, time in seconds and BGR frame
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {path}")
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        if start_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        index = start_frame
+        while end_frame is None or index < end_frame:
+            if index % step == 0:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield index, index / fps, frame
+            elif not cap.grab():
+                break
+            index += 1
+    finally:
+        cap.release()
+
+
+def iter_image_frames(paths: List[str], start_index: int = 0) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Images of a folder as frames, the image index is used as the frame time
+
+    Parameters
+    ----------
+    paths : List[str]
+        Image paths
+    start_index : int, optional
+        Index of the first image, by default 0
+
+    Yields
+    ------
+    Tuple[int, float, numpy.ndarray]
+        Image index, image index as time and BGR image
+    """
+    for index, path in enumerate(paths, start_index):
+        frame = cv2.imread(path)
+        if frame is None:
+            print(f"Warning: Cannot read image {path}")
+            continue
+        yield index, float(index), frame
+
+
+class BatchAttendanceProcessor:
+    """
+    Runs FaceRecognitionSystem over recorded frames without a GUI.
+
+    Every sampled frame is detected and recognized with process_detections,
+    and the matches are counted per student. A student counts as present
+    after ``min_observations`` matched frames.
+    """
+
+    def __init__(self, face_system, min_observations: int = 2):
+        """
+        Parameters
+        ----------
+        face_system : FaceRecognitionSystem
+            System with the loaded students of the class
+        min_observations : int, optional
+            Matched frames needed to mark a student present, by default 2
+        """
+        self.face_system = face_system
+        self.min_observations = min_observations
+
+    def process_frames(self, frames: Iterator[Tuple[int, float, np.ndarray]]) -> Dict:
+        """
+        Recognize the faces of every frame
+
+        Parameters
+        ----------
+        frames : Iterator[Tuple[int, float, numpy.ndarray]]
+            (index, time, frame) from iter_video_frames or iter_image_frames
+
+        Returns
+        -------
+        Dict
+            Observations and throughput, see new_result
+        """
+        result = new_result()
+        start = time.perf_counter()
+
+        for index, timestamp, frame in frames:
+            context = self.face_system.new_frame_context(frame)
+            self.face_system.detect_faces(frame, context=context)
+            faces = self.face_system.process_detections(frame, context, threshold=self.face_system.match_threshold)
+
+            result["frames"] += 1
+            result["faces"] += len(faces)
+
+            # One observation per matched ID and frame, with its closest face
+            frame_matches = {}
+            for face in faces:
+                if face["match"] and (face["match"] not in frame_matches or face["distance"] < frame_matches[face["match"]]):
+                    frame_matches[face["match"]] = face["distance"]
+            for ID, distance in frame_matches.items():
+                add_observation(result["observations"], ID, distance, index, timestamp)
+
+        result["elapsed"] = time.perf_counter() - start
+        return result
+
+    def process_source(self, source: str, sample_fps: Optional[float] = 1.0) -> Dict:
+        """
+        Recognize the faces of a video file or an image folder
+
+        Parameters
+        ----------
+        source : str
+            Video file or folder of images
+        sample_fps : float, optional
+            Video frames processed per second of video, None for every frame, by default 1.0
+
+        Returns
+        -------
+        Dict
+            Observations, present students and throughput, see summarize
+        """
+        if os.path.isdir(source):
+            frames = iter_image_frames(list_images(source))
+        else:
+            step = sample_step(video_info(source)["fps"], sample_fps)
+            frames = iter_video_frames(source, step)
+        return summarize(self.process_frames(frames), self.min_observations)
+
+
+def new_result() -> Dict:
+    """
+    Empty processing result
+
+    "observations" maps each matched ID to its matched frame count, best (smallest)
+    distance and first and last matched frame and time.
+    """
+    return {"frames": 0, "faces": 0, "elapsed": 0.0, "observations": {}}
+
+
+def add_observation(observations: Dict, ID: str, distance: float, index: int, timestamp: float) -> None:
+    entry = observations.get(ID)
+    if entry is None:
+        observations[ID] = {
+            "count": 1,
+            "best_distance": distance,
+            "first_frame": index,
+            "first_seen": timestamp,
+            "last_frame": index,
+            "last_seen": timestamp
+        }
+        return
+
+    entry["count"] += 1
+    entry["best_distance"] = min(entry["best_distance"], distance)
+    if index < entry["first_frame"]:
+        entry["first_frame"], entry["first_seen"] = index, timestamp
+    if index > entry["last_frame"]:
+        entry["last_frame"], entry["last_seen"] = index, timestamp
+
+
+def summarize(result: Dict, min_observations: int = 2) -> Dict:
+    """
+    Add the present students and the throughput to a processing result
+
+    Parameters
+    ----------
+    result : Dict
+        Result of process_frames (or a merge of several)
+    min_observations : int, optional
+        Matched frames needed to mark a student present, by default 2
+
+    Returns
+    -------
+    Dict
+        The result with "present" (sorted IDs), "frames_per_second" and "faces_per_second"
+    """
+    elapsed = result["elapsed"]
+
+    # Same key order whatever the order the students were seen in
+    result["observations"] = dict(sorted(result["observations"].items()))
+    result["present"] = sorted(
+        ID for ID, entry in result["observations"].items() if entry["count"] >= min_observations
+    )
+    result["frames_per_second"] = result["frames"] / elapsed if elapsed > 0 else 0.0
+    result["faces_per_second"] = result["faces"] / elapsed if elapsed > 0 else 0.0
+    return result
+
+
+def merge_results(results: List[Dict]) -> Dict:
+    """
+    Merge the results of several segments into one
+
+    Counts are summed, best distances take the minimum and first and last
+    sightings the earliest and latest frame, so the merge gives the same
+    result for any order and any split of the frames.
+
+    Parameters
+    ----------
+    results : List[Dict]
+        Results of process_frames
+
+    Returns
+    -------
+    Dict
+        The merged result, its "elapsed" is the sum of the segment times
+    """
+    merged = new_result()
+    for result in results:
+        merged["frames"] += result["frames"]
+        merged["faces"] += result["faces"]
+        merged["elapsed"] += result["elapsed"]
+        for ID, entry in result["observations"].items():
+            current = merged["observations"].get(ID)
+            if current is None:
+                merged["observations"][ID] = dict(entry)
+                continue
+            current["count"] += entry["count"]
+            current["best_distance"] = min(current["best_distance"], entry["best_distance"])
+            if entry["first_frame"] < current["first_frame"]:
+                current["first_frame"], current["first_seen"] = entry["first_frame"], entry["first_seen"]
+            if entry["last_frame"] > current["last_frame"]:
+                current["last_frame"], current["last_seen"] = entry["last_frame"], entry["last_seen"]
+
+    return merged
+
+
+def split_segments(frame_count: int, segment_frames: int) -> List[Tuple[int, int]]:
+    """
+    Split [0, frame_count) into consecutive (start, end) segments
+
+    The split only depends on the segment length, not on the number of
+    workers, so every worker count processes the same segments.
+    """
+    segment_frames = max(1, segment_frames)
+    return [(start, min(start + segment_frames, frame_count)) for start in range(0, frame_count, segment_frames)]
+
+
+# Processor of a worker process, created once by _init_worker
+_worker_processor = None
+
+
+def _init_worker(config: Dict[str, Any]) -> None:
+    """Load the models and the class students once per worker process"""
+    global _worker_processor
+
+    cv2.setNumThreads(1)
+    from GeneralUtilities.Detection import FaceRecognitionSystem
+
+    face_system = FaceRecognitionSystem(aligner=config["aligner"])
+    face_system.match_threshold = config["threshold"]
+    face_system.load_students_from_json(config["students"], config["class_name"])
+    _worker_processor = BatchAttendanceProcessor(face_system, config["min_observations"])
+
+
+def _process_segment(task: Tuple[int, str, int, Optional[int], int]) -> Tuple[int, Dict]:
+    """Process one segment in a worker, returns (segment index, result)"""
+    segment_index, source, start, end, step = task
+    if os.path.isdir(source):
+        frames = iter_image_frames(list_images(source)[start:end], start)
+    else:
+        frames = iter_video_frames(source, step, start, end)
+    return segment_index, _worker_processor.process_frames(frames)
+
+
+def process_source_parallel(source: str,
+                            students: str,
+                            class_name: str,
+                            workers: int = None,
+                            sample_fps: Optional[float] = 1.0,
+                            segment_seconds: float = 60.0,
+                            min_observations: int = 2,
+                            threshold: float = 0.5,
+                            aligner: str = "dlib") -> Dict:
+    """
+    Recognize the faces of a video file or an image folder with a pool of processes
+
+    The source is split into time segments (or runs of images) that are
+    processed by worker processes. Every worker loads the models and the
+    class once, and the segment results are merged with merge_results,
+    which does not depend on the number of workers.
+
+    Parameters
+    ----------
+    source : str
+        Video file or folder of images
+    students : str
+        Students JSON file, see FaceRecognitionSystem.load_students_from_json
+    class_name : str
+        Class whose students are recognized
+    workers : int, optional
+        Number of worker processes, by default the number of CPUs
+    sample_fps : float, optional
+        Video frames processed per second of video, None for every frame, by default 1.0
+    segment_seconds : float, optional
+        Length of a video segment in seconds (images per segment for folders), by default 60.0
+    min_observations : int, optional
+        Matched frames needed to mark a student present, by default 2
+    threshold : float, optional
+        Match threshold, by default 0.5
+    aligner : str, optional
+        Face aligner, by default "dlib"
+
+    Returns
+    -------
+    Dict
+        Merged result, see summarize, with "elapsed" the wall time, "cpu_elapsed"
+        the summed worker time and "workers" and "segments" counts
+    """
+    workers = workers or os.cpu_count() or 1
+
+    if os.path.isdir(source):
+        step = 1
+        segments = split_segments(len(list_images(source)), int(segment_seconds))
+        if not segments:
+            print(f"Warning: No images found in {source}")
+    else:
+        info = video_info(source)
+        step = sample_step(info["fps"], sample_fps)
+        segments = split_segments(info["frame_count"], int(round(segment_seconds * info["fps"])))
+        if not segments:
+            # Some containers and streams do not report a frame count, read the whole video in one segment
+            print(f"Warning: Frame count of {source} is unknown, processing it as one segment on one worker")
+            segments = [(0, None)]
+
+    config = {
+        "students": students,
+        "class_name": class_name,
+        "threshold": threshold,
+        "aligner": aligner,
+        "min_observations": min_observations
+    }
+    tasks = [(i, source, start, end, step) for i, (start, end) in enumerate(segments)]
+
+    # The video frame count is only an estimate, the last segment reads to the end
+    if tasks and not os.path.isdir(source):
+        tasks[-1] = tasks[-1][:3] + (None, step)
+
+    # One inference thread per worker, the workers already use every core
+    for variable in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ.setdefault(variable, "1")
+
+    start_time = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(min(workers, max(1, len(tasks))), initializer=_init_worker, initargs=(config,)) as pool:
+        segment_results = dict(pool.imap_unordered(_process_segment, tasks))
+    wall_time = time.perf_counter() - start_time
+
+    merged = merge_results([segment_results[i] for i in range(len(tasks))])
+    merged["cpu_elapsed"] = merged["elapsed"]
+    merged["elapsed"] = wall_time
+    merged["workers"] = workers
+    merged["segments"] = len(tasks)
+    return summarize(merged, min_observations)
+
+
+def print_report(result: Dict) -> None:
+    """Print the throughput and the present students of a result"""
+    print(f"Processed {result['frames']} frames and {result['faces']} faces in {result['elapsed']:.1f}s "
+          f"({result['frames_per_second']:.2f} frames/s, {result['faces_per_second']:.2f} faces/s)")
+    if "workers" in result:
+        print(f"Used {result['workers']} workers on {result['segments']} segments, "
+              f"{result['cpu_elapsed']:.1f}s of worker time")
+    print(f"Present: {len(result['present'])} students")
+    for ID in result["present"]:
+        entry = result["observations"][ID]
+        print(f"  {ID}: {entry['count']} frames, best distance {entry['best_distance']:.3f}, "
+              f"first seen at {entry['first_seen']:.1f}")
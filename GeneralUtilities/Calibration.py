@@ -0,0 +1,238 @@
+import json
+import time
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from GeneralUtilities.Gallery import EmbeddingGallery, database_format
+
+# Cosine distances of normalized embeddings lie in [0, 2]
+MAX_DISTANCE = 2.0
+
+
+def load_gallery(path: str, class_name: Optional[str] = None) -> EmbeddingGallery:
+    """
+    Load enrolled embeddings for calibration
+
+    Parameters
+    ----------
+    path : str
+        Students JSON file written by AttendanceManager, JSON database written
+        by FaceRecognitionSystem.save_database, or a binary gallery
+    class_name : str, optional
+        Only use the students enrolled in this class (students JSON only), by default all students
+
+    Returns
+    -------
+    EmbeddingGallery
+        Normalized embeddings grouped by ID
+    """
+    if database_format(path) == "binary":
+        return EmbeddingGallery.load(path, mmap=True)
+
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    if "students" not in data:
+        # FaceRecognitionSystem JSON database, ID -> list of embeddings
+        return EmbeddingGallery.from_database(data)
+
+    database = {}
+    for branches in data["students"].values():
+        for students in branches.values():
+            for student_id, student_info in students.items():
+                if class_name is not None and class_name not in student_info.get("classes", {}):
+                    continue
+                embeddings = student_info.get("embedding", [])
+                if embeddings and all(isinstance(emb, list) for emb in embeddings):
+                    database[student_id] = embeddings
+    return EmbeddingGallery.from_database(database)
+
+
+def score_histograms(gallery: EmbeddingGallery,
+                     bin_width: float = 0.001,
+                     max_block_bytes: int = 64_000_000,
+                     progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Histograms of the genuine and impostor distances of every enrolled embedding
+
+    Every embedding is used as a probe and scored the way match_face scores
+    it, by its average cosine distance to each ID. Its own ID gives a
+    genuine score, computed without the probe itself (leave-one-out, so IDs
+    with a single embedding have none), and every other ID an impostor
+    score. The closest impostor of each probe is kept separately: it is the
+    score an unenrolled person resembling the probe would be matched with.
+
+    The probes are processed in blocks whose similarity matrix fits in
+    max_block_bytes, and the scores go straight into fixed-width
+    histograms, so memory does not grow with the number of distance pairs.
+
+    Parameters
+    ----------
+    gallery : EmbeddingGallery
+        Enrolled embeddings
+    bin_width : float, optional
+        Distance resolution of the histograms, by default 0.001
+    max_block_bytes : int, optional
+        Size of the similarity matrix of one probe block, by default 64 MB
+    progress : Callable[[int, int], None], optional
+        Called after every block with the probes done and the total
+
+    Returns
+    -------
+    Dict[str, Any]
+        - "bin_width": float
+        - "genuine", "impostor", "nearest_impostor": int64 counts per distance bin
+        - "ids", "embeddings": gallery size
+        - "rank1_errors": probes whose closest impostor is closer than their own ID
+        - "elapsed": seconds
+    """
+    start_time = time.perf_counter()
+    n_bins = int(np.ceil(MAX_DISTANCE / bin_width))
+    n_ids = len(gallery)
+    n_embeddings = gallery.num_embeddings
+
+    genuine = np.zeros(n_bins, dtype=np.int64)
+    impostor = np.zeros(n_bins, dtype=np.int64)
+    nearest_impostor = np.zeros(n_bins, dtype=np.int64)
+    rank1_errors = 0
+
+    matrix = gallery.matrix
+    counts = gallery.counts
+    segment_starts = gallery.offsets[:-1]
+    # ID index of every row of the matrix
+    owners = np.repeat(np.arange(n_ids), counts)
+    block_size = max(1, max_block_bytes // (4 * max(1, n_embeddings)))
+
+    for start in range(0, n_embeddings, block_size):
+        stop = min(start + block_size, n_embeddings)
+        rows = np.arange(stop - start)
+        owner = owners[start:stop]
+
+        # (B, M) similarities of the block to every embedding, then the mean per ID
+        similarities = np.asarray(matrix[start:stop]) @ matrix.T
+        segment_sums = np.add.reduceat(similarities, segment_starts, axis=1)
+        distances = 1.0 - segment_sums / counts
+
+        # Impostor scores: every ID but the probe's own
+        bins = _bin(distances, bin_width, n_bins)
+        impostor += np.bincount(bins.ravel(), minlength=n_bins)
+        impostor -= np.bincount(bins[rows, owner], minlength=n_bins)
+
+        # Genuine scores: the probe's own ID without the probe itself
+        own_counts = counts[owner]
+        has_genuine = own_counts > 1
+        own_sums = segment_sums[rows, owner] - similarities[rows, rows + start]
+        genuine_distances = 1.0 - own_sums[has_genuine] / (own_counts[has_genuine] - 1)
+        genuine += np.bincount(_bin(genuine_distances, bin_width, n_bins), minlength=n_bins)
+
+        if n_ids > 1:
+            distances[rows, owner] = np.inf
+            nearest = distances.min(axis=1)
+            nearest_impostor += np.bincount(_bin(nearest, bin_width, n_bins), minlength=n_bins)
+            rank1_errors += int(np.count_nonzero(nearest[has_genuine] <= genuine_distances))
+
+        if progress is not None:
+            progress(stop, n_embeddings)
+
+    return {
+        "bin_width": bin_width,
+        "genuine": genuine,
+        "impostor": impostor,
+        "nearest_impostor": nearest_impostor,
+        "ids": n_ids,
+        "embeddings": n_embeddings,
+        "rank1_errors": rank1_errors,
+        "elapsed": time.perf_counter() - start_time
+    }
+
+
+def error_curves(histograms: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    False accept and false reject rates at every histogram bin edge
+
+    A score is accepted when it is below the threshold, like in match_face.
+
+    Parameters
+    ----------
+    histograms : Dict[str, Any]
+        Result of score_histograms
+
+    Returns
+    -------
+    Dict[str, numpy.ndarray]
+        - "thresholds": bin edges
+        - "far": share of impostor scores accepted
+        - "frr": share of genuine scores rejected
+        - "nearest_far": share of probes whose closest impostor is accepted
+    """
+    n_bins = len(histograms["genuine"])
+    curves = {"thresholds": np.arange(n_bins + 1) * histograms["bin_width"]}
+
+    for name, key in (("far", "impostor"), ("nearest_far", "nearest_impostor"), ("frr", "genuine")):
+        counts = histograms[key]
+        total = counts.sum()
+        # Scores in the bins below a threshold's edge are accepted
+        accepted = np.concatenate(([0], np.cumsum(counts))) / total if total else np.zeros(n_bins + 1)
+        curves[name] = 1.0 - accepted if name == "frr" and total else accepted
+    return curves
+
+
+def operating_point(curves: Dict[str, np.ndarray], threshold: float) -> Dict[str, float]:
+    """FAR, FRR and nearest-impostor FAR at the first bin edge not below threshold"""
+    i = int(np.clip(np.searchsorted(curves["thresholds"], threshold - 1e-12), 0, len(curves["thresholds"]) - 1))
+    return {
+        "threshold": round(float(curves["thresholds"][i]), 9),
+        "far": float(curves["far"][i]),
+        "frr": float(curves["frr"][i]),
+        "nearest_far": float(curves["nearest_far"][i])
+    }
+
+
+def recommend_threshold(curves: Dict[str, np.ndarray],
+                        target_far: Optional[float] = None,
+                        nearest: bool = False) -> Dict[str, Any]:
+    """
+    Pick a match threshold from the error curves
+
+    Parameters
+    ----------
+    curves : Dict[str, numpy.ndarray]
+        Result of error_curves
+    target_far : float, optional
+        Highest acceptable false accept rate, the largest threshold within it
+        is picked; by default the equal error rate threshold
+    nearest : bool, optional
+        Apply target_far to the closest impostor of each probe (the chance an
+        unenrolled face is matched to someone) instead of every impostor
+        pair, by default False
+
+    Returns
+    -------
+    Dict[str, Any]
+        Operating point of the threshold (see operating_point), with the
+        "criterion" used and "eer" for the equal error rate
+    """
+    far = curves["nearest_far"] if nearest else curves["far"]
+    frr = curves["frr"]
+
+    if target_far is None:
+        # Middle of the edges with the smallest difference, the curves are flat where the scores are separated
+        difference = np.abs(far - frr)
+        closest = np.flatnonzero(difference == difference.min())
+        i = int(closest[len(closest) // 2])
+        point = operating_point(curves, curves["thresholds"][i])
+        point["criterion"] = "eer"
+        point["eer"] = float((far[i] + frr[i]) / 2.0)
+        return point
+
+    # FAR grows with the threshold, take the last edge still within the target
+    i = max(0, int(np.searchsorted(far, target_far, side="right")) - 1)
+    point = operating_point(curves, curves["thresholds"][i])
+    point["criterion"] = f"{'nearest_far' if nearest else 'far'} <= {target_far}"
+    return point
+
+
+def _bin(distances: np.ndarray, bin_width: float, n_bins: int) -> np.ndarray:
+    """Histogram bin of each distance"""
+    return np.clip((distances / bin_width).astype(np.int64), 0, n_bins - 1)
@@ -0,0 +1,197 @@
+import cv2
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Indices probed where the video devices cannot be listed
+FALLBACK_INDICES = range(10)
+
+
+def list_camera_indices() -> List[int]:
+    """
+    Indices of the video devices present on this machine
+
+    On Linux the /dev/video* device nodes are listed, so missing indices are
+    never opened. Elsewhere the FALLBACK_INDICES are returned.
+
+    Returns
+    -------
+    List[int]
+        Candidate camera indices, sorted
+    """
+    if sys.platform.startswith("linux"):
+        indices = []
+        for path in glob.glob("/dev/video*"):
+            match = re.fullmatch(r"/dev/video(\d+)", path)
+            if match:
+                indices.append(int(match.group(1)))
+        return sorted(indices)
+    return list(FALLBACK_INDICES)
+
+
+def probe_camera(index: int) -> Optional[Dict[str, Any]]:
+    """
+    Open a camera, read one frame and report its capabilities
+
+    Parameters
+    ----------
+    index : int
+        Camera index
+
+    Returns
+    -------
+    Dict[str, Any]
+        {"index", "width", "height", "fps", "backend"}, or None if the camera
+        cannot be opened or read (e.g. a metadata-only /dev/video node)
+    """
+    cap = cv2.VideoCapture(index)
+    try:
+        if not cap.isOpened():
+            return None
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            return None
+        return {
+            "index": index,
+            "width": int(frame.shape[1]),
+            "height": int(frame.shape[0]),
+            "fps": float(cap.get(cv2.CAP_PROP_FPS) or 0.0),
+            "backend": cap.getBackendName() if hasattr(cap, "getBackendName") else ""
+        }
+    finally:
+        cap.release()
+
+
+def discover_cameras(indices: Optional[List[int]] = None,
+                     timeout: float = 3.0,
+                     timed_out: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Probe cameras in parallel, each with its own timeout
+
+    Every camera is probed on its own daemon thread. A camera whose probe
+    does not finish within the timeout is left out, its thread is abandoned
+    (an opening VideoCapture cannot be interrupted) and does not keep the
+    application from exiting.
+
+    Parameters
+    ----------
+    indices : List[int], optional
+        Camera indices to probe, by default list_camera_indices()
+    timeout : float, optional
+        Seconds to wait for all the probes, by default 3.0
+    timed_out : List[int], optional
+        Receives the indices whose probe did not finish within the timeout,
+        they may still be working cameras that are slow to open
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        Capabilities of the working cameras (see probe_camera), sorted by index
+    """
+    if indices is None:
+        indices = list_camera_indices()
+
+    # Abandoned probes may still write their result after the deadline
+    results: Dict[int, Optional[Dict[str, Any]]] = {}
+    lock = threading.Lock()
+
+    def probe(index: int) -> None:
+        try:
+            result = probe_camera(index)
+        except Exception as e:
+            print(f"Error probing camera {index}: {e}")
+            result = None
+        with lock:
+            results[index] = result
+
+    threads = [threading.Thread(target=probe, args=(index,), name=f"camera-probe-{index}", daemon=True) for index in indices]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    with lock:
+        finished = dict(results)
+    if timed_out is not None:
+        timed_out.extend(index for index in indices if index not in finished)
+    return [finished[index] for index in sorted(finished) if finished[index] is not None]
+
+
+class CameraCache:
+    """
+    Last known-good camera list and capabilities, kept in a JSON file between sessions
+    """
+
+    def __init__(self, path: str):
+        """
+        Parameters
+        ----------
+        path : str
+            JSON file of the cache
+        """
+        self.path = path
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Cached cameras, empty when there is no readable cache"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            return list(data.get("cameras", []))
+        except (OSError, ValueError):
+            return []
+
+    def save(self, cameras: List[Dict[str, Any]]) -> None:
+        """Replace the cached cameras"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "w") as f:
+                json.dump({"updated": time.time(), "cameras": cameras}, f, indent=4)
+        except OSError as e:
+            print(f"Error saving camera cache: {e}")
+
+    def refresh(self, timeout: float = 3.0) -> List[Dict[str, Any]]:
+        """
+        Discover the cameras and cache the result
+
+        Cached cameras whose probe timed out are kept, only the cameras
+        that failed to open or read are dropped from the cache.
+        """
+        timed_out: List[int] = []
+        cameras = discover_cameras(timeout=timeout, timed_out=timed_out)
+        found = {camera["index"] for camera in cameras}
+        slow = [camera for camera in self.load()
+                if camera.get("index") in timed_out and camera.get("index") not in found]
+        cameras = sorted(cameras + slow, key=lambda camera: camera["index"])
+        self.save(cameras)
+        return cameras
+
+    def refresh_async(self,
+                      on_done: Callable[[List[Dict[str, Any]]], None],
+                      timeout: float = 3.0) -> threading.Thread:
+        """
+        Refresh on a background thread
+
+        Parameters
+        ----------
+        on_done : Callable[[List[Dict[str, Any]]], None]
+            Called from the background thread with the discovered cameras
+        timeout : float, optional
+            Seconds to wait for the probes, by default 3.0
+
+        Returns
+        -------
+        threading.Thread
+            The started thread
+        """
+        thread = threading.Thread(target=lambda: on_done(self.refresh(timeout)), name="camera-discovery", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,182 @@
+import cv2
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class LatestFrameCapture:
+    """
+    Capture thread that keeps draining a video source into a latest-frame slot.
+
+    The device is read as fast as it delivers frames, so its driver buffer
+    never fills with stale frames, whatever the consumers are doing. A
+    consumer always gets the newest frame it has not seen yet; frames that
+    were overwritten before any consumer took them are counted as dropped.
+    The last ``buffer_size`` frames are kept in a ring buffer for consumers
+    that need a short history (see recent).
+
+    get, depth, maxsize and dropped match StageQueue, so the capture can be
+    the input queue of a pipeline stage.
+    """
+
+    def __init__(self,
+                 capture,
+                 buffer_size: int = 1,
+                 name: str = "camera",
+                 on_end: Optional[Callable[[], None]] = None):
+        """
+        Parameters
+        ----------
+        capture : cv2.VideoCapture
+            Opened video source, read by the capture thread but released by the caller
+        buffer_size : int, optional
+            Number of recent frames kept, by default 1
+        name : str, optional
+            Source name in messages and the thread name, by default "camera"
+        on_end : Callable[[], None], optional
+            Called from the capture thread when it stops, e.g. after a failed read
+        """
+        self.capture = capture
+        self.name = name
+        self.on_end = on_end
+        self.maxsize = 1
+
+        self._frames = deque(maxlen=max(1, buffer_size))  # (index, timestamp, frame), newest last
+        self._condition = threading.Condition()
+        self._last_taken = -1
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.frames_read = 0
+        self.frames_delivered = 0
+        self.dropped = 0
+        self.failed = False
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+
+        # Keep as little as possible in the driver, the thread holds the newest frame
+        if hasattr(capture, "set"):
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, stop_event: Optional[threading.Event] = None) -> "LatestFrameCapture":
+        """
+        Start the capture thread
+
+        Parameters
+        ----------
+        stop_event : threading.Event, optional
+            Stops the thread when set, by default the capture's own (see stop)
+        """
+        if stop_event is not None:
+            self._stop_event = stop_event
+        self._stop_event.clear()
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._thread = threading.Thread(target=self._run, name=f"capture-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get(self, timeout: float = 0.1) -> Dict[str, Any]:
+        """
+        Newest frame not taken yet, waiting up to timeout seconds for one
+
+        Returns
+        -------
+        Dict[str, Any]
+            {"index", "timestamp", "frame"}, raises queue.Empty on timeout
+        """
+        with self._condition:
+            self._condition.wait_for(self._has_new_frame, timeout)
+            if not self._has_new_frame():
+                raise queue.Empty
+            index, timestamp, frame = self._frames[-1]
+            self._last_taken = index
+            self.frames_delivered += 1
+            return {"index": index, "timestamp": timestamp, "frame": frame}
+
+    def read(self, timeout: float = 1.0) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        cv2.VideoCapture.read replacement returning the newest frame not read yet
+
+        Returns
+        -------
+        Tuple[bool, Optional[numpy.ndarray]]
+            (True, frame), or (False, None) when no new frame came within timeout
+        """
+        try:
+            return True, self.get(timeout)["frame"]
+        except queue.Empty:
+            return False, None
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """The frames in the ring buffer, oldest first, without taking them"""
+        with self._condition:
+            return [{"index": index, "timestamp": timestamp, "frame": frame} for index, timestamp, frame in self._frames]
+
+    def depth(self) -> int:
+        """1 while a frame is waiting to be taken"""
+        with self._condition:
+            return int(self._has_new_frame())
+
+    def fps(self) -> float:
+        """Frames read per second while the thread ran"""
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.stopped_at or time.time()) - self.started_at
+        return self.frames_read / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Frames read from the device, delivered to consumers and dropped
+
+        Returns
+        -------
+        Dict[str, Any]
+            frames_read, frames_delivered, frames_dropped, fps and failed
+        """
+        with self._condition:
+            return {
+                "frames_read": self.frames_read,
+                "frames_delivered": self.frames_delivered,
+                "frames_dropped": self.dropped,
+                "fps": self.fps(),
+                "failed": self.failed
+            }
+
+    def _has_new_frame(self) -> bool:
+        return bool(self._frames) and self._frames[-1][0] > self._last_taken
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            ret, frame = self.capture.read()
+            if not ret:
+                print(f"Failed to grab frame from {self.name}")
+                self.failed = True
+                break
+
+            with self._condition:
+                # The previous frame was never taken, it is overwritten
+                if self._has_new_frame():
+                    self.dropped += 1
+                self._frames.append((self.frames_read, time.time(), frame))
+                self.frames_read += 1
+                self._condition.notify_all()
+
+        self.stopped_at = time.time()
+        with self._condition:
+            self._condition.notify_all()
+        if self.on_end is not None:
+            self.on_end()
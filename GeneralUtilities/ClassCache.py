@@ -0,0 +1,155 @@
+import glob
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# Default cache folder, next to the students JSON file
+CACHE_DIR_NAME = ".gallery_cache"
+
+
+def default_cache_dir(json_path: str) -> str:
+    """Cache folder used for a students JSON file when none is given"""
+    return os.path.join(os.path.dirname(os.path.abspath(json_path)), CACHE_DIR_NAME)
+
+
+def class_prefix(class_name: str) -> str:
+    """File name prefix shared by every cache file of a class"""
+    safe_name = re.sub(r"[^A-Za-z0-9_-]", "_", class_name)
+    class_hash = hashlib.sha1(class_name.encode("utf-8")).hexdigest()[:8]
+    return f"{safe_name}-{class_hash}-"
+
+
+def class_gallery_path(cache_dir: str, class_name: str, content_hash: str) -> str:
+    """Base path of the compiled gallery of a class, see EmbeddingGallery.save"""
+    return os.path.join(cache_dir, f"{class_prefix(class_name)}{content_hash}")
+
+
+def class_data_hash(students_data: Dict[str, Any], class_name: str, model_name: str) -> str:
+    """
+    Hash of the embeddings of the students enrolled in a class
+
+    Only the student IDs and embeddings of the class go into the hash, so
+    attendance updates and changes to other classes keep it the same.
+
+    Parameters
+    ----------
+    students_data : Dict[str, Any]
+        Students JSON content in the AttendanceManager format
+    class_name : str
+        Class whose students are hashed
+    model_name : str
+        Embedding model the gallery is used with
+
+    Returns
+    -------
+    str
+        16 hex digit hash
+    """
+    enrolled = []
+    for branches in students_data.get("students", {}).values():
+        for students in branches.values():
+            for student_id, student_info in students.items():
+                embeddings = student_info.get("embedding", [])
+                if (class_name in student_info.get("classes", {})
+                        and embeddings and all(isinstance(emb, list) for emb in embeddings)):
+                    enrolled.append((student_id, embeddings))
+
+    digest = hashlib.sha1(f"{model_name}|{class_name}".encode("utf-8"))
+    for student_id, embeddings in sorted(enrolled, key=lambda entry: entry[0]):
+        digest.update(f"|{student_id}|{len(embeddings)}".encode("utf-8"))
+        for emb in embeddings:
+            digest.update(len(emb).to_bytes(4, "little"))
+            digest.update(np.asarray(emb, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _source_path(cache_dir: str, json_path: str, class_name: str) -> str:
+    path_hash = hashlib.sha1(os.path.abspath(json_path).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{class_prefix(class_name)}{path_hash}.source.json")
+
+
+def read_source(cache_dir: str, json_path: str, class_name: str, model_name: str) -> Optional[str]:
+    """
+    Content hash of a class recorded for the current version of a JSON file
+
+    Returns
+    -------
+    Optional[str]
+        The hash, or None when there is no record or the file changed since
+        it was written (size or modification time) and has to be parsed
+    """
+    try:
+        with open(_source_path(cache_dir, json_path, class_name), "r") as f:
+            record = json.load(f)
+        stat = os.stat(json_path)
+    except (OSError, ValueError):
+        return None
+
+    if (record.get("size") != stat.st_size or record.get("mtime_ns") != stat.st_mtime_ns
+            or record.get("model_name") != model_name):
+        return None
+    return record.get("hash")
+
+
+def write_source(cache_dir: str, json_path: str, class_name: str, model_name: str, content_hash: str) -> None:
+    """Record the content hash of a class for the current version of a JSON file"""
+    stat = os.stat(json_path)
+    record = {
+        "json_path": os.path.abspath(json_path),
+        "class_name": class_name,
+        "model_name": model_name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": content_hash
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _source_path(cache_dir, json_path, class_name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(record, f)
+    os.replace(path + ".tmp", path)
+
+
+def refresh_sources(json_path: str, students_data: Dict[str, Any], cache_dir: Optional[str] = None) -> int:
+    """
+    Carry the cache records of a JSON file over to a version just written
+
+    Called after the students JSON is rewritten from students_data. Classes
+    whose embeddings did not change keep their compiled gallery, without the
+    next load having to parse the file; the records of the others are removed.
+
+    Parameters
+    ----------
+    json_path : str
+        Students JSON file that was written
+    students_data : Dict[str, Any]
+        The content that was written
+    cache_dir : str, optional
+        Cache folder, by default the one next to the JSON file
+
+    Returns
+    -------
+    int
+        Number of class records carried over
+    """
+    cache_dir = cache_dir or default_cache_dir(json_path)
+    json_path = os.path.abspath(json_path)
+    kept = 0
+    for path in glob.glob(os.path.join(glob.escape(cache_dir), "*.source.json")):
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+            if record.get("json_path") != json_path:
+                continue
+            content_hash = class_data_hash(students_data, record["class_name"], record["model_name"])
+            if content_hash == record.get("hash"):
+                write_source(cache_dir, json_path, record["class_name"], record["model_name"], content_hash)
+                kept += 1
+            else:
+                os.remove(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error refreshing class gallery cache {path}: {e}")
+    return kept
@@ -1,20 +1,39 @@
 import cv2
 import numpy as np
-import dlib
 import json
 from deepface import DeepFace
-from scipy.spatial.distance import cosine
+from deepface.modules import preprocessing
 from typing import List, Dict, Optional, Tuple, Union
 import time
 import tkinter as tk
 from tkinter import messagebox
 from datetime import datetime
 import threading
+import os
+import glob
+import logging
+
+from GeneralUtilities.Alignment import FaceAligner, create_aligner
+from GeneralUtilities.ClassCache import (class_data_hash, class_gallery_path, class_prefix, default_cache_dir,
+                                         read_source, write_source)
+from GeneralUtilities.FrameContext import FrameContext
+from GeneralUtilities.Gallery import DATABASE_FORMATS, EmbeddingGallery, database_format, gallery_paths, top_k_smallest
+from GeneralUtilities.Indexing import IVFIndex
+from GeneralUtilities.Metrics import Metrics, timed
+from GeneralUtilities.ModelRegistry import ModelRegistry, model_registry, DEFAULT_DETECTOR_PATH, DEFAULT_LANDMARKS_PATH
+from GeneralUtilities.Quality import ALIGNED, QualityCascade
+from GeneralUtilities.Trace import DecisionTrace
+from GeneralUtilities.Voting import TemporalVoter
 
 class FaceRecognitionSystem:
     def __init__(self, 
-                 model_path: str = "Models/face_detection_yunet_2023mar.onnx", 
-                 landmarks_path: str = "Models/shape_predictor_68_face_landmarks.dat"):
+                 model_path: str = DEFAULT_DETECTOR_PATH, 
+                 landmarks_path: str = DEFAULT_LANDMARKS_PATH,
+                 registry: Optional[ModelRegistry] = None,
+                 aligner: Union[str, FaceAligner] = "dlib",
+                 quality: Optional[QualityCascade] = None,
+                 metrics: Optional[Metrics] = None,
+                 trace: Optional[DecisionTrace] = None):
         """
         Initialize the Face Recognition System
         
@@ -23,40 +42,121 @@ class FaceRecognitionSystem:
         model_path : str
             Path to the YuNet ONNX model file
         landmarks_path : str
-            Path to the dlib facial landmarks predictor file
+            Path to the dlib facial landmarks predictor file (only used by the dlib aligner)
+        registry : ModelRegistry, optional
+            Where models are loaded from, by default the process-wide registry
+        aligner : str or FaceAligner, optional
+            "dlib" (68-point landmarks) or "keypoints" (YuNet keypoints, no dlib model), 
+            by default "dlib". Faces must be enrolled and recognized with the same aligner.
+        quality : QualityCascade, optional
+            Quality gate run on detected faces before alignment, by default box size,
+            blur, brightness and pose checks with the default thresholds
+        metrics : Metrics, optional
+            Where call latencies and frame and face counts are recorded, by default a new Metrics
+        trace : DecisionTrace, optional
+            Ring buffer receiving the match and quality decisions, by default a new DecisionTrace
         """
-        # Initialize face detection using YuNet
+        # Models are loaded once per process and shared through the registry
+        self.registry = registry or model_registry
         self.model_path = model_path
-        self.face_detector = cv2.FaceDetectorYN_create(model_path, "", (640, 480))
-        
-        # Initialize landmark detection using dlib 68 landmarks predictor model
-        self.landmark_predictor = dlib.shape_predictor(landmarks_path)
+        self.landmarks_path = landmarks_path
+
+        # Finds the eyes used to align each face
+        if isinstance(aligner, str):
+            aligner = create_aligner(aligner, self.registry, landmarks_path)
+        self.aligner = aligner
         
         # Database for face recognition
         self.face_database: Dict[str, List[List[float]]] = {}
+
+        # Normalized embedding matrix built from face_database for matching
+        self.gallery = EmbeddingGallery.empty()
+        self._gallery_dirty = False
+
+        # Optional approximate index used instead of exhaustive search on large galleries
+        self.ann_index: Optional[IVFIndex] = None
+        self.ann_min_gallery_size = 2000
+        self.ann_target_recall = 0.95
+        self.ann_report: Optional[Dict[str, float]] = None
+        self._ann_gallery = None
         
-        # Temporal consistency tracking
-        self.recent_matches = {}  # ID -> count of recent matches
-        self.frame_history = []   # Store last N matches
-        self.consistency_threshold = 3  # How many frames to require for confirmation
-        self.last_detection_time = {}  # Track when each ID was last detected
+        # Temporal consistency voting, an ID is confirmed after 3 matches within 10 seconds
+        self.voter = TemporalVoter(consistency_threshold=3, window=10.0)
         
-        # Quality assessment parameters
+        # Latency histograms of the main calls and frames/faces counters, see metrics.stats()
+        self.metrics = metrics or Metrics()
+        
+        # Match and quality decisions for threshold tuning, written to disk off the frame loop
+        self.trace = trace or DecisionTrace()
+        
+        # Quality gate before alignment and embedding, cheapest checks first
+        self.quality = quality or QualityCascade()
+        
+        # Quality assessment parameters of aligned faces (enrollment and the cascade's aligned stage)
         self.min_face_size = 100
         self.min_sharpness = 10
         self.min_brightness = 20
         self.max_brightness = 300
         
         # Matching parameters
+        self.model_name = "Facenet"  # DeepFace model used for embeddings
         self.match_threshold = 0.5  # Stricter threshold for matching
         
         # Store embedding dimensions to verify consistency
         self.embedding_dim = None
 
-    def load_students_from_json(self, json_path: str, class_name: str) -> None:
+    @property
+    def face_detector(self):
+        """YuNet face detector, loaded on first use"""
+        return self.registry.face_detector(self.model_path)
+
+    @property
+    def landmark_predictor(self):
+        """dlib 68 landmarks predictor model, loaded on first use"""
+        return self.registry.landmark_predictor(self.landmarks_path)
+
+    def load_students_from_json(self, 
+                                json_path: str, 
+                                class_name: str, 
+                                use_cache: bool = True, 
+                                cache_dir: Optional[str] = None) -> None:
         """
         Load student data from AttendanceManager JSON file and update face database
+        
+        The students of the class are compiled into a binary gallery cache
+        keyed on a hash of their IDs and embeddings (see GeneralUtilities.ClassCache), so
+        rewriting the file for attendance does not invalidate it. A small
+        record of the file's size and modification time maps the current
+        file to its class hash, so later sessions skip parsing it; after
+        AttendanceManager.save_students_locally the record is carried over
+        and other writers only cost one parse.
+        
+        Parameters
+        ----------
+        json_path : str
+            Path to the students JSON file written by AttendanceManager
+        class_name : str
+            Only students enrolled in this class are loaded
+        use_cache : bool, optional
+            Read and write the compiled class gallery cache, by default True
+        cache_dir : str, optional
+            Cache directory, by default a .gallery_cache folder next to the JSON file
         """
+        cache_dir = cache_dir or default_cache_dir(json_path)
+        if use_cache:
+            try:
+                content_hash = read_source(cache_dir, json_path, class_name, self.model_name)
+                cache_path = content_hash and class_gallery_path(cache_dir, class_name, content_hash)
+                if cache_path and os.path.exists(gallery_paths(cache_path)["header"]):
+                    gallery = EmbeddingGallery.load(cache_path)
+                    if self._adopt_gallery(gallery, merge=True):
+                        print(f"Loaded {len(gallery)} students of {class_name} from cache")
+                        return
+            except Exception as e:
+                print(f"Error reading class gallery cache: {e}")
+
+        data = None
+        class_entries = {}
         try:
             with open(json_path, 'r') as f:
                 data = json.load(f)
@@ -90,12 +190,164 @@ class FaceRecognitionSystem:
                                 
                                 if valid_embeddings:
                                     self.face_database[student_id] = valid_embeddings
+                                    class_entries[student_id] = valid_embeddings
                                     print(f"Added student {student_id} with {len(valid_embeddings)} valid embeddings")
 
         except Exception as e:
             print(f"Error loading student data: {e}")
+            data = None
+
+        # Rebuild the matching gallery with the loaded students
+        self.refresh_gallery()
+
+        if use_cache and data is not None:
+            self._write_class_cache(json_path, data, class_name, class_entries, cache_dir)
+
+    def _write_class_cache(self, 
+                           json_path: str, 
+                           data: Dict, 
+                           class_name: str, 
+                           class_entries: Dict[str, List[List[float]]], 
+                           cache_dir: str) -> None:
+        """
+        Save a class gallery under the hash of its embeddings, unless it is
+        already cached, record the hash for the current JSON file and remove
+        the other galleries of the class
+        """
+        try:
+            content_hash = class_data_hash(data, class_name, self.model_name)
+            cache_path = class_gallery_path(cache_dir, class_name, content_hash)
+            if not os.path.exists(gallery_paths(cache_path)["header"]):
+                gallery = EmbeddingGallery.from_database(class_entries, self.embedding_dim)
+                gallery.save(cache_path, model_name=self.model_name)
+
+                cache_name = os.path.basename(cache_path)
+                prefix = class_prefix(class_name)
+                for path in glob.glob(os.path.join(glob.escape(cache_dir), glob.escape(prefix) + "*")):
+                    name = os.path.basename(path)
+                    if not name.startswith(cache_name + ".") and not name.endswith(".source.json"):
+                        os.remove(path)
+
+            write_source(cache_dir, json_path, class_name, self.model_name, content_hash)
+        except Exception as e:
+            print(f"Error writing class gallery cache: {e}")
+
+    def refresh_gallery(self) -> EmbeddingGallery:
+        """
+        Rebuild the normalized embedding matrix from the face database
+        
+        Returns
+        -------
+        EmbeddingGallery
+            The up to date gallery used for matching
+        """
+        self.gallery = EmbeddingGallery.from_database(self.face_database, self.embedding_dim)
+        self._gallery_dirty = False
+        self._build_ann_index()
+        return self.gallery
+
+    def get_gallery(self) -> EmbeddingGallery:
+        """
+        Return the matching gallery, rebuilding it first if the database changed
+        """
+        if self._gallery_dirty:
+            self.refresh_gallery()
+        return self.gallery
+
+    def enable_ann_index(self, 
+                         index: Optional[IVFIndex] = None, 
+                         min_gallery_size: int = 2000,
+                         target_recall: float = 0.95) -> IVFIndex:
+        """
+        Use an approximate nearest neighbour index instead of exhaustive search
+        
+        Every time the index is built, n_probe is tuned on noisy copies of the
+        gallery's own embeddings. The index is only used when it reaches
+        target_recall against exact search while still answering faster than
+        it, otherwise matching keeps using exact search and a warning is logged.
+        The last measurement is kept in ann_report.
+        
+        Parameters
+        ----------
+        index : IVFIndex, optional
+            Configured (unbuilt) index, by default IVFIndex() with default knobs
+        min_gallery_size : int, optional
+            Galleries with fewer IDs keep using exact search, by default 2000
+        target_recall : float, optional
+            Top-1 recall against exact search needed to use the index, by default 0.95
+        
+        Returns
+        -------
+        IVFIndex
+            The index, rebuilt whenever the gallery changes
+        """
+        self.ann_index = index or IVFIndex()
+        self.ann_min_gallery_size = min_gallery_size
+        self.ann_target_recall = target_recall
+        self._build_ann_index()
+        return self.ann_index
+
+    def disable_ann_index(self) -> None:
+        """Go back to exhaustive search"""
+        self.ann_index = None
+        self.ann_report = None
+        self._ann_gallery = None
+
+    def _build_ann_index(self) -> None:
+        """Rebuild the approximate index for the current gallery if it is in use"""
+        self._ann_gallery = None
+        if self.ann_index is None or len(self.gallery) < self.ann_min_gallery_size:
+            return
+
+        self.ann_index.build(self.gallery)
+        self.ann_report = report = self.ann_index.tune_n_probe(self.gallery, self.ann_target_recall)
+        if report["recall"] < self.ann_target_recall or report["ann_ms_per_query"] >= report["exact_ms_per_query"]:
+            logging.warning(f"ANN index over {len(self.gallery)} IDs reaches {report['recall']:.1%} top-1 recall "
+                            f"at n_probe={report['n_probe']} ({report['ann_ms_per_query']:.2f} ms against "
+                            f"{report['exact_ms_per_query']:.2f} ms exact), keeping exact search")
+            return
+
+        self._ann_gallery = self.gallery
+        print(f"Built ANN index over {len(self.gallery)} IDs in {self.ann_index.build_time:.2f}s, "
+              f"{report['recall']:.1%} top-1 recall at n_probe={report['n_probe']}")
 
-    def detect_faces(self, img: np.ndarray, scale_factor: float = 1.0) -> np.ndarray:
+    def _ann_active(self) -> bool:
+        """Whether the approximate index matches the current gallery"""
+        return self.ann_index is not None and self._ann_gallery is self.gallery
+
+    def search_gallery(self, probes: np.ndarray, top_k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Closest gallery IDs for each probe, using the ANN index when it is active
+        
+        Parameters
+        ----------
+        probes : numpy.ndarray
+            (N, D) probe embeddings
+        top_k : int, optional
+            Number of closest IDs per probe, by default 1
+        
+        Returns
+        -------
+        Tuple[numpy.ndarray, numpy.ndarray]
+            (N, k) indices into gallery.ids (-1 when missing) and (N, k) average distances
+        """
+        gallery = self.get_gallery()
+        if self._ann_active():
+            return self.ann_index.search(probes, top_k)
+        return gallery.search(probes, top_k)
+
+    def new_frame_context(self, frame: np.ndarray) -> FrameContext:
+        """
+        Create the per-frame context shared by detect_faces, align_face and assess_face_quality
+        """
+        return FrameContext(frame)
+
+    @timed("detect_faces")
+    def detect_faces(self, 
+                     img: np.ndarray, 
+                     scale_factor: float = 1.0, 
+                     context: Optional[FrameContext] = None,
+                     detector=None) -> np.ndarray:
         """
         Detect faces in an image using YuNet
         
@@ -105,12 +357,48 @@ class FaceRecognitionSystem:
             Input image for face detection
         scale_factor : float, optional
             Scale factor to adjust image size, by default 1.0
+        context : FrameContext, optional
+            Frame context of img, receives the boxes, keypoints and scores
+        detector : cv2.FaceDetectorYN, optional
+            Detector to run, by default the shared face_detector
         
         Returns
         -------
         numpy.ndarray
             Detected faces with coordinates
         """
+        if context is None:
+            context = FrameContext(img)
+
+        results = self.detect_raw(img, scale_factor, context, detector)
+        faces = self.store_detections(context, results)
+        self.metrics.count_frame(len(faces))
+        return faces
+
+    def detect_raw(self, 
+                   img: np.ndarray, 
+                   scale_factor: float = 1.0, 
+                   context: Optional[FrameContext] = None, 
+                   detector=None) -> np.ndarray:
+        """
+        Run YuNet on an image and return its raw results in image coordinates
+        
+        Parameters
+        ----------
+        img : numpy.ndarray
+            Input image for face detection
+        scale_factor : float, optional
+            Scale factor to adjust image size, by default 1.0
+        context : FrameContext, optional
+            Frame context of img, caches the resized image
+        detector : cv2.FaceDetectorYN, optional
+            Detector to run, by default the shared face_detector
+        
+        Returns
+        -------
+        numpy.ndarray
+            (N, 15) float32 rows: box [x, y, w, h], 5 keypoints (x, y) and score
+        """
         # Get original image dimensions
         height, width = img.shape[:2]
         
@@ -118,33 +406,65 @@ class FaceRecognitionSystem:
         input_width = int(width * scale_factor)
         input_height = int(height * scale_factor)
         
-        # Set input size and resize image
-        self.face_detector.setInputSize((input_width, input_height))
-        resized_img = cv2.resize(img, (input_width, input_height), interpolation=cv2.INTER_AREA)
+        # Reconfigure the detector only when the input size changes, then resize the image (once per frame and size)
+        detector = detector or self.face_detector
+        set_detector_input_size(detector, (input_width, input_height))
+        if context is not None:
+            resized_img = context.detector_input((input_width, input_height))
+        elif (input_width, input_height) != (width, height):
+            resized_img = cv2.resize(img, (input_width, input_height), interpolation=cv2.INTER_AREA)
+        else:
+            resized_img = img
 
         # Detect faces
-        _, results = self.face_detector.detect(resized_img)
+        _, results = detector.detect(resized_img)
 
         # If no faces detected, return empty array
         if results is None or len(results) == 0:
-            return np.array([])
+            return np.zeros((0, 15), dtype=np.float32)
 
-        # Scale back the detected faces to original image coordinates
-        faces = results[:, :4].astype(np.int32)
-        
-        # Scale coordinates back to original image size
+        # Scale boxes and keypoints back to original image coordinates (columns alternate x and y)
         scale_x = width / input_width
         scale_y = height / input_height
+        results = results[:, :15].astype(np.float32)
+        results[:, :14] *= np.array([scale_x, scale_y] * 7, dtype=np.float32)
+        return results
+
+    @staticmethod
+    def store_detections(context: FrameContext, results: np.ndarray) -> np.ndarray:
+        """
+        Keep raw detector results in the frame context for the later steps on this frame
         
-        scaled_faces = faces.copy()
-        scaled_faces[:, 0] = (faces[:, 0] * scale_x).astype(np.int32)  # x
-        scaled_faces[:, 1] = (faces[:, 1] * scale_y).astype(np.int32)  # y
-        scaled_faces[:, 2] = (faces[:, 2] * scale_x).astype(np.int32)  # width
-        scaled_faces[:, 3] = (faces[:, 3] * scale_y).astype(np.int32)  # height
+        Parameters
+        ----------
+        context : FrameContext
+            Frame context of the image the results were found in
+        results : numpy.ndarray
+            (N, 15) results from detect_raw, in frame coordinates
         
-        return scaled_faces
+        Returns
+        -------
+        numpy.ndarray
+            Detected face boxes [x, y, width, height]
+        """
+        if len(results) == 0:
+            context.faces = np.array([])
+            context.keypoints = np.zeros((0, 5, 2), dtype=np.float32)
+            context.scores = np.zeros(0, dtype=np.float32)
+            return context.faces
+
+        context.faces = results[:, :4].astype(np.int32)
+        context.keypoints = results[:, 4:14].reshape(-1, 5, 2)
+        context.scores = results[:, 14].copy()
+        return context.faces
 
-    def align_face(self, img: np.ndarray, face: List[int], scale_factor: float = 0.27) -> np.ndarray:
+    @timed("align_face")
+    def align_face(self, 
+                   img: np.ndarray, 
+                   face: List[int], 
+                   scale_factor: float = 0.27, 
+                   context: Optional[FrameContext] = None, 
+                   keypoints: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Align a detected face based on eye positions
         
@@ -154,73 +474,35 @@ class FaceRecognitionSystem:
             Input image containing the face
         face : List[int]
             Face bounding box coordinates [x, y, width, height]
+        context : FrameContext, optional
+            Frame context of img, its grayscale frame is shared by all faces
+        keypoints : numpy.ndarray, optional
+            (5, 2) YuNet keypoints of the face, by default looked up in the context
         
         Returns
         -------
         numpy.ndarray
             Aligned face image
         """
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-        # Create dlib rectangle
-        x, y, w, h = face
-        rect = dlib.rectangle(
-            int(x), int(y), 
-            int(x + w), int(y + h)
-        )
-
-        # Detect facial landmarks
-        shape = self.landmark_predictor(gray, rect)
-        shape = np.array(
-            [(shape.part(j).x, shape.part(j).y) for j in range(shape.num_parts)]
-        )
+        # Grayscale frame, converted once per frame when a context is shared
+        if context is None or context.frame is not img:
+            context = FrameContext(img)
 
-        # Specify aligned face size
-        desired_face_width, desired_face_height = 256, 256
+        if keypoints is None and self.aligner.needs_keypoints:
+            keypoints = self._find_keypoints(context, face)
 
-        # Eye landmark indexes
-        left_eye_landmarks = [36, 37, 38, 39, 40, 41]
-        right_eye_landmarks = [42, 43, 44, 45, 46, 47]
+        return self.aligner.align(context, np.asarray(face), keypoints, scale_factor)
 
-        # Calculate eye centers
-        left_eye_center = np.mean(shape[left_eye_landmarks], axis=0).astype(int)
-        right_eye_center = np.mean(shape[right_eye_landmarks], axis=0).astype(int)
-
-        # Calculate rotation angle
-        dY = right_eye_center[1] - left_eye_center[1]
-        dX = right_eye_center[0] - left_eye_center[0]
-        angle = np.degrees(np.arctan2(dY, dX))
-
-        # Calculate scale
-        dist = np.sqrt((dX**2) + (dY**2))
-        desired_dist = desired_face_width * scale_factor
-        scale = desired_dist / dist
-
-        # Calculate eye center
-        eyes_center = (
-            int((left_eye_center[0] + right_eye_center[0]) // 2),
-            int((left_eye_center[1] + right_eye_center[1]) // 2),
-        )
-
-        # Get rotation matrix
-        M = cv2.getRotationMatrix2D(eyes_center, angle, scale)
-
-        # Update translation
-        tX = desired_face_width * 0.5
-        tY = desired_face_height * 0.3
-        M[0, 2] += tX - eyes_center[0]
-        M[1, 2] += tY - eyes_center[1]
-
-        # Apply transformation
-        output = cv2.warpAffine(
-            img, M, (desired_face_width, desired_face_height), 
-            flags=cv2.INTER_CUBIC
-        )
-
-        return output
+    @staticmethod
+    def _find_keypoints(context: FrameContext, face: List[int]) -> Optional[np.ndarray]:
+        """Keypoints that detect_faces stored in the context for a face box"""
+        if context.faces is None or context.keypoints is None or len(context.faces) == 0:
+            return None
+        matches = np.flatnonzero(np.all(context.faces[:, :4] == np.asarray(face)[:4], axis=1))
+        return context.keypoints[matches[0]] if matches.size else None
 
-    def assess_face_quality(self, face_img: np.ndarray) -> bool:
+    @timed("assess_face_quality")
+    def assess_face_quality(self, face_img: np.ndarray, context: Optional[FrameContext] = None) -> bool:
         """
         Assess if a face is high quality enough for recognition
         
@@ -228,6 +510,8 @@ class FaceRecognitionSystem:
         ----------
         face_img : numpy.ndarray
             Aligned face image
+        context : FrameContext, optional
+            Frame context, provides reusable buffers for the checks
             
         Returns
         -------
@@ -235,18 +519,26 @@ class FaceRecognitionSystem:
             True if face passes quality checks, False otherwise
         """
         try:
-            # Check image sharpness
-            gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+            # Check image sharpness, reusing the grayscale and Laplacian buffers between faces
+            height, width = face_img.shape[:2]
+            if context is not None:
+                gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY, 
+                                    dst=context.buffer("quality_gray", (height, width)))
+                laplacian = cv2.Laplacian(gray, cv2.CV_64F, 
+                                          dst=context.buffer("quality_laplacian", (height, width), np.float64))
+            else:
+                gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+                laplacian = cv2.Laplacian(gray, cv2.CV_64F)
+            laplacian_var = laplacian.var()
         except Exception as e:
-            print(f"Error calculating sharpness: {e}")
+            logging.warning(f"Error calculating sharpness: {e}")
             return False
         
         try:
             # Check illumination
             brightness = np.mean(gray)
         except Exception as e:
-            print(f"Error calculating brightness: {e}")
+            logging.warning(f"Error calculating brightness: {e}")
             return False
         
         try:
@@ -254,34 +546,35 @@ class FaceRecognitionSystem:
             height, width = face_img.shape[:2]
             face_size = min(height, width)
         except Exception as e:
-            print(f"Error calculating face size: {e}")
+            logging.warning(f"Error calculating face size: {e}")
             return False
         
         try:
             # Check sharpness
             if laplacian_var <= self.min_sharpness:
-                print(f"Sharpness check failed: {laplacian_var} <= {self.min_sharpness}")
+                logging.debug(f"Sharpness check failed: {laplacian_var} <= {self.min_sharpness}")
                 return False
 
             # Check brightness
             if brightness <= self.min_brightness:
-                print(f"Brightness too low: {brightness} <= {self.min_brightness}")
+                logging.debug(f"Brightness too low: {brightness} <= {self.min_brightness}")
                 return False
             if brightness >= self.max_brightness:
-                print(f"Brightness too high: {brightness} >= {self.max_brightness}")
+                logging.debug(f"Brightness too high: {brightness} >= {self.max_brightness}")
                 return False
 
             # Check face size
             if face_size <= self.min_face_size:
-                print(f"Face size too small: {face_size} <= {self.min_face_size}")
+                logging.debug(f"Face size too small: {face_size} <= {self.min_face_size}")
                 return False
 
             # If all checks pass
             return True
         except Exception as e:
-            print(f"Error evaluating quality checks: {e}")
+            logging.warning(f"Error evaluating quality checks: {e}")
             return False
 
+    @timed("extract_features")
     def extract_features(self, face: np.ndarray) -> List[float]:
         """
         Extract facial features using DeepFace
@@ -297,16 +590,15 @@ class FaceRecognitionSystem:
             Face embedding
         """
         # Pre-process the image
-        face_rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
-        
-        # Normalize the image
-        face_rgb = face_rgb.astype(np.float32) / 255.0
-        face_rgb = (face_rgb * 255).astype(np.uint8)  # Convert back to uint8 for DeepFace
+        face_rgb = self._prepare_face(face)
+
+        # Make sure the model is loaded and warmed up through the registry
+        self.registry.embedding_model(self.model_name)
         
         # Extract embedding
         embedding = DeepFace.represent(
             face_rgb, 
-            model_name="Facenet", 
+            model_name=self.model_name, 
             enforce_detection=False
         )
         
@@ -317,6 +609,70 @@ class FaceRecognitionSystem:
             
         return embedding[0]['embedding']
 
+    @timed("extract_features_batch")
+    def extract_features_batch(self, faces: List[np.ndarray], batch_size: int = 32) -> np.ndarray:
+        """
+        Extract facial features for several aligned faces with batched model calls
+        
+        Each face goes through the same preprocessing as DeepFace.represent in
+        extract_features (face crop, resize and padding), so the embeddings
+        match the enrolled ones. The faces are then stacked and embedded with
+        one forward pass per batch instead of one pass per face.
+        
+        Parameters
+        ----------
+        faces : List[numpy.ndarray]
+            Aligned face images
+        batch_size : int, optional
+            Maximum number of faces per forward pass, by default 32
+        
+        Returns
+        -------
+        numpy.ndarray
+            (N, D) face embeddings, in the order of the input faces
+        """
+        if len(faces) == 0:
+            return np.zeros((0, self.embedding_dim or 0), dtype=np.float32)
+        self.metrics.count("faces_embedded", len(faces))
+
+        model = self.registry.embedding_model(self.model_name)
+        target_size = model.input_shape
+
+        inputs = []
+        for face in faces:
+            face_objs = DeepFace.extract_faces(
+                self._prepare_face(face),
+                enforce_detection=False
+            )
+
+            # represent() feeds the first detected face, flipped back to the input channel order
+            face_img = face_objs[0]["face"][:, :, ::-1]
+            face_img = preprocessing.resize_image(face_img, (target_size[1], target_size[0]))
+            inputs.append(preprocessing.normalize_input(face_img, normalization="base"))
+
+        embeddings = []
+        for start in range(0, len(inputs), batch_size):
+            batch = np.concatenate(inputs[start:start + batch_size], axis=0)
+            embeddings.append(np.asarray(model.model(batch, training=False)))
+        embeddings = np.concatenate(embeddings, axis=0).astype(np.float32)
+
+        # Store embedding dimension if not already set
+        if self.embedding_dim is None:
+            self.embedding_dim = embeddings.shape[1]
+            print(f"Setting embedding dimension from extraction: {self.embedding_dim}")
+
+        return embeddings
+
+    def _prepare_face(self, face: np.ndarray) -> np.ndarray:
+        """
+        Convert an aligned BGR face to the input expected by DeepFace
+        """
+        face_rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
+        
+        # Normalize the image
+        face_rgb = face_rgb.astype(np.float32) / 255.0
+        face_rgb = (face_rgb * 255).astype(np.uint8)  # Convert back to uint8 for DeepFace
+        return face_rgb
 
     def add_to_database(self, ID: str, embedding: List[float]) -> None:
         """
@@ -339,10 +695,10 @@ class FaceRecognitionSystem:
             
         if ID in self.face_database:
             # Check if we already have embeddings for this ID
-            if isinstance(self.face_database[ID][0], list):
-                # Limit to 5 embeddings per person
+            if isinstance(self.face_database[ID][0], (list, np.ndarray)):
+                # Limit to 5 embeddings per person (list() also detaches rows loaded from a binary gallery)
                 if len(self.face_database[ID]) < 5:
-                    self.face_database[ID].append(embedding)
+                    self.face_database[ID] = list(self.face_database[ID]) + [embedding]
             else:
                 # Convert to list of embeddings
                 self.face_database[ID] = [self.face_database[ID], embedding]
@@ -350,6 +706,10 @@ class FaceRecognitionSystem:
             # Create new entry with embedding in a list
             self.face_database[ID] = [embedding]
 
+        # Gallery is rebuilt on the next match so bulk additions stay cheap
+        self._gallery_dirty = True
+
+    @timed("match_face")
     def match_face(self, embedding: List[float], threshold: float = None) -> Optional[str]:
         """
         Match a face embedding against the database by calculating the average cosine similarity 
@@ -363,95 +723,381 @@ class FaceRecognitionSystem:
             self.embedding_dim = len(embedding)
             print(f"Setting embedding dimension: {self.embedding_dim}")
         elif len(embedding) != self.embedding_dim:
-            print(f"Warning: Input embedding dimension {len(embedding)} doesn't match expected {self.embedding_dim}")
+            logging.warning(f"Input embedding dimension {len(embedding)} doesn't match expected {self.embedding_dim}")
             return None
     
-        best_avg_distance = float('inf')
-        best_match_id = None
-        embedding_array = np.array(embedding).flatten()
-    
-        for ID, embeddings in self.face_database.items():
+        gallery = self.get_gallery()
+        if len(gallery) == 0:
+            return None
+
+        # Large galleries go through the approximate index instead of scoring every ID
+        if self._ann_active():
+            result = self.match_faces([embedding], threshold, top_k=1)[0]
+            if result["match"]:
+                logging.debug(f"Match found: {result['match']} with average distance {result['distance']:.4f}")
+            return result["match"]
+
+        # Average cosine distance to every ID in one matrix-vector product
+        avg_distances = gallery.distances(embedding)
+
+        best_index = int(np.argmin(avg_distances))
+        best_match_id = gallery.ids[best_index]
+        best_avg_distance = float(avg_distances[best_index])
+        match = best_match_id if best_avg_distance < threshold else None
+
+        # The closest IDs go to the decision trace instead of one console line per ID
+        if self.trace.enabled:
+            closest = top_k_smallest(avg_distances[None, :], 3)[0][0]
+            self.trace.record(
+                "match",
+                match=match,
+                distance=best_avg_distance,
+                threshold=threshold,
+                candidates=[[gallery.ids[i], float(avg_distances[i])] for i in closest]
+            )
+            
+        if match is not None:
+            logging.debug(f"Match found: {best_match_id} with average distance {best_avg_distance:.4f}")
+        return match
+
+    @timed("match_faces")
+    def match_faces(self, 
+                    embeddings: Union[np.ndarray, List[List[float]]], 
+                    threshold: float = None, 
+                    top_k: int = 3) -> List[Dict]:
+        """
+        Match several face embeddings against the database in one matrix product
+        
+        Parameters
+        ----------
+        embeddings : numpy.ndarray
+            (N, D) probe embeddings, one row per face
+        threshold : float, optional
+            Maximum average cosine distance for a match, by default match_threshold
+        top_k : int, optional
+            Number of closest IDs to report per probe, by default 3
+        
+        Returns
+        -------
+        List[Dict]
+            One result per probe with keys:
+            - "match": best ID, or None if its distance is not under the threshold
+            - "distance": average cosine distance of the best ID (None if no gallery)
+            - "candidates": list of (ID, distance) for the top_k closest IDs
+        """
+        if threshold is None:
+            threshold = self.match_threshold
+
+        probes = np.asarray(embeddings, dtype=np.float32)
+        if probes.size == 0:
+            return []
+        probes = probes.reshape(-1, probes.shape[-1])
+
+        if self.embedding_dim is None:
+            self.embedding_dim = probes.shape[1]
+            print(f"Setting embedding dimension: {self.embedding_dim}")
+
+        no_matches = [{"match": None, "distance": None, "candidates": []} for _ in range(probes.shape[0])]
+        if probes.shape[1] != self.embedding_dim:
+            logging.warning(f"Input embedding dimension {probes.shape[1]} doesn't match expected {self.embedding_dim}")
+            return no_matches
+
+        gallery = self.get_gallery()
+        if len(gallery) == 0:
+            return no_matches
+
+        indices, distances = self.search_gallery(probes, top_k=max(1, top_k))
+
+        results = []
+        for row_indices, row_distances in zip(indices, distances):
+            candidates = [(gallery.ids[i], float(d)) for i, d in zip(row_indices, row_distances) if i >= 0]
+            if not candidates:
+                results.append({"match": None, "distance": None, "candidates": []})
+                continue
+
+            best_id, best_distance = candidates[0]
+            results.append({
+                "match": best_id if best_distance < threshold else None,
+                "distance": best_distance,
+                "candidates": candidates[:top_k]
+            })
+            if self.trace.enabled:
+                self.trace.record(
+                    "match",
+                    match=results[-1]["match"],
+                    distance=best_distance,
+                    threshold=threshold,
+                    candidates=[list(candidate) for candidate in candidates[:top_k]]
+                )
+
+        return results
+
+    def confirm_matches(self, IDs: List[Optional[str]], timestamp: Optional[float] = None) -> List[str]:
+        """
+        Vote with the matches of one frame and return the IDs they confirm
+        
+        An ID is only confirmed after voter.consistency_threshold frames
+        matched it within voter.window seconds, so a single false match does
+        not mark a student. Several faces of one frame matched to the same ID
+        count as one vote.
+        
+        Parameters
+        ----------
+        IDs : List[Optional[str]]
+            Matched ID of each face, None for faces without a match
+        timestamp : float, optional
+            Time of the frame, by default now
+        
+        Returns
+        -------
+        List[str]
+            IDs confirmed by this frame
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        return self.voter.observe_all(IDs, timestamp)
+
+    def align_faces(self, 
+                    frame: np.ndarray, 
+                    faces: np.ndarray, 
+                    context: Optional[FrameContext] = None, 
+                    indices: Optional[List[int]] = None) -> Tuple[List[np.ndarray], List[int]]:
+        """
+        Align every detected face of a frame and keep those that pass the quality check
+        
+        The quality cascade runs first, so faces it rejects are never aligned or embedded.
+        
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            Frame the faces were detected in
+        faces : numpy.ndarray
+            Face bounding boxes returned by detect_faces
+        context : FrameContext, optional
+            Frame context filled by detect_faces
+        indices : List[int], optional
+            Only align these faces, by default all of them
+        
+        Returns
+        -------
+        Tuple[List[numpy.ndarray], List[int]]
+            The aligned faces and the index of each one in faces
+        """
+        if context is None or context.frame is not frame:
+            context = self.new_frame_context(frame)
+
+        aligned_faces = []
+        kept = []
+        for i in (range(len(faces)) if indices is None else indices):
+            face = faces[i]
             try:
-                if not embeddings:
+                # Cheap checks on the detection before any alignment work
+                measures = {}
+                rejected_by = self.quality.check(context, face, i, measures)
+                if self.trace.enabled:
+                    self.trace.record("quality", box=[int(v) for v in face[:4]], rejected_by=rejected_by, **measures)
+                if rejected_by is not None:
                     continue
-                
-                valid_embeddings = []
-                if isinstance(embeddings[0], list):  # Multiple embeddings
-                    for emb in embeddings:
-                        if not emb or not isinstance(emb, list):
-                            continue
-                        if len(emb) != self.embedding_dim:
-                            continue
-                        emb_array = np.array(emb).flatten()
-                        valid_embeddings.append(emb_array)
-                else:  # Single embedding
-                    if len(embeddings) != self.embedding_dim:
+
+                # Align the face
+                keypoints = context.keypoints[i] if context.keypoints is not None and i < len(context.keypoints) else None
+                aligned_face = self.align_face(frame, face, context=context, keypoints=keypoints)
+
+                # Check the aligned face
+                if ALIGNED in self.quality.stages:
+                    passed = self.assess_face_quality(aligned_face, context)
+                    self.quality.record_aligned(passed)
+                    if not passed:
+                        logging.debug("Aligned face quality check failed")
                         continue
-                    valid_embeddings.append(np.array(embeddings).flatten())
-    
-                # Skip if no valid embeddings
-                if not valid_embeddings:
-                    continue
-                    
-                # Calculate average distance across all embeddings for this ID
-                total_distance = 0
-                for db_embedding in valid_embeddings:
-                    total_distance += cosine(embedding_array, db_embedding)
-                
-                avg_distance = total_distance / len(valid_embeddings)
 
-                print(f"ID: {ID}, Avg Distance: {avg_distance:.4f}")
-                
-                # Update best match if this average is better
-                if avg_distance < best_avg_distance:
-                    best_avg_distance = avg_distance
-                    best_match_id = ID
+                aligned_faces.append(aligned_face)
+                kept.append(i)
                     
             except Exception as e:
-                print(f"Error processing ID {ID}: {e}")
-                continue
-            
-        if best_avg_distance < threshold:
-            print(f"Match found: {best_match_id} with average distance {best_avg_distance:.4f}")
-            return best_match_id
-    
-        return None
+                logging.warning(f"Error processing face: {e}")
+
+        return aligned_faces, kept
+
+    def process_detections(self, 
+                           frame: np.ndarray, 
+                           context: FrameContext, 
+                           indices: Optional[List[int]] = None, 
+                           threshold: Optional[float] = None) -> List[Dict]:
+        """
+        Recognize the faces already detected in a frame
+        
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            Frame the faces were detected in
+        context : FrameContext
+            Frame context filled by detect_faces (or an adaptive detector)
+        indices : List[int], optional
+            Only recognize these faces, by default all of them
+        threshold : float, optional
+            Match threshold, by default match_threshold
+        
+        Returns
+        -------
+        List[Dict]
+            One dictionary per face (in detection order) with:
+            - "box": [x, y, width, height]
+            - "keypoints": (5, 2) detector keypoints, None if unknown
+            - "score": detector confidence, None if unknown
+            - "quality_ok": whether the aligned face passed the quality check
+            - "embedding": face embedding, None if the face was not embedded
+            - "match": matched ID, None if no match
+            - "distance": average cosine distance of the closest ID, None if not matched
+        """
+        faces = context.faces if context.faces is not None else np.zeros((0, 4), dtype=np.int32)
+        if indices is None:
+            indices = list(range(len(faces)))
+
+        results = []
+        for i in indices:
+            results.append({
+                "box": [int(v) for v in faces[i][:4]],
+                "keypoints": context.keypoints[i] if context.keypoints is not None and i < len(context.keypoints) else None,
+                "score": float(context.scores[i]) if context.scores is not None and i < len(context.scores) else None,
+                "quality_ok": False,
+                "embedding": None,
+                "match": None,
+                "distance": None
+            })
+        if not results:
+            return results
+
+        # Align, embed and match the faces that pass the quality check in one batch
+        aligned_faces, kept = self.align_faces(frame, faces, context, indices)
+        positions = {index: position for position, index in enumerate(indices)}
+        try:
+            embeddings = self.extract_features_batch(aligned_faces)
+            matches = self.match_faces(embeddings, threshold)
+        except Exception as e:
+            logging.warning(f"Error recognizing faces: {e}")
+            embeddings, matches = [], []
+
+        for j, index in enumerate(kept):
+            result = results[positions[index]]
+            result["quality_ok"] = True
+            if j < len(matches):
+                result["embedding"] = embeddings[j]
+                result["match"] = matches[j]["match"]
+                result["distance"] = matches[j]["distance"]
+
+        return results
 
     def process_frame(self, frame: np.ndarray) -> Tuple[np.ndarray, List[str]]:
         """
         Process a single image frame for face detection and recognition (no consistency tracking).
+        
+        Use detect_faces and process_detections to reuse the detections of a frame.
+        
+        Returns
+        -------
+        Tuple[numpy.ndarray, List[str]]
+            The frame (not copied) and the recognized IDs
         """
-        display_frame = frame.copy()
-        faces = self.detect_faces(frame)
-        recognized_names = []
+        context = self.new_frame_context(frame)
+        self.detect_faces(frame, context=context)
+        results = self.process_detections(frame, context, threshold=self.match_threshold)
+        recognized_names = [result["match"] for result in results if result["match"]]
+        return frame, recognized_names
 
-        for face in faces:
-            try:
-                # Align the face
-                aligned_face = self.align_face(frame, face)
+    def save_database(self, file_path: str, format: str = "json") -> None:
+        """
+        Save the face database to a JSON file or a binary gallery
+        
+        Parameters
+        ----------
+        file_path : str
+            Path to save the database
+        format : str, optional
+            "json" (one file) or "binary" (memory-mappable gallery files next
+            to file_path, see EmbeddingGallery.save), by default "json"
+        """
+        if format not in DATABASE_FORMATS:
+            raise ValueError(f"Unknown database format {format}. Must be in {list(DATABASE_FORMATS)}.")
 
-                # Check quality
-                if not self.assess_face_quality(aligned_face):
-                    print("Face quality check failed.")
-                    continue
+        try:
+            if format == "json":
+                self.export_database_json(file_path)
+                return
 
-                # Extract features
-                embedding = self.extract_features(aligned_face)
+            self.get_gallery().save(file_path, model_name=self.model_name)
+            print(f"Database saved to {file_path}")
+        except Exception as e:
+            print(f"Error saving database: {e}")
 
-                # Match directly (no consistency threshold)
-                match = self.match_face(embedding, self.match_threshold)
+    def load_database(self, file_path: str, mmap: bool = True) -> None:
+        """
+        Load the face database from a JSON file or a binary gallery
+        
+        The format is detected from the files on disk (see database_format),
+        whatever the file name. Binary galleries are memory-mapped, so the
+        embeddings are not read into memory until they are used for matching.
+        
+        Parameters
+        ----------
+        file_path : str
+            Path the database was saved to
+        mmap : bool, optional
+            Memory-map binary galleries instead of reading them, by default True
+        """
+        if database_format(file_path) == "json":
+            self.import_database_json(file_path)
+            return
 
-                x, y, w, h = face
-                if match:
-                    recognized_names.append(match)
-                    
-            except Exception as e:
-                print(f"Error processing face: {e}")
+        try:
+            gallery = EmbeddingGallery.load(file_path, mmap=mmap)
+            if self._adopt_gallery(gallery):
+                print(f"Database loaded from {file_path} with {len(gallery)} entries")
+        except Exception as e:
+            print(f"Error loading database: {e}")
 
-        return display_frame, recognized_names
+    def _adopt_gallery(self, gallery: EmbeddingGallery, merge: bool = False) -> bool:
+        """
+        Start matching against a loaded binary gallery
+        
+        Parameters
+        ----------
+        gallery : EmbeddingGallery
+            Gallery loaded from disk
+        merge : bool, optional
+            Add its IDs to a non-empty face database instead of replacing it, by default False
+        
+        Returns
+        -------
+        bool
+            False if the gallery does not match the expected model or embedding dimension
+        """
+        model_name = gallery.metadata.get("model_name")
+        if model_name and model_name != self.model_name:
+            print(f"Warning: Gallery was built with {model_name}, expected {self.model_name}")
+            return False
 
+        if len(gallery) and self.embedding_dim is not None and gallery.embedding_dim != self.embedding_dim:
+            print(f"Warning: Gallery embedding dimension {gallery.embedding_dim} doesn't match expected {self.embedding_dim}")
+            return False
+        if self.embedding_dim is None and len(gallery):
+            self.embedding_dim = gallery.embedding_dim
+            print(f"Setting embedding dimension from database: {self.embedding_dim}")
+
+        if merge and self.face_database:
+            # Combine with the existing entries, this needs a new matrix
+            self.face_database.update(gallery.to_database())
+            self.refresh_gallery()
+            return True
+
+        # Use the loaded matrix directly, the database entries are views into it
+        self.face_database = gallery.to_database()
+        self.gallery = gallery
+        self._gallery_dirty = False
+        self._build_ann_index()
+        return True
 
-    def save_database(self, file_path: str) -> None:
+    def export_database_json(self, file_path: str) -> None:
         """
         Save the face database to a JSON file
         
@@ -461,13 +1107,21 @@ class FaceRecognitionSystem:
             Path to save the database
         """
         try:
+            # Entries loaded from a binary gallery are arrays, JSON needs lists
+            serializable = {}
+            for ID, embeddings in self.face_database.items():
+                if isinstance(embeddings, np.ndarray):
+                    serializable[ID] = embeddings.tolist()
+                else:
+                    serializable[ID] = [emb.tolist() if isinstance(emb, np.ndarray) else emb for emb in embeddings]
+
             with open(file_path, 'w') as f:
-                json.dump(self.face_database, f)
+                json.dump(serializable, f)
             print(f"Database saved to {file_path}")
         except Exception as e:
             print(f"Error saving database: {e}")
 
-    def load_database(self, file_path: str) -> None:
+    def import_database_json(self, file_path: str) -> None:
         """
         Load the face database from a JSON file
         
@@ -519,6 +1173,22 @@ class FaceRecognitionSystem:
                             print(f"Skipping entry for ID {ID} with incorrect dimension")
             
             self.face_database = valid_data
+            self.refresh_gallery()
             print(f"Database loaded from {file_path} with {len(valid_data)} valid entries")
         except Exception as e:
             print(f"Error loading database: {e}")
+
+
+def set_detector_input_size(detector, size: Tuple[int, int]) -> None:
+    """
+    Set the YuNet input size, only when it differs from the current one
+    
+    Parameters
+    ----------
+    detector : cv2.FaceDetectorYN
+        YuNet face detector
+    size : Tuple[int, int]
+        (width, height) of the next detector input
+    """
+    if tuple(detector.getInputSize()) != tuple(size):
+        detector.setInputSize(size)
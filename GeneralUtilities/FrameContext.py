@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+import threading
+from typing import Dict, Optional, Tuple
+
+# Scratch buffers are per thread, so pipeline stages running in parallel never share one
+_scratch = threading.local()
+
+
+def scratch_buffer(name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+    """
+    Reusable buffer owned by the calling thread
+
+    The same array is returned on every call with the same name, shape and
+    dtype, so it must only hold data that is used before the next call.
+
+    Parameters
+    ----------
+    name : str
+        Buffer name, different uses need different names
+    shape : Tuple[int, ...]
+        Buffer shape
+    dtype : numpy dtype, optional
+        Buffer type, by default uint8
+
+    Returns
+    -------
+    numpy.ndarray
+        Uninitialized buffer
+    """
+    buffers = getattr(_scratch, "buffers", None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+        buffer = buffers[name] = np.empty(shape, dtype=dtype)
+    return buffer
+
+
+class FrameContext:
+    """
+    Per-frame cache shared by detect_faces, align_face and assess_face_quality.
+
+    Conversions of the frame (grayscale, detector input) are computed once
+    and reused by every face in the frame. detect_faces also stores its
+    results here so later steps can use the detector keypoints and scores.
+    """
+
+    def __init__(self, frame: np.ndarray):
+        """
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            BGR frame
+        """
+        self.frame = frame
+        self.height, self.width = frame.shape[:2]
+        self._gray: Optional[np.ndarray] = None
+        self._detector_inputs: Dict[Tuple[int, int], np.ndarray] = {}
+
+        # Filled by detect_faces, in original frame coordinates
+        self.faces: Optional[np.ndarray] = None      # (N, 4) x, y, w, h
+        self.keypoints: Optional[np.ndarray] = None  # (N, 5, 2) eyes, nose tip, mouth corners
+        self.scores: Optional[np.ndarray] = None     # (N,) detector confidence
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Grayscale frame, converted on first use"""
+        if self._gray is None:
+            if self.frame.ndim == 2:
+                self._gray = self.frame
+            else:
+                self._gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def detector_input(self, size: Tuple[int, int]) -> np.ndarray:
+        """
+        Frame resized for the face detector, resized once per size
+
+        Parameters
+        ----------
+        size : Tuple[int, int]
+            (width, height) of the detector input
+
+        Returns
+        -------
+        numpy.ndarray
+            The resized frame, or the frame itself if it already has that size
+        """
+        if size == (self.width, self.height):
+            return self.frame
+
+        resized = self._detector_inputs.get(size)
+        if resized is None:
+            resized = cv2.resize(self.frame, size, interpolation=cv2.INTER_AREA)
+            self._detector_inputs[size] = resized
+        return resized
+
+    def buffer(self, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Reusable scratch buffer, see scratch_buffer"""
+        return scratch_buffer(name, shape, dtype)
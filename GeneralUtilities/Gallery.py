@@ -0,0 +1,400 @@
+import json
+import os
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# Version of the binary gallery layout written by EmbeddingGallery.save
+GALLERY_FORMAT_VERSION = 1
+
+# Formats of FaceRecognitionSystem.save_database
+DATABASE_FORMATS = ("json", "binary")
+
+
+class EmbeddingGallery:
+    """
+    Contiguous matrix of L2-normalized face embeddings grouped by ID.
+
+    Rows belonging to the same ID are stored next to each other, and
+    ``offsets`` marks where each ID's segment starts and ends, so the
+    embeddings of ``ids[i]`` are ``matrix[offsets[i]:offsets[i + 1]]``.
+    Matching a probe is one matrix-vector product followed by a mean over
+    each segment.
+    """
+
+    def __init__(self, matrix: np.ndarray, ids: List[str], offsets: np.ndarray):
+        """
+        Parameters
+        ----------
+        matrix : numpy.ndarray
+            (M, D) float32 matrix of L2-normalized embeddings, grouped by ID
+        ids : List[str]
+            IDs in segment order
+        offsets : numpy.ndarray
+            (len(ids) + 1,) segment boundaries into the rows of ``matrix``
+        """
+        self.matrix = matrix
+        self.ids = ids
+        self.offsets = offsets
+        self.counts = np.diff(offsets)
+        self.id_to_index = {ID: i for i, ID in enumerate(ids)}
+        self.metadata: Dict = {}
+
+    @classmethod
+    def empty(cls, embedding_dim: Optional[int] = None) -> "EmbeddingGallery":
+        """Create a gallery with no IDs"""
+        return cls(
+            np.zeros((0, embedding_dim or 0), dtype=np.float32),
+            [],
+            np.zeros(1, dtype=np.int64)
+        )
+
+    @classmethod
+    def from_database(cls,
+                      face_database: Dict[str, Sequence],
+                      embedding_dim: Optional[int] = None) -> "EmbeddingGallery":
+        """
+        Build a gallery from a ``FaceRecognitionSystem.face_database`` style dict
+
+        Parameters
+        ----------
+        face_database : Dict[str, Sequence]
+            ID -> list of embeddings (or a single flat embedding)
+        embedding_dim : int, optional
+            Expected embedding dimension, embeddings of other sizes are skipped
+
+        Returns
+        -------
+        EmbeddingGallery
+            Gallery holding every valid embedding in the database
+        """
+        ids = []
+        blocks = []
+        offsets = [0]
+
+        for ID, embeddings in face_database.items():
+            if embeddings is None or len(embeddings) == 0:
+                continue
+
+            block = np.asarray(embeddings, dtype=np.float32) if _is_uniform(embeddings) else None
+
+            if block is None:
+                # Ragged entries, keep only the rows with the expected dimension
+                rows = [np.asarray(emb, dtype=np.float32).ravel() for emb in embeddings
+                        if emb is not None and len(emb) > 0 and np.ndim(emb) == 1]
+                if embedding_dim is not None:
+                    rows = [row for row in rows if row.shape[0] == embedding_dim]
+                if not rows or len({row.shape[0] for row in rows}) != 1:
+                    continue
+                block = np.stack(rows)
+            elif block.ndim == 1:
+                # Single flat embedding
+                block = block.reshape(1, -1)
+            elif block.ndim != 2:
+                continue
+
+            if embedding_dim is None:
+                embedding_dim = block.shape[1]
+            elif block.shape[1] != embedding_dim:
+                continue
+
+            ids.append(ID)
+            blocks.append(block)
+            offsets.append(offsets[-1] + block.shape[0])
+
+        if not blocks:
+            return cls.empty(embedding_dim)
+
+        matrix = cls.normalize(np.concatenate(blocks, axis=0))
+        return cls(matrix, ids, np.asarray(offsets, dtype=np.int64))
+
+    @staticmethod
+    def normalize(vectors: Union[np.ndarray, Sequence]) -> np.ndarray:
+        """
+        L2-normalize vectors along the last axis
+
+        Parameters
+        ----------
+        vectors : numpy.ndarray
+            (D,) or (N, D) array of embeddings
+
+        Returns
+        -------
+        numpy.ndarray
+            Contiguous float32 array of unit-length vectors (zero vectors stay zero)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def num_embeddings(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def embedding_dim(self) -> Optional[int]:
+        return self.matrix.shape[1] if self.matrix.shape[1] else None
+
+    def embeddings_for(self, ID: str) -> np.ndarray:
+        """Return the normalized embeddings stored for an ID"""
+        i = self.id_to_index[ID]
+        return self.matrix[self.offsets[i]:self.offsets[i + 1]]
+
+    def distances(self, embedding: Union[np.ndarray, Sequence[float]]) -> np.ndarray:
+        """
+        Average cosine distance between a probe and every ID in the gallery
+
+        Parameters
+        ----------
+        embedding : numpy.ndarray
+            (D,) probe embedding, does not need to be normalized
+
+        Returns
+        -------
+        numpy.ndarray
+            (len(ids),) average cosine distance per ID, in ``ids`` order
+        """
+        if not self.ids:
+            return np.zeros(0, dtype=np.float32)
+
+        probe = self.normalize(np.ravel(embedding))
+        similarities = self.matrix @ probe
+
+        # Mean similarity over each ID's segment of rows
+        segment_sums = np.add.reduceat(similarities, self.offsets[:-1])
+        return 1.0 - segment_sums / self.counts
+
+    def batch_distances(self, embeddings: Union[np.ndarray, Sequence]) -> np.ndarray:
+        """
+        Average cosine distance between several probes and every ID
+
+        Parameters
+        ----------
+        embeddings : numpy.ndarray
+            (N, D) probe embeddings, do not need to be normalized
+
+        Returns
+        -------
+        numpy.ndarray
+            (N, len(ids)) average cosine distance per probe and ID
+        """
+        probes = self.normalize(np.atleast_2d(embeddings))
+        if not self.ids:
+            return np.zeros((probes.shape[0], 0), dtype=np.float32)
+
+        # One matrix product for all probes, then a mean over each ID's columns
+        similarities = probes @ self.matrix.T
+        segment_sums = np.add.reduceat(similarities, self.offsets[:-1], axis=1)
+        return 1.0 - segment_sums / self.counts
+
+    def search(self,
+               embeddings: Union[np.ndarray, Sequence],
+               top_k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the closest IDs for each probe
+
+        Parameters
+        ----------
+        embeddings : numpy.ndarray
+            (N, D) probe embeddings
+        top_k : int, optional
+            Number of closest IDs to return per probe, by default 1
+
+        Returns
+        -------
+        Tuple[numpy.ndarray, numpy.ndarray]
+            (N, k) ID indices and (N, k) average distances, closest first
+        """
+        distances = self.batch_distances(embeddings)
+        return top_k_smallest(distances, top_k)
+
+
+    def save(self, path: str, model_name: Optional[str] = None) -> None:
+        """
+        Save the gallery in the binary format
+
+        Three files are written next to each other:
+        - ``<base>.npy``: the (M, D) float32 normalized embedding matrix
+        - ``<base>.offsets.npy``: the (len(ids) + 1,) int64 segment offsets
+        - ``<base>.meta.json``: header with format version, embedding
+          dimension, model name and the IDs in segment order
+
+        Parameters
+        ----------
+        path : str
+            Base path of the gallery, a trailing ``.npy`` is ignored
+        model_name : str, optional
+            Name of the model that produced the embeddings
+        """
+        paths = gallery_paths(path)
+        directory = os.path.dirname(os.path.abspath(paths["matrix"]))
+        os.makedirs(directory, exist_ok=True)
+
+        header = {
+            "format_version": GALLERY_FORMAT_VERSION,
+            "embedding_dim": self.embedding_dim,
+            "model_name": model_name or self.metadata.get("model_name"),
+            "normalized": True,
+            "num_ids": len(self.ids),
+            "num_embeddings": self.num_embeddings,
+            "ids": self.ids
+        }
+
+        # Write to temporary files and swap them in, the header goes last so a
+        # partially written gallery is never picked up
+        _atomic_save_npy(paths["matrix"], np.ascontiguousarray(self.matrix, dtype=np.float32))
+        _atomic_save_npy(paths["offsets"], np.asarray(self.offsets, dtype=np.int64))
+        temp_path = paths["header"] + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(header, f)
+        os.replace(temp_path, paths["header"])
+
+        self.metadata = {key: value for key, value in header.items() if key != "ids"}
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "EmbeddingGallery":
+        """
+        Load a gallery saved with ``save``
+
+        Parameters
+        ----------
+        path : str
+            Base path of the gallery, a trailing ``.npy`` is ignored
+        mmap : bool, optional
+            Memory-map the embedding matrix read-only instead of reading it, by default True
+
+        Returns
+        -------
+        EmbeddingGallery
+            The loaded gallery, its header is available as ``metadata``
+        """
+        paths = gallery_paths(path)
+        with open(paths["header"], "r") as f:
+            header = json.load(f)
+
+        if header.get("format_version") != GALLERY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported gallery format version {header.get('format_version')}")
+
+        matrix = np.load(paths["matrix"], mmap_mode="r" if mmap else None)
+        offsets = np.load(paths["offsets"])
+        ids = header["ids"]
+
+        # Make sure the three files belong together
+        if (matrix.ndim != 2 or matrix.dtype != np.float32
+                or len(offsets) != len(ids) + 1
+                or offsets[-1] != matrix.shape[0]
+                or (ids and matrix.shape[1] != header["embedding_dim"])):
+            raise ValueError(f"Gallery files at {paths['matrix']} are inconsistent")
+
+        gallery = cls(matrix, ids, offsets)
+        gallery.metadata = {key: value for key, value in header.items() if key != "ids"}
+        return gallery
+
+    def to_database(self) -> Dict[str, np.ndarray]:
+        """
+        ID -> (n, D) view of the normalized embeddings, without copying the matrix
+        """
+        return {ID: self.matrix[self.offsets[i]:self.offsets[i + 1]] for i, ID in enumerate(self.ids)}
+
+
+def gallery_paths(path: str) -> Dict[str, str]:
+    """
+    File names used by the binary gallery format for a base path
+
+    Parameters
+    ----------
+    path : str
+        Base path, with or without a trailing ``.npy``
+
+    Returns
+    -------
+    Dict[str, str]
+        Paths of the "matrix", "offsets" and "header" files
+    """
+    base = path[:-len(".npy")] if path.endswith(".npy") else path
+    return {
+        "matrix": base + ".npy",
+        "offsets": base + ".offsets.npy",
+        "header": base + ".meta.json"
+    }
+
+
+def database_format(path: str) -> str:
+    """
+    On-disk format of a saved face database, detected from its contents
+
+    Parameters
+    ----------
+    path : str
+        Path the database was saved to
+
+    Returns
+    -------
+    str
+        "json" when path is a file starting with a JSON object, "binary" when
+        the gallery files of path exist, "json" otherwise (the JSON loader
+        then reports the missing or unreadable file)
+    """
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            if f.read(64).lstrip().startswith(b"{"):
+                return "json"
+    if os.path.exists(gallery_paths(path)["header"]):
+        return "binary"
+    return "json"
+
+
+def _atomic_save_npy(path: str, array: np.ndarray) -> None:
+    """Write an .npy file through a temporary file so readers never see a partial file"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(temp_path, path)
+
+
+def top_k_smallest(distances: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Indices and values of the k smallest entries in each row, sorted ascending
+
+    Parameters
+    ----------
+    distances : numpy.ndarray
+        (N, C) distance matrix
+    top_k : int
+        Number of entries to keep per row (clipped to C)
+
+    Returns
+    -------
+    Tuple[numpy.ndarray, numpy.ndarray]
+        (N, k) column indices and (N, k) distances
+    """
+    k = min(top_k, distances.shape[1])
+    if k <= 0:
+        empty = np.zeros((distances.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(distances.dtype)
+
+    # Partial partition first so large galleries never get fully sorted
+    if k < distances.shape[1]:
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(distances.shape[1]), (distances.shape[0], 1))
+    candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+
+    order = np.argsort(candidate_distances, axis=1, kind="stable")
+    return (np.take_along_axis(candidates, order, axis=1),
+            np.take_along_axis(candidate_distances, order, axis=1))
+
+
+def _is_uniform(embeddings: Sequence) -> bool:
+    """Check that a list of embeddings can be stacked into one array"""
+    if isinstance(embeddings, np.ndarray):
+        return True
+    first = embeddings[0]
+    if not isinstance(first, (list, tuple, np.ndarray)):
+        # Single flat embedding
+        return not any(isinstance(emb, (list, tuple, np.ndarray)) for emb in embeddings)
+    size = len(first)
+    return all(isinstance(emb, (list, tuple, np.ndarray)) and len(emb) == size for emb in embeddings)
@@ -0,0 +1,310 @@
+import numpy as np
+import time
+from typing import Dict, Optional, Tuple, Union, Sequence
+
+from GeneralUtilities.Gallery import EmbeddingGallery, top_k_smallest
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest neighbour index over an EmbeddingGallery.
+
+    Every ID is represented by the mean of its normalized embeddings. For a
+    unit probe q, the average cosine distance to an ID's embeddings e_i is
+    1 - q . mean(e_i), so scoring these mean vectors gives exactly the same
+    distance as the gallery's exhaustive search. The mean vectors are split
+    into ``n_lists`` clusters with spherical k-means, and a query only scores
+    the IDs in the ``n_probe`` clusters closest to it.
+
+    The recall depends on how the ID mean vectors are distributed. When they
+    form clusters, a few probed lists hold the true closest ID and queries
+    are much faster than exact search. On vectors spread uniformly over the
+    sphere (e.g. random synthetic galleries) the closest ID is often in a
+    list far down the probe order: on 50k random IDs with 5 embeddings each,
+    n_probe=16 finds the exact top-1 for only about a quarter of the
+    queries, and 95% recall needs so many lists that exact search is
+    faster. Always measure the recall on the real gallery (evaluate_recall,
+    tune_n_probe).
+
+    Recall/latency knobs
+    --------------------
+    n_lists : more lists means smaller lists and faster but less exact probes
+    n_probe : more probed lists means higher recall and slower queries
+    """
+
+    def __init__(self,
+                 n_lists: Optional[int] = None,
+                 n_probe: int = 16,
+                 n_iter: int = 10,
+                 max_train_size: int = 100000,
+                 seed: int = 0):
+        """
+        Parameters
+        ----------
+        n_lists : int, optional
+            Number of coarse clusters, by default about 4 * sqrt(number of IDs)
+        n_probe : int, optional
+            Number of clusters scored per query, by default 16
+        n_iter : int, optional
+            K-means iterations used to train the clusters, by default 10
+        max_train_size : int, optional
+            Maximum number of IDs sampled to train the clusters, by default 100000
+        seed : int, optional
+            Random seed for the cluster training, by default 0
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.max_train_size = max_train_size
+        self.seed = seed
+
+        self.centroids = None      # (n_lists, D) unit cluster directions
+        self.list_vectors = None   # (n_ids, D) ID mean vectors grouped by cluster
+        self.list_ids = None       # (n_ids,) gallery ID index of each row in list_vectors
+        self.list_offsets = None   # (n_lists + 1,) cluster boundaries into list_vectors
+        self.build_time = None
+
+    @property
+    def is_built(self) -> bool:
+        return self.centroids is not None
+
+    def build(self, gallery: EmbeddingGallery) -> "IVFIndex":
+        """
+        Train the coarse clusters and fill the inverted lists from a gallery
+
+        Parameters
+        ----------
+        gallery : EmbeddingGallery
+            Gallery to index, search results are indices into ``gallery.ids``
+
+        Returns
+        -------
+        IVFIndex
+            The built index
+        """
+        start = time.perf_counter()
+
+        # One mean vector per ID, its dot product with a unit probe is the mean similarity
+        id_vectors = np.add.reduceat(gallery.matrix, gallery.offsets[:-1], axis=0)
+        id_vectors = (id_vectors / gallery.counts[:, None]).astype(np.float32)
+
+        n_ids = id_vectors.shape[0]
+        n_lists = self.n_lists or int(round(4 * np.sqrt(n_ids)))
+        n_lists = max(1, min(n_lists, n_ids))
+
+        directions = EmbeddingGallery.normalize(id_vectors)
+        rng = np.random.default_rng(self.seed)
+        if n_ids > self.max_train_size:
+            train = directions[rng.choice(n_ids, self.max_train_size, replace=False)]
+        else:
+            train = directions
+        self.centroids = _spherical_kmeans(train, n_lists, self.n_iter, rng)
+
+        # Group the ID vectors by cluster so each inverted list is one contiguous slice
+        assignment = _assign(directions, self.centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+
+        self.list_vectors = np.ascontiguousarray(id_vectors[order])
+        self.list_ids = order.astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.build_time = time.perf_counter() - start
+
+        return self
+
+    def search(self,
+               embeddings: Union[np.ndarray, Sequence],
+               top_k: int = 1,
+               n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the approximate closest IDs for each probe
+
+        Parameters
+        ----------
+        embeddings : numpy.ndarray
+            (N, D) probe embeddings
+        top_k : int, optional
+            Number of closest IDs to return per probe, by default 1
+        n_probe : int, optional
+            Clusters scored per query, by default the index's n_probe
+
+        Returns
+        -------
+        Tuple[numpy.ndarray, numpy.ndarray]
+            (N, k) gallery ID indices and (N, k) average distances, closest
+            first. Missing results are padded with -1 and inf.
+        """
+        if not self.is_built:
+            raise ValueError("Index is not built. Call build() first.")
+
+        probes = EmbeddingGallery.normalize(np.atleast_2d(embeddings))
+        n_probe = max(1, min(n_probe or self.n_probe, self.centroids.shape[0]))
+
+        indices = np.full((probes.shape[0], top_k), -1, dtype=np.int64)
+        distances = np.full((probes.shape[0], top_k), np.inf, dtype=np.float32)
+
+        # Closest clusters for every probe in one product
+        probed_lists, _ = top_k_smallest(-(probes @ self.centroids.T), n_probe)
+
+        for p, lists in enumerate(probed_lists):
+            rows = np.concatenate([
+                np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in lists
+            ])
+            if rows.size == 0:
+                continue
+
+            candidate_distances = 1.0 - self.list_vectors[rows] @ probes[p]
+            best, best_distances = top_k_smallest(candidate_distances[None, :], top_k)
+            k = best.shape[1]
+            indices[p, :k] = self.list_ids[rows[best[0]]]
+            distances[p, :k] = best_distances[0]
+
+        return indices, distances
+
+    def evaluate_recall(self,
+                        gallery: EmbeddingGallery,
+                        probes: Optional[np.ndarray] = None,
+                        n_queries: int = 200,
+                        top_k: int = 1,
+                        n_probe: Optional[int] = None,
+                        noise: float = 0.5,
+                        exact: Optional[Tuple[np.ndarray, float]] = None) -> Dict[str, float]:
+        """
+        Compare the index against exact gallery search
+
+        Parameters
+        ----------
+        gallery : EmbeddingGallery
+            The gallery the index was built from
+        probes : numpy.ndarray, optional
+            (N, D) query embeddings, by default gallery embeddings with added noise
+        n_queries : int, optional
+            Number of generated queries when probes is not given, by default 200
+        top_k : int, optional
+            Recall is measured over the top_k exact results, by default 1
+        n_probe : int, optional
+            Clusters scored per query, by default the index's n_probe
+        noise : float, optional
+            Relative noise added to generated queries, by default 0.5
+        exact : Tuple[numpy.ndarray, float], optional
+            Exact top_k indices of the probes and exact milliseconds per query
+            from exact_search, to skip the exact search on repeated calls
+
+        Returns
+        -------
+        Dict[str, float]
+            recall, ann_ms_per_query, exact_ms_per_query and n_probe
+        """
+        if probes is None:
+            probes = self.sample_queries(gallery, n_queries, noise)
+        probes = np.atleast_2d(probes)
+        exact_indices, exact_ms = exact if exact is not None else self.exact_search(gallery, probes, top_k)
+
+        # Time queries one at a time, as they arrive from the camera
+        start = time.perf_counter()
+        ann_indices = np.vstack([self.search(probe, top_k, n_probe)[0] for probe in probes])
+        ann_time = time.perf_counter() - start
+
+        hits = sum(len(set(exact_row) & set(ann_row)) for exact_row, ann_row in zip(exact_indices, ann_indices))
+
+        return {
+            "recall": hits / float(exact_indices.size),
+            "ann_ms_per_query": 1000.0 * ann_time / probes.shape[0],
+            "exact_ms_per_query": exact_ms,
+            "n_probe": n_probe or self.n_probe
+        }
+
+    def sample_queries(self, gallery: EmbeddingGallery, n_queries: int = 200, noise: float = 0.5) -> np.ndarray:
+        """Gallery embeddings with added noise, like new captures of enrolled faces"""
+        rng = np.random.default_rng(self.seed + 1)
+        rows = rng.choice(gallery.num_embeddings, min(n_queries, gallery.num_embeddings), replace=False)
+        base = np.asarray(gallery.matrix[np.sort(rows)])
+        jitter = rng.normal(size=base.shape).astype(np.float32)
+        return base + noise * EmbeddingGallery.normalize(jitter)
+
+    @staticmethod
+    def exact_search(gallery: EmbeddingGallery, probes: np.ndarray, top_k: int = 1) -> Tuple[np.ndarray, float]:
+        """Exact top_k indices of the probes and milliseconds per query, queried one at a time like the index"""
+        start = time.perf_counter()
+        indices = np.vstack([gallery.search(probe, top_k)[0] for probe in probes])
+        return indices, 1000.0 * (time.perf_counter() - start) / len(probes)
+
+    def tune_n_probe(self,
+                     gallery: EmbeddingGallery,
+                     target_recall: float = 0.99,
+                     probes: Optional[np.ndarray] = None,
+                     top_k: int = 1) -> Dict[str, float]:
+        """
+        Double n_probe until the measured recall reaches the target
+
+        Doubling stops early once the index is no faster than exact search,
+        so the returned recall can be below the target; callers should check it.
+
+        Parameters
+        ----------
+        gallery : EmbeddingGallery
+            The gallery the index was built from
+        target_recall : float, optional
+            Recall to reach, by default 0.99
+        probes : numpy.ndarray, optional
+            Query embeddings, see evaluate_recall
+        top_k : int, optional
+            Recall is measured over the top_k exact results, by default 1
+
+        Returns
+        -------
+        Dict[str, float]
+            The evaluate_recall report for the chosen n_probe
+        """
+        if probes is None:
+            probes = self.sample_queries(gallery)
+        probes = np.atleast_2d(probes)
+        exact = self.exact_search(gallery, probes, top_k)
+
+        n_probe = max(1, self.n_probe)
+        while True:
+            report = self.evaluate_recall(gallery, probes=probes, top_k=top_k, n_probe=n_probe, exact=exact)
+            if (report["recall"] >= target_recall
+                    or report["ann_ms_per_query"] >= report["exact_ms_per_query"]
+                    or n_probe >= self.centroids.shape[0]):
+                break
+            n_probe = min(2 * n_probe, self.centroids.shape[0])
+
+        self.n_probe = n_probe
+        return report
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid for each vector, computed in row blocks"""
+    assignment = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], block_size):
+        block = vectors[start:start + block_size]
+        assignment[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def _spherical_kmeans(vectors: np.ndarray,
+                      n_clusters: int,
+                      n_iter: int,
+                      rng: np.random.Generator) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity, returns unit centroids"""
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignment = _assign(vectors, centroids)
+        counts = np.bincount(assignment, minlength=n_clusters)
+
+        # Sum the members of each cluster with one sort and a segment reduction
+        order = np.argsort(assignment, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(vectors[order], starts[filled], axis=0)
+
+        # Restart empty clusters from random vectors
+        if not filled.all():
+            sums[~filled] = vectors[rng.choice(vectors.shape[0], int((~filled).sum()))]
+
+        centroids = EmbeddingGallery.normalize(sums)
+
+    return centroids
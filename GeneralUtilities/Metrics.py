@@ -0,0 +1,297 @@
+import bisect
+import csv
+import functools
+import io
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Histogram bucket upper bounds in seconds, 25% apart from 10 microseconds to about 100 seconds
+BUCKET_BOUNDS = [1e-5 * 1.25 ** i for i in range(73)]
+
+# Columns of the CSV metrics files, one row per metric and snapshot
+CSV_FIELDS = ["timestamp", "metric", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "per_second"]
+
+
+class LatencyHistogram:
+    """
+    Latency distribution with fixed logarithmic buckets.
+
+    Recording is a bisect and a few additions, so it is cheap enough to run
+    on every call. Percentiles are the upper bound of the bucket they fall
+    in, within 25% of the true value.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed: float) -> None:
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, elapsed)] += 1
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def percentile(self, q: float) -> float:
+        """Latency in seconds below which a share q of the calls fall"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKET_BOUNDS[i], self.max) if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": 1000.0 * self.total / self.count if self.count else 0.0,
+            "p50_ms": 1000.0 * self.percentile(0.50),
+            "p95_ms": 1000.0 * self.percentile(0.95),
+            "p99_ms": 1000.0 * self.percentile(0.99),
+            "max_ms": 1000.0 * self.max
+        }
+
+
+class Metrics:
+    """
+    Call latencies and throughput counters of a FaceRecognitionSystem.
+
+    Latencies are kept per call name in LatencyHistograms, counters count
+    frames, faces and anything else. Everything is thread-safe, so the
+    pipeline stages can record concurrently. Set ``enabled`` to False to
+    skip the recording entirely.
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+        Parameters
+        ----------
+        enabled : bool, optional
+            Record calls and counters, by default True
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, int] = {}
+        self.started = time.time()
+        self._writer: Optional["MetricsWriter"] = None
+
+    def record(self, name: str, elapsed: float) -> None:
+        """Record one call of name that took elapsed seconds"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.record(elapsed)
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Add n to the counter name"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def count_frame(self, n_faces: int) -> None:
+        """Count a processed frame and the faces detected in it"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters["frames"] = self._counters.get("frames", 0) + 1
+            self._counters["faces"] = self._counters.get("faces", 0) + n_faces
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of every metric
+
+        Returns
+        -------
+        Dict[str, Any]
+            {"elapsed": seconds since the start or reset,
+             "counters": {name: count},
+             "rates": {name: count per second},
+             "faces_per_frame": float,
+             "latency": {name: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"}}}
+        """
+        with self._lock:
+            elapsed = time.time() - self.started
+            counters = dict(self._counters)
+            latency = {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
+
+        frames = counters.get("frames", 0)
+        return {
+            "elapsed": elapsed,
+            "counters": counters,
+            "rates": {name: count / elapsed if elapsed > 0 else 0.0 for name, count in counters.items()},
+            "faces_per_frame": counters.get("faces", 0) / frames if frames else 0.0,
+            "latency": latency
+        }
+
+    def reset(self) -> None:
+        """Forget every recorded call and counter"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def print_stats(self) -> None:
+        """Print the throughput and one line per timed call"""
+        stats = self.stats()
+        rates = stats["rates"]
+        print(f"{stats['counters'].get('frames', 0)} frames in {stats['elapsed']:.1f}s: "
+              f"{rates.get('frames', 0.0):.2f} frames/s, {rates.get('faces', 0.0):.2f} faces/s, "
+              f"{stats['faces_per_frame']:.2f} faces/frame")
+        for name, latency in stats["latency"].items():
+            print(f"  {name:>22}: {latency['count']} calls, {latency['mean_ms']:.1f} ms mean, "
+                  f"p50 {latency['p50_ms']:.1f} ms, p95 {latency['p95_ms']:.1f} ms, max {latency['max_ms']:.1f} ms")
+
+    def start_writer(self, path: str, interval: float = 10.0, max_bytes: int = 5_000_000, backup_count: int = 3) -> "MetricsWriter":
+        """Write a snapshot every interval seconds to a rotating file, see MetricsWriter"""
+        self.stop_writer()
+        self._writer = MetricsWriter(self, path, interval, max_bytes, backup_count).start()
+        return self._writer
+
+    def stop_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.stop()
+            self._writer = None
+
+
+class MetricsWriter:
+    """
+    Background thread appending Metrics snapshots to a rotating file.
+
+    Paths ending in ``.csv`` get one row per metric and snapshot (see
+    CSV_FIELDS), any other path gets one JSON object per snapshot and line.
+    When the file would grow past max_bytes it is renamed to ``path.1``
+    (older files shift to ``.2`` and so on) and a new file is started.
+    """
+
+    def __init__(self,
+                 metrics: Metrics,
+                 path: str,
+                 interval: float = 10.0,
+                 max_bytes: int = 5_000_000,
+                 backup_count: int = 3):
+        """
+        Parameters
+        ----------
+        metrics : Metrics
+            Metrics to write
+        path : str
+            Output file, .csv for CSV, JSON lines otherwise
+        interval : float, optional
+            Seconds between snapshots, by default 10.0
+        max_bytes : int, optional
+            Size at which the file is rotated, by default 5 MB
+        backup_count : int, optional
+            Rotated files kept, by default 3
+        """
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.csv = path.endswith(".csv")
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def start(self) -> "MetricsWriter":
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Stop the thread, writing a last snapshot"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def write(self, stats: Optional[Dict[str, Any]] = None) -> None:
+        """Append one snapshot, the current one by default"""
+        stats = stats or self.metrics.stats()
+        timestamp = time.time()
+        if self.csv:
+            lines = self._csv_lines(timestamp, stats)
+        else:
+            lines = json.dumps({"timestamp": timestamp, **stats}) + "\n"
+
+        rotate_file(self.path, len(lines.encode("utf-8")), self.max_bytes, self.backup_count)
+        new_file = not os.path.exists(self.path)
+        with open(self.path, "a", newline="") as f:
+            if self.csv and new_file:
+                csv.writer(f).writerow(CSV_FIELDS)
+            f.write(lines)
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self._write_safely()
+        self._write_safely()
+
+    def _write_safely(self) -> None:
+        try:
+            self.write()
+        except (OSError, ValueError) as e:
+            print(f"Error writing metrics: {e}")
+
+    def _csv_lines(self, timestamp: float, stats: Dict[str, Any]) -> str:
+        rows: List[List[Any]] = []
+        for name, count in stats["counters"].items():
+            rows.append([timestamp, name, count, "", "", "", "", "", stats["rates"][name]])
+        for name, latency in stats["latency"].items():
+            rows.append([timestamp, name, latency["count"], latency["mean_ms"], latency["p50_ms"],
+                         latency["p95_ms"], latency["p99_ms"], latency["max_ms"], ""])
+
+        lines = io.StringIO()
+        csv.writer(lines).writerows(rows)
+        return lines.getvalue()
+
+
+def rotate_file(path: str, incoming: int, max_bytes: int, backup_count: int) -> None:
+    """
+    Rotate path before incoming more bytes are appended, if it would grow past max_bytes
+
+    path is renamed to ``path.1``, older files shift to ``.2`` and so on,
+    and files past backup_count are overwritten.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) + incoming <= max_bytes:
+        return
+    if backup_count <= 0:
+        os.remove(path)
+        return
+    for i in range(backup_count - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def timed(name: str) -> Callable:
+    """
+    Decorator recording the latency of a method in ``self.metrics`` under name
+
+    Nothing is recorded when the object has no metrics or they are disabled.
+    """
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = getattr(self, "metrics", None)
+            if metrics is None or not metrics.enabled:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
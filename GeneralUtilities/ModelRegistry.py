@@ -0,0 +1,206 @@
+import cv2
+import numpy as np
+import threading
+import time
+from deepface import DeepFace
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# dlib is optional, it is only used by the landmark aligner
+try:
+    import dlib
+except ImportError:
+    dlib = None
+
+# Default model locations, relative to the working directory like the rest of the app
+DEFAULT_DETECTOR_PATH = "Models/face_detection_yunet_2023mar.onnx"
+DEFAULT_LANDMARKS_PATH = "Models/shape_predictor_68_face_landmarks.dat"
+DEFAULT_EMBEDDING_MODEL = "Facenet"
+
+
+class ModelRegistry:
+    """
+    Loads each model once per process and shares it between FaceRecognitionSystem instances.
+
+    Every model is loaded on first request, then run once on a dummy input
+    so the first real call does not pay for lazy initialization. Load and
+    warm-up times are recorded and available through ``timings``.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self,
+            key: str,
+            loader: Callable[[], Any],
+            warm_up: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Return a shared model, loading and warming it up on first use
+
+        Parameters
+        ----------
+        key : str
+            Unique name of the model
+        loader : Callable[[], Any]
+            Builds the model
+        warm_up : Callable[[Any], None], optional
+            Runs a dummy inference on the freshly loaded model
+
+        Returns
+        -------
+        Any
+            The shared model
+        """
+        if key in self._models:
+            return self._models[key]
+
+        # One lock per model, so a slow load does not block the other models
+        with self._lock:
+            model_lock = self._locks.setdefault(key, threading.Lock())
+
+        with model_lock:
+            if key in self._models:
+                return self._models[key]
+
+            start = time.perf_counter()
+            model = loader()
+            load_time = time.perf_counter() - start
+
+            warm_up_time = 0.0
+            if warm_up is not None:
+                start = time.perf_counter()
+                try:
+                    warm_up(model)
+                except Exception as e:
+                    print(f"Warning: Warm-up failed for {key}: {e}")
+                warm_up_time = time.perf_counter() - start
+
+            self._timings[key] = {"load_s": load_time, "warmup_s": warm_up_time}
+            self._models[key] = model
+            print(f"Loaded {key} in {load_time:.2f}s (warm-up {warm_up_time:.2f}s)")
+
+        return model
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._models
+
+    def timings(self) -> Dict[str, Dict[str, float]]:
+        """
+        Load and warm-up times of every loaded model
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            Model key -> {"load_s": seconds, "warmup_s": seconds}
+        """
+        return {key: dict(value) for key, value in self._timings.items()}
+
+    def face_detector(self,
+                      model_path: str = DEFAULT_DETECTOR_PATH,
+                      input_size: Tuple[int, int] = (640, 480)) -> Any:
+        """
+        Shared YuNet face detector
+
+        The detector keeps its input size as state, so it must only be used
+        from one thread at a time. Use ``create_face_detector`` for a private copy.
+        """
+        return self.get(
+            f"yunet:{model_path}",
+            lambda: self.create_face_detector(model_path, input_size),
+            _warm_up_face_detector
+        )
+
+    def create_face_detector(self,
+                             model_path: str = DEFAULT_DETECTOR_PATH,
+                             input_size: Tuple[int, int] = (640, 480)) -> Any:
+        """
+        New YuNet face detector that is not shared (the ONNX file is small and quick to load)
+        """
+        return cv2.FaceDetectorYN_create(model_path, "", input_size)
+
+    def landmark_predictor(self, landmarks_path: str = DEFAULT_LANDMARKS_PATH) -> Any:
+        """
+        Shared dlib 68-point facial landmarks predictor
+        """
+        if dlib is None:
+            raise ImportError("dlib is required for the landmarks predictor")
+        return self.get(
+            f"dlib:{landmarks_path}",
+            lambda: dlib.shape_predictor(landmarks_path),
+            _warm_up_landmark_predictor
+        )
+
+    def embedding_model(self, model_name: str = DEFAULT_EMBEDDING_MODEL) -> Any:
+        """
+        Shared DeepFace embedding model (built by DeepFace.build_model)
+        """
+        return self.get(
+            f"deepface:{model_name}",
+            lambda: DeepFace.build_model(model_name),
+            lambda model: _warm_up_embedding_model(model, model_name)
+        )
+
+    def warm_up(self,
+                model_path: str = DEFAULT_DETECTOR_PATH,
+                landmarks_path: Optional[str] = DEFAULT_LANDMARKS_PATH,
+                model_name: str = DEFAULT_EMBEDDING_MODEL) -> Dict[str, Dict[str, float]]:
+        """
+        Load and warm up every model used for recognition
+
+        Meant to run in a background thread at startup. Errors are printed,
+        not raised, so a missing model file does not stop the application.
+
+        Parameters
+        ----------
+        model_path : str, optional
+            Path to the YuNet ONNX model file
+        landmarks_path : str, optional
+            Path to the dlib landmarks predictor, None to skip it (skipped without dlib)
+        model_name : str, optional
+            DeepFace embedding model name
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            The timings of every loaded model
+        """
+        loaders = [
+            lambda: self.face_detector(model_path),
+            lambda: self.embedding_model(model_name)
+        ]
+        if landmarks_path and dlib is not None:
+            loaders.append(lambda: self.landmark_predictor(landmarks_path))
+
+        for loader in loaders:
+            try:
+                loader()
+            except Exception as e:
+                print(f"Error loading model: {e}")
+
+        return self.timings()
+
+
+def _warm_up_face_detector(detector: Any) -> None:
+    """Run the detector once on a blank frame"""
+    detector.setInputSize((640, 480))
+    detector.detect(np.zeros((480, 640, 3), dtype=np.uint8))
+
+
+def _warm_up_landmark_predictor(predictor: Any) -> None:
+    """Run the landmark predictor once on a blank image"""
+    predictor(np.zeros((128, 128), dtype=np.uint8), dlib.rectangle(16, 16, 112, 112))
+
+
+def _warm_up_embedding_model(model: Any, model_name: str) -> None:
+    """Run DeepFace.represent once so its face detector and the model graph are built"""
+    DeepFace.represent(
+        np.zeros((256, 256, 3), dtype=np.uint8),
+        model_name=model_name,
+        enforce_detection=False
+    )
+
+
+# Registry shared by the whole process
+model_registry = ModelRegistry()
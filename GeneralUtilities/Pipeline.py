@@ -0,0 +1,666 @@
+import cv2
+import numpy as np
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from GeneralUtilities.AdaptiveDetection import AdaptiveFaceDetector
+from GeneralUtilities.Capture import LatestFrameCapture
+from GeneralUtilities.Scheduling import RecognitionScheduler
+from GeneralUtilities.Tracking import FaceTracker
+
+# Queue policies when a stage's input queue is full
+BLOCK = "block"               # wait for room (backpressure on the producer)
+DROP_OLDEST = "drop_oldest"   # discard the oldest queued item to make room
+DROP_NEWEST = "drop_newest"   # discard the incoming item
+
+
+class StageQueue:
+    """
+    Bounded queue between two pipeline stages with a policy for when it is full
+    """
+
+    def __init__(self, maxsize: int = 2, policy: str = DROP_OLDEST):
+        """
+        Parameters
+        ----------
+        maxsize : int, optional
+            Maximum number of queued items, by default 2
+        policy : str, optional
+            BLOCK, DROP_OLDEST or DROP_NEWEST, by default DROP_OLDEST
+        """
+        if policy not in (BLOCK, DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown queue policy '{policy}'. Must be one of ['{BLOCK}', '{DROP_OLDEST}', '{DROP_NEWEST}'].")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, item: Any, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Queue an item following the queue policy
+
+        Parameters
+        ----------
+        item : Any
+            Item to queue
+        stop_event : threading.Event, optional
+            Stops a blocking put when set
+
+        Returns
+        -------
+        bool
+            True if the item was queued
+        """
+        if self.policy == BLOCK:
+            while stop_event is None or not stop_event.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+
+            # Make room by discarding the oldest item, then try again
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+
+    def get(self, timeout: float = 0.1) -> Any:
+        """Next item, raises queue.Empty after timeout seconds"""
+        return self._queue.get(timeout=timeout)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def resize(self, maxsize: int) -> None:
+        """Change the maximum number of queued items, queued items are kept"""
+        with self._queue.mutex:
+            self.maxsize = maxsize
+            self._queue.maxsize = maxsize
+            self._queue.not_full.notify_all()
+
+
+class StageStats:
+    """
+    Processed count and latency of one pipeline stage, safe to read from any thread
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_time = 0.0
+
+    def record(self, elapsed: float) -> None:
+        with self._lock:
+            self.processed += 1
+            self.total_time += elapsed
+            self.last_time = elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            mean = self.total_time / self.processed if self.processed else 0.0
+            return {
+                "processed": self.processed,
+                "errors": self.errors,
+                "latency_ms_mean": 1000.0 * mean,
+                "latency_ms_max": 1000.0 * self.max_time,
+                "latency_ms_last": 1000.0 * self.last_time
+            }
+
+
+class PipelineStage:
+    """
+    One pipeline stage: a worker thread that takes items from its input queue,
+    processes them and passes the result to the next stage's queue.
+    """
+
+    def __init__(self,
+                 name: str,
+                 process: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                 input_queue: StageQueue,
+                 output_queue: Optional[StageQueue] = None,
+                 on_exit: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Parameters
+        ----------
+        name : str
+            Stage name, used in the stats
+        process : Callable
+            Processes one packet, returns the packet for the next stage or None to stop it here
+        input_queue : StageQueue
+            Queue the stage reads from
+        output_queue : StageQueue, optional
+            Queue of the next stage, None for the last stage
+        on_exit : Callable, optional
+            Called with every packet that does not go on to the next stage
+            (stopped, dropped by the next queue or failed)
+        """
+        self.name = name
+        self.process = process
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.on_exit = on_exit
+        self.stats = StageStats()
+        self._thread = None
+
+    def start(self, stop_event: threading.Event) -> None:
+        self._thread = threading.Thread(target=self._run, args=(stop_event,), name=f"pipeline-{self.name}", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self, stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                packet = self.input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = self.process(packet)
+            except Exception as e:
+                print(f"Error in {self.name} stage: {e}")
+                self.stats.record_error()
+                result = None
+            else:
+                self.stats.record(time.perf_counter() - start)
+
+            passed = result is not None and self.output_queue is not None and self.output_queue.put(result, stop_event)
+            if not passed and self.on_exit is not None:
+                self.on_exit(packet)
+
+
+class CameraFeed:
+    """
+    Per-camera part of a RecognitionPipeline: the capture thread, the
+    detection stage, the face tracker, the recognition scheduler and the
+    newest preview of one camera.
+
+    The capture thread is a LatestFrameCapture that is also the input of the
+    detection stage, so detection always takes the newest frame and frames
+    captured while it was busy are dropped.
+    """
+
+    def __init__(self,
+                 camera_id: Any,
+                 capture,
+                 scheduler: Optional[RecognitionScheduler] = None,
+                 tracker: Optional[FaceTracker] = None,
+                 detector: Optional[AdaptiveFaceDetector] = None,
+                 face_detector=None,
+                 on_end: Optional[Callable[[], None]] = None):
+        """
+        Parameters
+        ----------
+        camera_id : Any
+            Camera name in the previews and stats, e.g. its device index
+        capture : cv2.VideoCapture
+            Opened video source, it is read by the capture thread but released by the caller
+        scheduler : RecognitionScheduler, optional
+            Starts the recognition passes of this camera, by default at most 4 passes per second
+        tracker : FaceTracker, optional
+            Face tracker, by default one retrying unresolved tracks every 0.25 seconds
+        detector : AdaptiveFaceDetector, optional
+            Adaptive detection around the tracked faces, by default full-frame detection
+        face_detector : cv2.FaceDetectorYN, optional
+            YuNet instance for full-frame detection, by default the face system's shared one
+        on_end : Callable[[], None], optional
+            Called from the capture thread when the camera stops delivering frames
+        """
+        self.camera_id = camera_id
+        self.capture = capture
+        self.source = LatestFrameCapture(capture, name=f"camera {camera_id}", on_end=on_end)
+        self.scheduler = scheduler or RecognitionScheduler()
+        self.tracker = tracker or FaceTracker()
+        self.detector = detector
+        self.face_detector = face_detector
+
+        self.detect_stage: Optional[PipelineStage] = None
+        self.preview: Optional[Dict[str, Any]] = None
+
+    @property
+    def frames_captured(self) -> int:
+        return self.source.frames_read
+
+    @property
+    def capture_failed(self) -> bool:
+        return self.source.failed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Frame rate, detection queue and recognition state of the camera
+
+        Returns
+        -------
+        Dict[str, Any]
+            frames_captured, fps, frames_dropped (captured frames never detected on),
+            capture_failed, detect (stage stats with queue depth), tracker, scheduler
+            and detector with adaptive detection
+        """
+        detect = self.detect_stage.stats.snapshot()
+        detect["queue_depth"] = self.detect_stage.input_queue.depth()
+        detect["queue_size"] = self.detect_stage.input_queue.maxsize
+        detect["dropped"] = self.detect_stage.input_queue.dropped
+        stats = {
+            "frames_captured": self.frames_captured,
+            "fps": self.source.fps(),
+            "frames_dropped": self.source.dropped,
+            "capture_failed": self.capture_failed,
+            "detect": detect,
+            "tracker": self.tracker.stats(),
+            "scheduler": self.scheduler.stats()
+        }
+        if self.detector is not None:
+            stats["detector"] = self.detector.stats()
+        return stats
+
+
+class RecognitionPipeline:
+    """
+    Threaded capture -> detect -> align -> embed -> match pipeline.
+
+    Every stage runs on its own thread and the stages are connected by
+    bounded queues. Capture and detection run on every frame and feed the
+    preview, so the preview keeps its frame rate while the slower
+    recognition stages work behind it.
+
+    Detected faces are followed by a FaceTracker, and only the faces of new
+    or unresolved tracks are sent to recognition, when the RecognitionScheduler
+    allows a pass (previous pass finished, within the passes per second budget). A track keeps an
+    identity once its own matches agree (FaceTracker.vote), so each person
+    is embedded a few times per track. Attendance is reported from the face
+    system's TemporalVoter, which confirms IDs across tracks and cameras.
+
+    Several cameras can feed one pipeline (see add_camera). Each camera has
+    its own capture thread, detection stage, tracker and scheduler, while the
+    align, embed and match stages, the embedding model and the gallery are
+    shared. Votes from every camera go to the same voter, so a student seen
+    by two cameras is confirmed once and reported once.
+
+    Queue policies
+    --------------
+    detect : latest-frame slot per camera (LatestFrameCapture), detection always works on the newest frame
+    align : size cameras + 1, drop newest, frames are skipped while recognition is busy
+    embed, match : block, faces already selected for recognition are never lost
+    """
+
+    def __init__(self,
+                 face_system,
+                 capture=None,
+                 on_recognized: Optional[Callable[[List[str]], None]] = None,
+                 scheduler: Optional[RecognitionScheduler] = None,
+                 tracker: Optional[FaceTracker] = None,
+                 detector: Optional[AdaptiveFaceDetector] = None):
+        """
+        Parameters
+        ----------
+        face_system : FaceRecognitionSystem
+            System with the loaded student database
+        capture : cv2.VideoCapture, optional
+            Opened video source of camera 0, read by the capture thread but released by the caller.
+            None to add the cameras with add_camera
+        on_recognized : Callable[[List[str]], None], optional
+            Called from the match thread with the newly confirmed IDs
+        scheduler : RecognitionScheduler, optional
+            Starts the recognition passes, by default at most 4 passes per second
+        tracker : FaceTracker, optional
+            Face tracker, by default one retrying unresolved tracks every 0.25 seconds
+        detector : AdaptiveFaceDetector, optional
+            Adaptive detection around the tracked faces, by default detect_faces on the full frame
+        """
+        self.face_system = face_system
+        self.on_recognized = on_recognized
+        self.feeds: List[CameraFeed] = []
+
+        self._stop_event = threading.Event()
+        self._started = False
+
+        # Newest detection result of every camera, shown by the preview
+        self._preview_condition = threading.Condition()
+
+        # Shared recognition stages and the queues that feed them
+        self.align_queue = StageQueue(2, DROP_NEWEST)
+        embed_queue = StageQueue(2, BLOCK)
+        match_queue = StageQueue(4, BLOCK)
+
+        self.stages = [
+            PipelineStage("align", self._align, self.align_queue, embed_queue, self._end_pass),
+            PipelineStage("embed", self._embed, embed_queue, match_queue, self._end_pass),
+            PipelineStage("match", self._match, match_queue, None, self._end_pass)
+        ]
+
+        if capture is not None:
+            self.add_camera(0, capture, scheduler, tracker, detector)
+
+    def add_camera(self,
+                   camera_id: Any,
+                   capture,
+                   scheduler: Optional[RecognitionScheduler] = None,
+                   tracker: Optional[FaceTracker] = None,
+                   detector: Optional[AdaptiveFaceDetector] = None) -> CameraFeed:
+        """
+        Add a camera, before the pipeline is started
+
+        Detection runs on a thread per camera, so every camera after the
+        first gets a private YuNet instance for its full-frame passes. An
+        adaptive detector for such a camera must be given its own instance
+        too (see AdaptiveFaceDetector's frame_detector).
+
+        Parameters
+        ----------
+        camera_id : Any
+            Camera name in the previews and stats, e.g. its device index
+        capture : cv2.VideoCapture
+            Opened video source, read by the capture thread but released by the caller
+        scheduler, tracker, detector : optional
+            As in the constructor, one of each per camera
+
+        Returns
+        -------
+        CameraFeed
+            The new camera
+        """
+        if self._started:
+            raise RuntimeError("Cameras must be added before the pipeline is started")
+        if any(feed.camera_id == camera_id for feed in self.feeds):
+            raise ValueError(f"Camera {camera_id} was already added")
+
+        face_detector = None
+        if self.feeds and detector is None:
+            face_detector = self.face_system.registry.create_face_detector(self.face_system.model_path)
+        feed = CameraFeed(camera_id, capture, scheduler, tracker, detector, face_detector, self._camera_ended)
+        feed.detect_stage = PipelineStage(
+            f"detect-{camera_id}", lambda packet: self._detect(feed, packet),
+            feed.source, self.align_queue, self._end_pass
+        )
+        self.feeds.append(feed)
+
+        # One waiting recognition pass per camera, plus the one being aligned
+        self.align_queue.resize(len(self.feeds) + 1)
+        return feed
+
+    @property
+    def camera_ids(self) -> List[Any]:
+        return [feed.camera_id for feed in self.feeds]
+
+    @property
+    def is_running(self) -> bool:
+        return self._started and not self._stop_event.is_set()
+
+    def start(self) -> "RecognitionPipeline":
+        """Start the capture thread and the detection stage of every camera, and the shared stages"""
+        if not self.feeds:
+            raise RuntimeError("The pipeline has no camera")
+        self._stop_event.clear()
+        self._started = True
+        for stage in self.stages:
+            stage.start(self._stop_event)
+        for feed in self.feeds:
+            feed.detect_stage.start(self._stop_event)
+            feed.source.start(self._stop_event)
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Stop every thread, items still queued are discarded"""
+        self._stop_event.set()
+        for feed in self.feeds:
+            feed.source.stop(timeout)
+            feed.detect_stage.join(timeout)
+        for stage in self.stages:
+            stage.join(timeout)
+        with self._preview_condition:
+            self._preview_condition.notify_all()
+
+    def next_preview(self, after_index: int = -1, timeout: float = 0.1, camera_id: Any = None) -> Optional[Dict[str, Any]]:
+        """
+        Wait for a detection result newer than after_index
+
+        Parameters
+        ----------
+        after_index : int, optional
+            Index of the last frame shown, by default -1
+        timeout : float, optional
+            Seconds to wait, by default 0.1
+        camera_id : Any, optional
+            Camera to wait for, by default the first camera
+
+        Returns
+        -------
+        Dict[str, Any]
+            Preview with "camera", "index", "timestamp", "frame", "faces", "track_ids", "identities"
+            (recognized ID of each face or None) and "frame_in_use", or None on timeout
+        """
+        if camera_id is None:
+            camera_id = self.feeds[0].camera_id
+        return self.next_previews({camera_id: after_index}, timeout).get(camera_id)
+
+    def next_previews(self, after_indices: Dict[Any, int], timeout: float = 0.1) -> Dict[Any, Dict[str, Any]]:
+        """
+        Wait until at least one camera has a detection result newer than the last one shown
+
+        Parameters
+        ----------
+        after_indices : Dict[Any, int]
+            Camera ID -> index of its last frame shown, cameras not in it are not waited for
+        timeout : float, optional
+            Seconds to wait, by default 0.1
+
+        Returns
+        -------
+        Dict[Any, Dict[str, Any]]
+            Camera ID -> newer preview (see next_preview), empty on timeout
+        """
+        feeds = [feed for feed in self.feeds if feed.camera_id in after_indices]
+
+        def newer():
+            return {
+                feed.camera_id: feed.preview for feed in feeds
+                if feed.preview is not None and feed.preview["index"] > after_indices[feed.camera_id]
+            }
+
+        with self._preview_condition:
+            self._preview_condition.wait_for(lambda: self._stop_event.is_set() or newer(), timeout)
+            return newer()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue depth, drops, processed count and latency of every stage, and the state of every camera
+
+        Returns
+        -------
+        Dict[str, Any]
+            {"frames_captured": int, "stages": {name: {...}}, "cameras": {camera_id: {...}}, "quality": {...}}.
+            With a single camera, its "tracker", "scheduler" and "detector" are at the top level too
+        """
+        stages = {}
+        cameras = {}
+        for feed in self.feeds:
+            cameras[feed.camera_id] = feed.stats()
+            stages[feed.detect_stage.name] = cameras[feed.camera_id]["detect"]
+        for stage in self.stages:
+            stage_stats = stage.stats.snapshot()
+            stage_stats["queue_depth"] = stage.input_queue.depth()
+            stage_stats["queue_size"] = stage.input_queue.maxsize
+            stage_stats["dropped"] = stage.input_queue.dropped
+            stages[stage.name] = stage_stats
+        stats = {
+            "frames_captured": sum(feed.frames_captured for feed in self.feeds),
+            "stages": stages,
+            "cameras": cameras,
+            "quality": self.face_system.quality.stats()
+        }
+        if len(self.feeds) == 1:
+            for key in ("tracker", "scheduler", "detector"):
+                if key in cameras[self.feeds[0].camera_id]:
+                    stats[key] = cameras[self.feeds[0].camera_id][key]
+        return stats
+
+    def print_stats(self) -> None:
+        """Print one line per stage and a summary per camera"""
+        stats = self.stats()
+        print(f"Frames captured: {stats['frames_captured']}")
+        for name, stage in stats["stages"].items():
+            print(f"  {name:>6}: {stage['processed']} processed, {stage['dropped']} dropped, "
+                  f"queue {stage['queue_depth']}/{stage['queue_size']}, "
+                  f"{stage['latency_ms_mean']:.1f} ms mean, {stage['latency_ms_max']:.1f} ms max")
+        quality = stats["quality"]
+        rejected = ", ".join(f"{count} {stage}" for stage, count in quality["rejected"].items() if count)
+        print(f"Quality gate: {quality['passed']}/{quality['checked']} faces passed"
+              + (f" (rejected: {rejected})" if rejected else ""))
+        for camera_id, camera in stats["cameras"].items():
+            print(f"Camera {camera_id}: {camera['frames_captured']} frames, {camera['fps']:.1f} fps, "
+                  f"{camera['frames_dropped']} dropped before detection")
+            tracker = camera["tracker"]
+            print(f"  Tracks: {tracker['tracks']} ({tracker['resolved_tracks']} recognized), "
+                  f"{tracker['recognition_requests']}/{tracker['faces_seen']} faces sent to recognition")
+            scheduler = camera["scheduler"]
+            print(f"  Recognition passes: {scheduler['passes']} ({scheduler['skipped_budget']} frames skipped by the budget, "
+                  f"{scheduler['skipped_backlog']} by the backlog)")
+            if "detector" in camera:
+                detector = camera["detector"]
+                print(f"  Detection cost: {detector['mean_cost']:.2f} of a full-frame pass "
+                      f"({detector['roi_passes']} region passes, {detector['discovery_frames']} discovery frames)")
+
+    def _camera_ended(self) -> None:
+        """A camera stopped delivering frames, the pipeline stops with its last camera"""
+        if all(feed.capture_failed for feed in self.feeds):
+            self._stop_event.set()
+        with self._preview_condition:
+            self._preview_condition.notify_all()
+
+    def _detect(self, feed: CameraFeed, packet: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        packet["feed"] = feed
+        packet["camera"] = feed.camera_id
+        context = self.face_system.new_frame_context(packet["frame"])
+        packet["context"] = context
+        if feed.detector is not None:
+            packet["faces"] = feed.detector.detect(packet["frame"], context, feed.tracker.recent_boxes())
+        else:
+            packet["faces"] = self.face_system.detect_faces(packet["frame"], context=context, detector=feed.face_detector)
+        packet["track_ids"] = feed.tracker.update(packet["faces"], packet["timestamp"])
+
+        # Only new or unresolved tracks are recognized, when the scheduler allows a pass
+        feed.scheduler.observe(len(packet["faces"]))
+        if feed.scheduler.ready(packet["timestamp"]):
+            # A change in the face count makes every unresolved track due at once
+            packet["face_indices"] = feed.tracker.needs_recognition(
+                packet["track_ids"], packet["timestamp"], force=feed.scheduler.take_face_count_change()
+            )
+            if packet["face_indices"]:
+                packet["scheduled"] = True
+                feed.scheduler.started(packet["timestamp"])
+
+        self._publish_preview(feed, packet)
+        return packet if packet.get("scheduled") else None
+
+    def _publish_preview(self, feed: CameraFeed, packet: Dict[str, Any]) -> None:
+        """Share the detection result of a frame with the preview"""
+        preview = {
+            "camera": feed.camera_id,
+            "index": packet["index"],
+            "timestamp": packet["timestamp"],
+            "frame": packet["frame"],
+            "faces": packet["faces"],
+            "track_ids": packet["track_ids"],
+            "identities": feed.tracker.identities(packet["track_ids"]),
+            # The recognition stages still read the frame, so it must not be drawn on
+            "frame_in_use": bool(packet.get("scheduled"))
+        }
+        with self._preview_condition:
+            feed.preview = preview
+            self._preview_condition.notify_all()
+
+    def _end_pass(self, packet: Dict[str, Any]) -> None:
+        """A frame left the pipeline, its recognition pass (if any) is over"""
+        if packet.get("scheduled"):
+            packet["scheduled"] = False
+            packet["feed"].scheduler.finished()
+
+    def _align(self, packet: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        aligned_faces, kept = self.face_system.align_faces(
+            packet["frame"], packet["faces"], packet["context"], packet["face_indices"]
+        )
+        if not aligned_faces:
+            return None
+        packet["aligned_faces"] = aligned_faces
+        packet["face_indices"] = kept
+        return packet
+
+    def _embed(self, packet: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        packet["embeddings"] = self.face_system.extract_features_batch(packet["aligned_faces"])
+        return packet
+
+    def _match(self, packet: Dict[str, Any]) -> None:
+        results = self.face_system.match_faces(packet["embeddings"], self.face_system.match_threshold)
+
+        # Attendance: IDs confirmed by the session voter
+        recognized_ids = self.face_system.confirm_matches(
+            [result["match"] for result in results], packet["timestamp"]
+        )
+
+        # A track caches an identity only once its own matches agree, a confirmed ID elsewhere does not count
+        tracker = packet["feed"].tracker
+        for face_index, result in zip(packet["face_indices"], results):
+            tracker.vote(packet["track_ids"][face_index], result["match"], result["distance"], packet["timestamp"])
+
+        if recognized_ids and self.on_recognized is not None:
+            self.on_recognized(recognized_ids)
+        return None
+
+
+def draw_faces(frame: np.ndarray,
+               faces: np.ndarray,
+               labels: Optional[List[Optional[str]]] = None,
+               in_place: bool = False) -> np.ndarray:
+    """
+    Draw the face bounding boxes, labelled faces in green and the others in orange
+
+    Parameters
+    ----------
+    frame : numpy.ndarray
+        BGR frame
+    faces : numpy.ndarray
+        Face bounding boxes [x, y, width, height]
+    labels : List[Optional[str]], optional
+        Text drawn above each box, None for unlabelled faces
+    in_place : bool, optional
+        Draw on the frame itself instead of a copy, by default False
+
+    Returns
+    -------
+    numpy.ndarray
+        The frame with the boxes
+    """
+    display_frame = frame if in_place else frame.copy()
+    for i, face in enumerate(faces):
+        x, y, w, h = (int(v) for v in face[:4])
+        label = labels[i] if labels is not None and i < len(labels) else None
+        color = (0, 255, 0) if label else (0, 165, 255)
+        cv2.rectangle(display_frame, (x, y), (x + w, y + h), color, 2)
+        if label:
+            cv2.putText(display_frame, label, (x, max(y - 8, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+    return display_frame
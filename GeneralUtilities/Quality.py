@@ -0,0 +1,226 @@
+import cv2
+import numpy as np
+import threading
+from typing import Dict, Optional
+
+from GeneralUtilities.FrameContext import FrameContext
+
+# Cascade stages, cheapest first
+BOX = "box"        # box size and detector score, no pixels read
+IMAGE = "image"    # blur and brightness on a downsampled crop of the grayscale frame
+POSE = "pose"      # roll and yaw estimated from the detector keypoints
+ALIGNED = "aligned"  # FaceRecognitionSystem.assess_face_quality on the aligned face
+STAGES = (BOX, IMAGE, POSE, ALIGNED)
+
+
+class QualityCascade:
+    """
+    Face quality gate run from the cheapest check to the most expensive one.
+
+    A face is rejected by the first stage it fails, so the later stages,
+    alignment and the embedding model only run on faces that passed the
+    cheaper ones. Every stage can be disabled and counts the faces it
+    rejected, which is the alignment and embedding work it saved.
+
+    Stages
+    ------
+    box : smallest box side and detector score
+    image : Laplacian variance and mean brightness of the face crop from
+        the frame context's grayscale frame, downsampled to at most crop_size
+    pose : eye line angle (roll) and nose offset from the eye midpoint
+        relative to the eye distance (yaw), skipped without keypoints
+    aligned : the aligned face check of the face system, off by default as
+        the image stage already covers it
+    """
+
+    def __init__(self,
+                 min_face_size: int = 40,
+                 min_score: float = 0.0,
+                 min_sharpness: float = 10.0,
+                 min_brightness: float = 20.0,
+                 max_brightness: float = 235.0,
+                 max_roll: float = 30.0,
+                 max_yaw: float = 0.35,
+                 crop_size: int = 64,
+                 stages=(BOX, IMAGE, POSE)):
+        """
+        Parameters
+        ----------
+        min_face_size : int, optional
+            Smallest box side in frame pixels, by default 40
+        min_score : float, optional
+            Lowest detector score, by default 0.0 (YuNet already filters at its own threshold)
+        min_sharpness : float, optional
+            Lowest Laplacian variance of the crop, by default 10.0
+        min_brightness, max_brightness : float, optional
+            Mean crop brightness range, by default 20.0 to 235.0
+        max_roll : float, optional
+            Largest eye line angle in degrees, by default 30.0
+        max_yaw : float, optional
+            Largest nose offset from the eye midpoint, as a share of the eye distance, by default 0.35
+        crop_size : int, optional
+            Larger crops are downsampled to this size for the image stage, by default 64
+        stages : Iterable[str], optional
+            Enabled stages out of STAGES, by default box, image and pose
+        """
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown quality stages {sorted(unknown)}. Must be in {list(STAGES)}.")
+
+        self.min_face_size = min_face_size
+        self.min_score = min_score
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_roll = max_roll
+        self.max_yaw = max_yaw
+        self.crop_size = crop_size
+        self.stages = set(stages)
+
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+    def check(self,
+              context: Optional[FrameContext],
+              face: np.ndarray,
+              index: Optional[int] = None,
+              measures: Optional[Dict[str, float]] = None) -> Optional[str]:
+        """
+        Run the stages before alignment on one face
+
+        Parameters
+        ----------
+        context : FrameContext, optional
+            Frame context of the face, without it only the box size is checked
+        face : numpy.ndarray
+            Face box [x, y, width, height]
+        index : int, optional
+            Index of the face in the context's detections, for its score and keypoints
+        measures : Dict[str, float], optional
+            Receives the measurements of the stages that ran (size, score,
+            brightness, sharpness, roll, yaw)
+
+        Returns
+        -------
+        Optional[str]
+            Stage that rejected the face, None if it passed
+        """
+        stage = self._first_failure(context, face, index, {} if measures is None else measures)
+        with self._lock:
+            self.checked += 1
+            if stage is not None:
+                self.rejected[stage] += 1
+        return stage
+
+    def record_aligned(self, passed: bool) -> None:
+        """Count the result of the aligned stage, run by the face system"""
+        if not passed:
+            with self._lock:
+                self.rejected[ALIGNED] += 1
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Faces checked, rejected per stage and passed
+
+        Returns
+        -------
+        Dict[str, object]
+            checked, passed, rejected ({stage: count}) and rejected_ratio
+        """
+        with self._lock:
+            rejected = dict(self.rejected)
+            total = sum(rejected.values())
+            return {
+                "checked": self.checked,
+                "passed": self.checked - total,
+                "rejected": rejected,
+                "rejected_ratio": total / self.checked if self.checked else 0.0
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.checked = 0
+            self.rejected = {stage: 0 for stage in STAGES}
+
+    def _first_failure(self,
+                       context: Optional[FrameContext],
+                       face: np.ndarray,
+                       index: Optional[int],
+                       measures: Dict[str, float]) -> Optional[str]:
+        x, y, w, h = (int(v) for v in face[:4])
+
+        if BOX in self.stages:
+            measures["size"] = min(w, h)
+            if min(w, h) < self.min_face_size:
+                return BOX
+            score = _row(context.scores if context is not None else None, index)
+            if score is not None:
+                measures["score"] = float(score)
+                if score < self.min_score:
+                    return BOX
+
+        if context is None:
+            return None
+
+        if IMAGE in self.stages:
+            crop = self._crop(context, x, y, w, h)
+            if crop is None or not self._image_ok(context, crop, measures):
+                return IMAGE
+
+        if POSE in self.stages:
+            keypoints = _row(context.keypoints, index)
+            if keypoints is not None and not self._pose_ok(keypoints, measures):
+                return POSE
+
+        return None
+
+    def _crop(self, context: FrameContext, x: int, y: int, w: int, h: int) -> Optional[np.ndarray]:
+        """Grayscale face crop, downsampled so its larger side is at most crop_size"""
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, context.width), min(y + h, context.height)
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+
+        crop = context.gray[y0:y1, x0:x1]
+        scale = self.crop_size / float(max(crop.shape))
+        if scale < 1.0:
+            size = (max(2, int(crop.shape[1] * scale)), max(2, int(crop.shape[0] * scale)))
+            crop = cv2.resize(crop, size, dst=context.buffer("quality_crop", (size[1], size[0])),
+                              interpolation=cv2.INTER_AREA)
+        return crop
+
+    def _image_ok(self, context: FrameContext, crop: np.ndarray, measures: Dict[str, float]) -> bool:
+        brightness = float(np.mean(crop))
+        measures["brightness"] = brightness
+        if brightness <= self.min_brightness or brightness >= self.max_brightness:
+            return False
+
+        laplacian = cv2.Laplacian(crop, cv2.CV_64F, dst=context.buffer("quality_crop_laplacian", crop.shape, np.float64))
+        measures["sharpness"] = float(laplacian.var())
+        return measures["sharpness"] > self.min_sharpness
+
+    def _pose_ok(self, keypoints: np.ndarray, measures: Dict[str, float]) -> bool:
+        # YuNet order: right eye, left eye, nose tip, right and left mouth corners
+        right_eye, left_eye, nose = keypoints[0], keypoints[1], keypoints[2]
+        dx, dy = left_eye - right_eye
+        eye_distance = float(np.hypot(dx, dy))
+        if eye_distance < 1.0:
+            return False
+
+        roll = abs(float(np.degrees(np.arctan2(dy, dx))))
+        measures["roll"] = roll
+        if roll > self.max_roll:
+            return False
+
+        # Nose offset along the eye line, 0 for a frontal face
+        midpoint = (right_eye + left_eye) / 2.0
+        yaw = abs(float(np.dot(nose - midpoint, (dx, dy)))) / (eye_distance * eye_distance)
+        measures["yaw"] = yaw
+        return yaw <= self.max_yaw
+
+
+def _row(values: Optional[np.ndarray], index: Optional[int]):
+    if values is None or index is None or index >= len(values):
+        return None
+    return values[index]
@@ -0,0 +1,102 @@
+import threading
+from typing import Dict, Optional
+
+
+class RecognitionScheduler:
+    """
+    Decides when a frame is sent to recognition, from the pipeline state.
+
+    A recognition pass is started when there are unrecognized faces or the
+    number of faces changed, but only when the previous pass is finished
+    (empty backlog) and the CPU budget of ``max_passes_per_second`` allows
+    it. When every visible face is recognized, no pass is started at all.
+    """
+
+    def __init__(self, max_passes_per_second: float = 4.0, max_in_flight: int = 1):
+        """
+        Parameters
+        ----------
+        max_passes_per_second : float, optional
+            Maximum recognition passes started per second, by default 4.0
+        max_in_flight : int, optional
+            Recognition passes allowed in the pipeline at once, by default 1
+        """
+        self.max_passes_per_second = max_passes_per_second
+        self.max_in_flight = max_in_flight
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_pass: Optional[float] = None
+        self._face_count: Optional[int] = None
+        self._face_count_changed = False
+
+        self.passes = 0
+        self.skipped_budget = 0
+        self.skipped_backlog = 0
+
+    def observe(self, n_faces: int) -> None:
+        """Record the face count of a new frame, a change triggers the next pass"""
+        with self._lock:
+            if n_faces != self._face_count:
+                self._face_count = n_faces
+                self._face_count_changed = n_faces > 0
+
+    def ready(self, timestamp: float) -> bool:
+        """
+        Whether a recognition pass may start now
+
+        Parameters
+        ----------
+        timestamp : float
+            Time of the frame
+
+        Returns
+        -------
+        bool
+            True if the backlog is empty and the budget allows a pass
+        """
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                self.skipped_backlog += 1
+                return False
+            if (self._last_pass is not None and self.max_passes_per_second > 0
+                    and timestamp - self._last_pass < 1.0 / self.max_passes_per_second):
+                self.skipped_budget += 1
+                return False
+            return True
+
+    def take_face_count_change(self) -> bool:
+        """Whether the face count changed since the last pass, and clear it"""
+        with self._lock:
+            changed = self._face_count_changed
+            self._face_count_changed = False
+            return changed
+
+    def started(self, timestamp: float) -> None:
+        """A recognition pass entered the pipeline"""
+        with self._lock:
+            self._in_flight += 1
+            self._last_pass = timestamp
+            self.passes += 1
+
+    def finished(self) -> None:
+        """A recognition pass left the pipeline, matched or discarded"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Passes started and frames skipped by the budget or the backlog
+
+        Returns
+        -------
+        Dict[str, int]
+            passes, in_flight, skipped_budget and skipped_backlog
+        """
+        with self._lock:
+            return {
+                "passes": self.passes,
+                "in_flight": self._in_flight,
+                "skipped_budget": self.skipped_budget,
+                "skipped_backlog": self.skipped_backlog
+            }
@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from GeneralUtilities.Metrics import rotate_file
+
+
+class DecisionTrace:
+    """
+    Fixed-size ring buffer of recognition decisions, for threshold tuning.
+
+    Recording an event is one dictionary appended to a deque, no I/O ever
+    happens on the recording thread. When the buffer is full the oldest
+    events are dropped (and counted). A TraceWriter drains the buffer to a
+    JSON-lines file in the background, on a schedule or when flush is called.
+
+    Events
+    ------
+    match : one per probe of match_faces, with the threshold, the decision
+        and the top-k candidate IDs and distances
+    quality : one per face checked before alignment, with the stage that
+        rejected it (None if it passed) and its quality measurements
+    """
+
+    def __init__(self, capacity: int = 4096, enabled: bool = True):
+        """
+        Parameters
+        ----------
+        capacity : int, optional
+            Events kept until they are written, by default 4096
+        enabled : bool, optional
+            Record events, by default True
+        """
+        self.enabled = enabled
+        self._events = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+        self._writer: Optional["TraceWriter"] = None
+
+    @property
+    def capacity(self) -> int:
+        return self._events.maxlen
+
+    def record(self, kind: str, **fields: Any) -> None:
+        """
+        Add an event
+
+        Parameters
+        ----------
+        kind : str
+            Event type, e.g. "match" or "quality"
+        **fields
+            Event data, must be JSON serializable
+        """
+        if not self.enabled:
+            return
+        fields["event"] = kind
+        fields["timestamp"] = time.time()
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(fields)
+            self.recorded += 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Buffered events, oldest first, left in the buffer"""
+        with self._lock:
+            return list(self._events)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Buffered events, oldest first, removed from the buffer"""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def requeue(self, events: List[Dict[str, Any]]) -> None:
+        """
+        Put drained events back in front of the buffer, e.g. after a failed write
+
+        Events that no longer fit are dropped (and counted), oldest first.
+        """
+        with self._lock:
+            events = events + list(self._events)
+            overflow = max(0, len(events) - self._events.maxlen)
+            self.dropped += overflow
+            self._events.clear()
+            self._events.extend(events[overflow:])
+
+    def count_dropped(self, n: int) -> None:
+        """Count n drained events that could not be written"""
+        with self._lock:
+            self.dropped += n
+
+    def stats(self) -> Dict[str, int]:
+        """Events recorded, buffered and dropped before they were written"""
+        with self._lock:
+            return {"recorded": self.recorded, "buffered": len(self._events), "dropped": self.dropped}
+
+    def start_writer(self,
+                     path: str,
+                     interval: Optional[float] = 30.0,
+                     max_bytes: int = 20_000_000,
+                     backup_count: int = 3) -> "TraceWriter":
+        """Write the buffered events to a rotating JSON-lines file in the background, see TraceWriter"""
+        self.stop_writer()
+        self._writer = TraceWriter(self, path, interval, max_bytes, backup_count).start()
+        return self._writer
+
+    def flush(self, wait: bool = False, timeout: float = 5.0) -> None:
+        """Ask the writer to write the buffered events now, optionally waiting until it did"""
+        if self._writer is not None:
+            self._writer.flush(wait, timeout)
+
+    def stop_writer(self) -> None:
+        """Stop the writer after it wrote the buffered events"""
+        if self._writer is not None:
+            self._writer.stop()
+            self._writer = None
+
+
+class TraceWriter:
+    """
+    Background thread appending the events of a DecisionTrace to a JSON-lines file.
+
+    The buffer is drained every interval seconds and whenever flush is
+    called. The file is rotated like the metrics files (see rotate_file).
+    """
+
+    def __init__(self,
+                 trace: DecisionTrace,
+                 path: str,
+                 interval: Optional[float] = 30.0,
+                 max_bytes: int = 20_000_000,
+                 backup_count: int = 3):
+        """
+        Parameters
+        ----------
+        trace : DecisionTrace
+            Trace to drain
+        path : str
+            JSON-lines output file
+        interval : float, optional
+            Seconds between writes, None to only write on flush and stop, by default 30.0
+        max_bytes : int, optional
+            Size at which the file is rotated, by default 20 MB
+        backup_count : int, optional
+            Rotated files kept, by default 3
+        """
+        self.trace = trace
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.written = 0
+
+        self._flush_requested = threading.Event()
+        self._flushed = threading.Condition()
+        self._flush_count = 0
+        self._writing = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def start(self) -> "TraceWriter":
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def flush(self, wait: bool = False, timeout: float = 5.0) -> None:
+        """Write the buffered events now, optionally waiting until they are written"""
+        with self._flushed:
+            # A write in progress may have drained the buffer before the latest events
+            target = self._flush_count + (2 if self._writing else 1)
+        self._flush_requested.set()
+        if wait:
+            with self._flushed:
+                self._flushed.wait_for(lambda: self._flush_count >= target, timeout)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the thread, writing the buffered events first"""
+        self._stop_event.set()
+        self._flush_requested.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def write(self) -> int:
+        """
+        Drain the trace into the file, returns the number of events written
+
+        Events that cannot be serialized are counted as dropped. When the file
+        cannot be written the events go back into the buffer for the next
+        write and the OSError is raised.
+        """
+        events = self.trace.drain()
+        if not events:
+            return 0
+        try:
+            lines = "".join(json.dumps(event, default=_to_json) + "\n" for event in events)
+        except (TypeError, ValueError):
+            self.trace.count_dropped(len(events))
+            raise
+        try:
+            rotate_file(self.path, len(lines.encode("utf-8")), self.max_bytes, self.backup_count)
+            with open(self.path, "a") as f:
+                f.write(lines)
+        except OSError:
+            self.trace.requeue(events)
+            raise
+        self.written += len(events)
+        return len(events)
+
+    def _run(self) -> None:
+        while True:
+            self._flush_requested.wait(self.interval)
+            self._flush_requested.clear()
+            with self._flushed:
+                self._writing = True
+            try:
+                self.write()
+            except (OSError, ValueError, TypeError) as e:
+                print(f"Error writing decision trace: {e}")
+            with self._flushed:
+                self._writing = False
+                self._flush_count += 1
+                self._flushed.notify_all()
+            if self._stop_event.is_set():
+                break
+
+
+def _to_json(value: Any) -> Any:
+    """numpy scalars and arrays in events"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
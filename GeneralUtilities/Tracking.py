@@ -0,0 +1,389 @@
+import numpy as np
+import threading
+from typing import Dict, List, Optional
+
+from GeneralUtilities.Voting import TemporalVoter
+
+
+class _BoxKalman:
+    """
+    Constant-velocity Kalman filter over a box center and size.
+
+    State is [cx, cy, w, h, vx, vy] with the velocity in pixels per second,
+    the box size is assumed constant.
+    """
+
+    def __init__(self, box: np.ndarray, process_noise: float = 1.0, measurement_noise: float = 4.0):
+        self.x = np.array([*_center_size(box), 0.0, 0.0], dtype=np.float64)
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4])
+        self.Q = np.eye(6) * process_noise
+        self.R = np.eye(4) * measurement_noise
+        self.H = np.eye(4, 6)
+
+    def predict(self, dt: float) -> np.ndarray:
+        F = np.eye(6)
+        F[0, 4] = F[1, 5] = dt
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + self.Q
+        return _box_from_center_size(self.x[:4])
+
+    def update(self, box: np.ndarray) -> np.ndarray:
+        residual = _center_size(box) - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ residual
+        self.P = (np.eye(6) - K @ self.H) @ self.P
+        return _box_from_center_size(self.x[:4])
+
+
+class Track:
+    """
+    One face followed across frames, with its cached recognition result
+    """
+
+    def __init__(self, track_id: int, box: np.ndarray, timestamp: float, smooth: bool = False):
+        self.track_id = track_id
+        self.box = np.asarray(box[:4], dtype=np.float64)
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 1
+        self.misses = 0
+
+        # Recognition result, cached for the lifetime of the track
+        self.identity: Optional[str] = None
+        self.distance: Optional[float] = None
+        self.attempts = 0
+        self.last_attempt: Optional[float] = None
+        self.voter: Optional[TemporalVoter] = None  # Matches of this track only, created on the first match
+
+        self._kalman = _BoxKalman(self.box) if smooth else None
+
+    @property
+    def is_resolved(self) -> bool:
+        return self.identity is not None
+
+    def predict(self, dt: float) -> np.ndarray:
+        """Expected box dt seconds after the last frame"""
+        if self._kalman is None:
+            return self.box
+        return self._kalman.predict(dt)
+
+    def update(self, box: np.ndarray, timestamp: float) -> None:
+        box = np.asarray(box[:4], dtype=np.float64)
+        self.box = self._kalman.update(box) if self._kalman is not None else box
+        self.last_seen = timestamp
+        self.hits += 1
+        self.misses = 0
+
+
+class FaceTracker:
+    """
+    Gives each detected face a persistent track ID across frames.
+
+    Detections are matched to the existing tracks by IoU first, then the
+    remaining ones by centroid distance (for fast moves between frames that
+    drop the IoU). Unmatched detections start new tracks, and tracks not
+    seen for ``max_misses`` frames are removed. Optionally, track boxes are
+    smoothed with a constant-velocity Kalman filter.
+
+    Each track caches its recognition result, so only new or unresolved
+    tracks need to be aligned and embedded.
+    """
+
+    def __init__(self,
+                 iou_threshold: float = 0.3,
+                 max_centroid_distance: float = 0.5,
+                 max_misses: int = 15,
+                 retry_interval: float = 0.25,
+                 max_retry_interval: float = 5.0,
+                 smooth: bool = False,
+                 consistency_threshold: int = 3,
+                 vote_window: float = 10.0):
+        """
+        Parameters
+        ----------
+        iou_threshold : float, optional
+            Minimum IoU between a track and a detection to match them, by default 0.3
+        max_centroid_distance : float, optional
+            Maximum centroid distance, relative to the track box width, for the fallback match, by default 0.5
+        max_misses : int, optional
+            Frames a track survives without a detection, by default 15
+        retry_interval : float, optional
+            Seconds between recognition attempts of an unresolved track, by default 0.25
+        max_retry_interval : float, optional
+            The retry interval doubles every 4 failed attempts up to this many seconds,
+            so unknown faces are not recognized over and over, by default 5.0
+        smooth : bool, optional
+            Smooth the track boxes with a Kalman filter, by default False
+        consistency_threshold : int, optional
+            Matches of a track to the same ID needed to resolve it, by default 3
+        vote_window : float, optional
+            Seconds a match of a track counts as a vote, by default 10.0
+        """
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_misses = max_misses
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.smooth = smooth
+        self.consistency_threshold = consistency_threshold
+        self.vote_window = vote_window
+
+        self.tracks: Dict[int, Track] = {}
+        self._next_id = 0
+        self._last_timestamp: Optional[float] = None
+        self._lock = threading.Lock()
+
+        # Recognition work saved by the track cache
+        self.faces_seen = 0
+        self.recognition_requests = 0
+
+    def update(self, faces: np.ndarray, timestamp: float) -> np.ndarray:
+        """
+        Match the detections of a new frame to the tracks
+
+        Parameters
+        ----------
+        faces : numpy.ndarray
+            Face bounding boxes [x, y, width, height] returned by detect_faces
+        timestamp : float
+            Frame time in seconds
+
+        Returns
+        -------
+        numpy.ndarray
+            (N,) track ID of each face
+        """
+        faces = np.asarray(faces, dtype=np.float64)[:, :4] if len(faces) else np.zeros((0, 4))
+
+        with self._lock:
+            dt = 0.0 if self._last_timestamp is None else max(timestamp - self._last_timestamp, 0.0)
+            self._last_timestamp = timestamp
+            self.faces_seen += len(faces)
+
+            track_ids = list(self.tracks.keys())
+            predicted = np.array([self.tracks[t].predict(dt) for t in track_ids]).reshape(-1, 4)
+            assignment = np.full(len(faces), -1, dtype=np.int64)
+
+            if len(track_ids) and len(faces):
+                # Greedy IoU matching, best pairs first
+                iou = box_iou(predicted, faces)
+                for t, d in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                    if iou[t, d] < self.iou_threshold:
+                        break
+                    if assignment[d] == -1 and track_ids[t] not in assignment:
+                        assignment[d] = track_ids[t]
+
+                # Centroid fallback for what IoU left unmatched
+                free_tracks = [t for t in range(len(track_ids)) if track_ids[t] not in assignment]
+                free_faces = np.flatnonzero(assignment == -1)
+                if free_tracks and free_faces.size:
+                    track_centers = predicted[free_tracks, :2] + predicted[free_tracks, 2:] / 2
+                    face_centers = faces[free_faces, :2] + faces[free_faces, 2:] / 2
+                    distances = np.linalg.norm(track_centers[:, None] - face_centers[None], axis=2)
+                    distances /= np.maximum(predicted[free_tracks, 2:3], 1.0)
+                    for t, d in zip(*np.unravel_index(np.argsort(distances, axis=None), distances.shape)):
+                        if distances[t, d] > self.max_centroid_distance:
+                            break
+                        track_id = track_ids[free_tracks[t]]
+                        if assignment[free_faces[d]] == -1 and track_id not in assignment:
+                            assignment[free_faces[d]] = track_id
+
+            # Update matched tracks, start new ones
+            for d, track_id in enumerate(assignment):
+                if track_id >= 0:
+                    self.tracks[track_id].update(faces[d], timestamp)
+                else:
+                    track = Track(self._next_id, faces[d], timestamp, self.smooth)
+                    self.tracks[track.track_id] = track
+                    assignment[d] = track.track_id
+                    self._next_id += 1
+
+            # Age out tracks that were not seen
+            seen = set(assignment.tolist())
+            for track_id in track_ids:
+                if track_id not in seen:
+                    track = self.tracks[track_id]
+                    track.misses += 1
+                    if track.misses > self.max_misses:
+                        del self.tracks[track_id]
+
+        return assignment
+
+    def recent_boxes(self, max_misses: int = 2) -> np.ndarray:
+        """
+        Boxes of the tracks seen in the last frames
+
+        Parameters
+        ----------
+        max_misses : int, optional
+            Only tracks missed in at most this many frames, by default 2
+
+        Returns
+        -------
+        numpy.ndarray
+            (N, 4) boxes [x, y, width, height]
+        """
+        with self._lock:
+            boxes = [track.box for track in self.tracks.values() if track.misses <= max_misses]
+        return np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+    def needs_recognition(self, track_ids: np.ndarray, timestamp: float, force: bool = False) -> List[int]:
+        """
+        Select the faces whose tracks are unresolved and due for a recognition attempt
+
+        Parameters
+        ----------
+        track_ids : numpy.ndarray
+            Track ID of each face of the frame, from update
+        timestamp : float
+            Frame time in seconds
+        force : bool, optional
+            Ignore the retry interval, by default False
+
+        Returns
+        -------
+        List[int]
+            Indices of the faces to recognize, their tracks are marked as attempted
+        """
+        selected = []
+        with self._lock:
+            for i, track_id in enumerate(track_ids):
+                track = self.tracks.get(int(track_id))
+                if track is None or track.is_resolved:
+                    continue
+                if not force and track.last_attempt is not None and timestamp - track.last_attempt < self._retry_interval(track):
+                    continue
+                track.last_attempt = timestamp
+                track.attempts += 1
+                selected.append(i)
+            self.recognition_requests += len(selected)
+        return selected
+
+    def _retry_interval(self, track: Track) -> float:
+        return min(self.retry_interval * 2 ** (track.attempts // 4), self.max_retry_interval)
+
+    def resolve(self, track_id: int, identity: Optional[str], distance: Optional[float] = None) -> bool:
+        """
+        Cache the recognition result of a track
+
+        Parameters
+        ----------
+        track_id : int
+            Track that was recognized
+        identity : str, optional
+            Matched ID, None if the face did not match (the track stays unresolved)
+        distance : float, optional
+            Match distance
+
+        Returns
+        -------
+        bool
+            True if the track was newly resolved
+        """
+        with self._lock:
+            track = self.tracks.get(int(track_id))
+            if track is None or identity is None or track.is_resolved:
+                return False
+            track.identity = identity
+            track.distance = distance
+            return True
+
+    def vote(self,
+             track_id: int,
+             identity: Optional[str],
+             distance: Optional[float],
+             timestamp: float) -> bool:
+        """
+        Add a match of a track and resolve it once its own matches agree
+
+        The votes are kept per track, so a track is only resolved after
+        consistency_threshold of its own matches within vote_window seconds
+        named the same ID, whatever other tracks or cameras matched.
+
+        Parameters
+        ----------
+        track_id : int
+            Track that was recognized
+        identity : str, optional
+            Matched ID, None if the face did not match (no vote)
+        distance : float, optional
+            Match distance
+        timestamp : float
+            Frame time in seconds
+
+        Returns
+        -------
+        bool
+            True if this match resolved the track
+        """
+        with self._lock:
+            track = self.tracks.get(int(track_id))
+            if track is None or identity is None or track.is_resolved:
+                return False
+            if track.voter is None:
+                track.voter = TemporalVoter(self.consistency_threshold, self.vote_window, history_size=32)
+            if not track.voter.observe(identity, timestamp):
+                return False
+            track.identity = identity
+            track.distance = distance
+            return True
+
+    def identities(self, track_ids: np.ndarray) -> List[Optional[str]]:
+        """Cached identity of each track, None for unresolved tracks"""
+        with self._lock:
+            return [self.tracks[int(t)].identity if int(t) in self.tracks else None for t in track_ids]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Active and resolved track counts, and the share of faces sent to recognition
+
+        Returns
+        -------
+        Dict[str, float]
+            tracks, resolved_tracks, faces_seen, recognition_requests and recognition_ratio
+        """
+        with self._lock:
+            resolved = sum(track.is_resolved for track in self.tracks.values())
+            return {
+                "tracks": len(self.tracks),
+                "resolved_tracks": resolved,
+                "faces_seen": self.faces_seen,
+                "recognition_requests": self.recognition_requests,
+                "recognition_ratio": self.recognition_requests / self.faces_seen if self.faces_seen else 0.0
+            }
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    IoU of every pair of boxes
+
+    Parameters
+    ----------
+    boxes_a : numpy.ndarray
+        (N, 4) boxes [x, y, width, height]
+    boxes_b : numpy.ndarray
+        (M, 4) boxes [x, y, width, height]
+
+    Returns
+    -------
+    numpy.ndarray
+        (N, M) IoU matrix
+    """
+    a = np.asarray(boxes_a, dtype=np.float64)[:, None, :]
+    b = np.asarray(boxes_b, dtype=np.float64)[None, :, :]
+    width = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0])
+    height = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1])
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - intersection
+    return intersection / np.maximum(union, 1e-9)
+
+
+def _center_size(box: np.ndarray) -> np.ndarray:
+    x, y, w, h = box[:4]
+    return np.array([x + w / 2, y + h / 2, w, h], dtype=np.float64)
+
+
+def _box_from_center_size(state: np.ndarray) -> np.ndarray:
+    cx, cy, w, h = state[:4]
+    return np.array([cx - w / 2, cy - h / 2, w, h], dtype=np.float64)
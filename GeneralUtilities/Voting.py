@@ -0,0 +1,114 @@
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class TemporalVoter:
+    """
+    Confirms a recognized ID only after several agreeing matches within a time window.
+
+    Matches are kept in a fixed-size ring buffer of (timestamp, ID) with a
+    running vote count per ID. Each observation appends one entry and evicts
+    the expired ones from the front, so updates are O(1) amortized and the
+    memory use does not grow with the session length.
+    """
+
+    def __init__(self,
+                 consistency_threshold: int = 3,
+                 window: float = 10.0,
+                 history_size: int = 256):
+        """
+        Parameters
+        ----------
+        consistency_threshold : int, optional
+            Agreeing matches needed to confirm an ID, by default 3
+        window : float, optional
+            Seconds a match counts as a vote, by default 10.0
+        history_size : int, optional
+            Maximum number of votes kept, older votes are dropped first, by default 256
+        """
+        self.consistency_threshold = consistency_threshold
+        self.window = window
+
+        self.frame_history = deque(maxlen=history_size)  # (timestamp, ID) of the recent matches
+        self.recent_matches: Dict[str, int] = {}          # ID -> votes in frame_history
+        self.last_detection_time: Dict[str, float] = {}   # ID -> time of its newest vote
+        self.confirmed: Dict[str, float] = {}             # ID -> time it was confirmed
+        self._lock = threading.Lock()
+
+    def observe(self, ID: str, timestamp: float) -> bool:
+        """
+        Add one match as a vote
+
+        Parameters
+        ----------
+        ID : str
+            Matched ID
+        timestamp : float
+            Time of the frame the match comes from
+
+        Returns
+        -------
+        bool
+            True if this vote confirmed the ID
+        """
+        with self._lock:
+            self._expire(timestamp)
+
+            # The ring buffer is full, its oldest vote is dropped
+            if len(self.frame_history) == self.frame_history.maxlen:
+                self._remove_vote(self.frame_history.popleft()[1])
+
+            self.frame_history.append((timestamp, ID))
+            self.recent_matches[ID] = self.recent_matches.get(ID, 0) + 1
+            self.last_detection_time[ID] = timestamp
+
+            if ID not in self.confirmed and self.recent_matches[ID] >= self.consistency_threshold:
+                self.confirmed[ID] = timestamp
+                return True
+            return False
+
+    def observe_all(self, IDs: List[Optional[str]], timestamp: float) -> List[str]:
+        """
+        Add the matches of one frame, None entries (no match) are skipped
+
+        An ID matched to several faces of the frame gets a single vote, so a
+        duplicate or false detection cannot confirm it within one or two frames.
+
+        Returns
+        -------
+        List[str]
+            IDs confirmed by these votes
+        """
+        unique_ids = dict.fromkeys(ID for ID in IDs if ID is not None)
+        return [ID for ID in unique_ids if self.observe(ID, timestamp)]
+
+    def is_confirmed(self, ID: str) -> bool:
+        return ID in self.confirmed
+
+    def votes(self, ID: str, timestamp: Optional[float] = None) -> int:
+        """Votes of an ID in the window, expiring old votes first when timestamp is given"""
+        with self._lock:
+            if timestamp is not None:
+                self._expire(timestamp)
+            return self.recent_matches.get(ID, 0)
+
+    def reset(self) -> None:
+        """Forget every vote and confirmation, for a new session"""
+        with self._lock:
+            self.frame_history.clear()
+            self.recent_matches.clear()
+            self.last_detection_time.clear()
+            self.confirmed.clear()
+
+    def _expire(self, timestamp: float) -> None:
+        while self.frame_history and timestamp - self.frame_history[0][0] > self.window:
+            self._remove_vote(self.frame_history.popleft()[1])
+
+    def _remove_vote(self, ID: str) -> None:
+        count = self.recent_matches[ID] - 1
+        if count:
+            self.recent_matches[ID] = count
+        else:
+            del self.recent_matches[ID]
+            del self.last_detection_time[ID]
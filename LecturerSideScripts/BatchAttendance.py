@@ -0,0 +1,81 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from LecturerUtilities.StudentJSON import AttendanceManager
+from GeneralUtilities.Detection import FaceRecognitionSystem
+from GeneralUtilities.BatchProcessing import BatchAttendanceProcessor, process_source_parallel, print_report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Take attendance from a recorded lecture video or a folder of images, without the GUI"
+    )
+    parser.add_argument("input", help="Video file or folder of images")
+    parser.add_argument("--students", required=True, help="Students JSON file saved by the lecturer app")
+    parser.add_argument("--class", dest="class_name", required=True, help="Class to take attendance for")
+    parser.add_argument("--week", type=int, required=True, help="Week number (1-13)")
+    parser.add_argument("--sample-fps", type=float, default=1.0, help="Video frames processed per second of video (0 for every frame)")
+    parser.add_argument("--min-observations", type=int, default=2, help="Matched frames needed to mark a student present")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Match threshold (average cosine distance)")
+    parser.add_argument("--aligner", default="dlib", choices=["dlib", "keypoints"], help="Face aligner, must match enrollment")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each processes its own segments of the recording")
+    parser.add_argument("--segment-seconds", type=float, default=60.0, help="Length of the segments given to the workers (images per segment for folders)")
+    parser.add_argument("--report", help="Write the recognition report to this JSON file")
+    parser.add_argument("--dry-run", action="store_true", help="Report the present students without saving attendance")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    args = parse_args()
+
+    # Students JSON in the AttendanceManager format
+    students_dir, students_file = os.path.split(os.path.abspath(args.students))
+    attendance_manager = AttendanceManager(None, None, local_data_path=students_dir)
+    if attendance_manager.load_local_students(students_file) is None:
+        sys.exit(1)
+
+    face_system = FaceRecognitionSystem(aligner=args.aligner)
+    face_system.match_threshold = args.threshold
+    face_system.load_students_from_json(args.students, args.class_name)
+    if not face_system.face_database:
+        print(f"No students with embeddings found for class {args.class_name}")
+        sys.exit(1)
+
+    if args.workers > 1:
+        # The workers load their own models, the class gallery cache is already written
+        result = process_source_parallel(
+            args.input, args.students, args.class_name,
+            workers=args.workers,
+            sample_fps=args.sample_fps,
+            segment_seconds=args.segment_seconds,
+            min_observations=args.min_observations,
+            threshold=args.threshold,
+            aligner=args.aligner
+        )
+    else:
+        processor = BatchAttendanceProcessor(face_system, min_observations=args.min_observations)
+        result = processor.process_source(args.input, sample_fps=args.sample_fps)
+    print_report(result)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(result, f, indent=4)
+        print(f"Report saved to {args.report}")
+
+    if args.dry_run:
+        return
+
+    students_updated = attendance_manager.mark_attendance(args.class_name, args.week, result["present"])
+    if students_updated > 0:
+        attendance_manager.save_students_locally(students_file)
+    print(f"Attendance updated for {students_updated} students")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from GeneralUtilities.Calibration import load_gallery, score_histograms, error_curves, operating_point, recommend_threshold
+
+# Thresholds listed in the printed table
+TABLE_THRESHOLDS = [0.30, 0.35, 0.40, 0.45, 0.50, 0.55, 0.60, 0.65, 0.70]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Recommend a match threshold from the genuine and impostor distances of an enrolled gallery"
+    )
+    parser.add_argument("gallery", help="Students JSON file, JSON database or binary gallery")
+    parser.add_argument("--class", dest="class_name", help="Only use the students of this class (students JSON only)")
+    parser.add_argument("--target-far", type=float, help="Highest acceptable false accept rate, by default the equal error rate is used")
+    parser.add_argument("--nearest", action="store_true", help="Apply --target-far to the closest impostor of each face instead of every impostor pair")
+    parser.add_argument("--current", type=float, default=0.5, help="Threshold in use, reported for comparison")
+    parser.add_argument("--bin-width", type=float, default=0.001, help="Distance resolution of the curves")
+    parser.add_argument("--block-mb", type=float, default=64.0, help="Memory used by one block of probes, in MB")
+    parser.add_argument("--output", help="Write the summary and the FAR/FRR curves to this JSON file")
+    return parser.parse_args()
+
+
+def print_progress(done, total):
+    print(f"\r  {done}/{total} probes ({100.0 * done / total:.0f}%)", end="", flush=True)
+    if done == total:
+        print()
+
+
+def print_point(label, point):
+    print(f"  {label:>12}: threshold {point['threshold']:.3f}, FAR {100 * point['far']:.4f}%, "
+          f"FRR {100 * point['frr']:.2f}%, nearest impostor FAR {100 * point['nearest_far']:.2f}%")
+
+
+def main():
+    args = parse_args()
+
+    gallery = load_gallery(args.gallery, args.class_name)
+    if len(gallery) < 2:
+        print("Calibration needs at least 2 IDs with embeddings")
+        sys.exit(1)
+    print(f"Scoring {gallery.num_embeddings} embeddings of {len(gallery)} IDs")
+
+    histograms = score_histograms(gallery, args.bin_width, int(args.block_mb * 1e6), progress=print_progress)
+    genuine_count = int(histograms["genuine"].sum())
+    print(f"{genuine_count} genuine and {int(histograms['impostor'].sum())} impostor scores "
+          f"in {histograms['elapsed']:.1f}s")
+    if genuine_count == 0:
+        print("No ID has more than one embedding, genuine scores need at least 2 per ID")
+        sys.exit(1)
+    print(f"Rank-1 errors: {histograms['rank1_errors']} of {genuine_count} probes "
+          f"({100.0 * histograms['rank1_errors'] / genuine_count:.2f}%)")
+
+    curves = error_curves(histograms)
+    recommended = recommend_threshold(curves, args.target_far, args.nearest)
+    current = operating_point(curves, args.current)
+
+    print("Operating points:")
+    for threshold in TABLE_THRESHOLDS:
+        print_point("", operating_point(curves, threshold))
+    print_point("current", current)
+    print_point("recommended", recommended)
+    if "eer" in recommended:
+        print(f"Equal error rate: {100 * recommended['eer']:.2f}%")
+    print(f"Recommended match threshold ({recommended['criterion']}): {recommended['threshold']:.3f}")
+
+    if args.output:
+        report = {
+            "gallery": args.gallery,
+            "class_name": args.class_name,
+            "ids": histograms["ids"],
+            "embeddings": histograms["embeddings"],
+            "genuine_scores": genuine_count,
+            "impostor_scores": int(histograms["impostor"].sum()),
+            "rank1_errors": histograms["rank1_errors"],
+            "elapsed": histograms["elapsed"],
+            "recommended": recommended,
+            "current": current,
+            "curves": {name: values.tolist() for name, values in curves.items()}
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f)
+        print(f"Calibration saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,13 +10,17 @@ import threading
 import pyrebase as pb
 import sys
 import os
-import time
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from GeneralUtilities.UtilityChecks import check_email_valid, check_password_valid
 from LecturerUtilities.StudentJSON import AttendanceManager
 from GeneralUtilities.Detection import FaceRecognitionSystem
+from GeneralUtilities.ModelRegistry import model_registry
+from GeneralUtilities.AdaptiveDetection import AdaptiveFaceDetector
+from GeneralUtilities.CameraDiscovery import CameraCache
+from GeneralUtilities.Pipeline import RecognitionPipeline, draw_faces
+from GeneralUtilities.Scheduling import RecognitionScheduler
 
 firebaseConfig = json.load(open("Credentials/UserCredentials.json","r"))
 class SignInApp:
@@ -87,6 +91,9 @@ class SignInApp:
         # Initialize attendance manager and local data
         self.attendance_manager = None
         
+        # Load and warm up the recognition models in the background so the first detection does not stall
+        threading.Thread(target=model_registry.warm_up, daemon=True).start()
+        
         # Setup intro frame
         self.setup_intro_frame()
         
@@ -534,37 +541,15 @@ class SignInApp:
         """Displays frame for camera selection with available options."""
         self.clear_frames()
 
-        # Reset camera variable
-        self.camera_index = None
-
-        tk.Label(self.camera_frame,background="white", text="Select Camera:", font=("Arial", 12)).grid(row=0, column=0, columnspan=2, pady=10)
-
-        # Get available cameras
-        cameras = []
-        for i in range(10):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                ret, _ = cap.read()
-                if ret:
-                    cameras.append(f"Camera {i}")
-                cap.release()
+        # Reset camera variables
+        self.camera_indices = []
+        self.camera_variables = {}
 
-        if not cameras:
-            messagebox.showerror("Error", "No cameras found")
-            self.show_select_week_frame()
-            return
+        tk.Label(self.camera_frame,background="white", text="Select Cameras:", font=("Arial", 12)).grid(row=0, column=0, columnspan=2, pady=10)
 
-        # Camera selection radio buttons
-        self.camera_variable = tk.StringVar(value=cameras[0])
-        for i, camera in enumerate(cameras):
-            camera_btn = tk.Radiobutton(
-                self.camera_frame, 
-                background="white",
-                text=camera, 
-                variable=self.camera_variable, 
-                value=camera
-            )
-            camera_btn.grid(row=1, column=i, padx=10)
+        # Camera checkboxes, filled from the cache now and again when discovery finishes
+        self.camera_list_frame = tk.Frame(self.camera_frame, background="white")
+        self.camera_list_frame.grid(row=1, column=0, columnspan=2)
 
         # Back and Submit buttons
         back_btn = ttk.Button(
@@ -583,8 +568,55 @@ class SignInApp:
         )
         submit_btn.grid(row=2, column=1, pady=10)
 
+        self.camera_status_label = tk.Label(self.camera_frame, background="white", text="Searching for cameras...", font=("Arial", 9))
+        self.camera_status_label.grid(row=3, column=0, columnspan=2)
+
+        # Show the last known cameras at once, probing the devices can take seconds
+        self.camera_cache = CameraCache(os.path.join(self.json_save_path, ".camera_cache.json"))
+        self.display_camera_list(self.camera_cache.load())
+
         self.camera_frame.pack()
 
+        # Probe the devices in the background, a newer camera screen ignores older results
+        self.camera_discovery_token = getattr(self, 'camera_discovery_token', 0) + 1
+        token = self.camera_discovery_token
+        self.camera_cache.refresh_async(
+            lambda cameras: self.root.after(0, self.on_cameras_discovered, cameras, token)
+        )
+
+    def display_camera_list(self, cameras):
+        """Shows a checkbox per camera, keeping the cameras already selected."""
+        selected = {index for index, var in self.camera_variables.items() if var.get()}
+        self.clear_frame(self.camera_list_frame)
+        self.camera_variables = {}
+
+        for i, camera in enumerate(cameras):
+            index = camera["index"]
+            self.camera_variables[index] = tk.BooleanVar(value=(index in selected or (not selected and i == 0)))
+            camera_btn = tk.Checkbutton(
+                self.camera_list_frame, 
+                background="white",
+                text=f"Camera {index} ({camera['width']}x{camera['height']})", 
+                variable=self.camera_variables[index],
+                onvalue=True,
+                offvalue=False
+            )
+            camera_btn.grid(row=0, column=i, padx=10)
+
+    def on_cameras_discovered(self, cameras, token):
+        """Updates the camera list with the result of the background discovery."""
+        # The camera screen was left or opened again since this discovery started
+        if token != self.camera_discovery_token or not self.camera_frame.winfo_manager():
+            return
+
+        if not cameras:
+            messagebox.showerror("Error", "No cameras found")
+            self.show_select_week_frame()
+            return
+
+        self.display_camera_list(cameras)
+        self.camera_status_label.config(text=f"{len(cameras)} camera(s) found")
+
     def show_detection_frame(self):
         """Shows frame with student detection log while camera feeds runs in separate window."""
         self.clear_frames()
@@ -664,65 +696,76 @@ class SignInApp:
         self.camera_thread.start()
 
     def run_detection(self):
-        """Run face detection and recognition with bounding boxes."""
-        # Initialize camera
-        cap = cv2.VideoCapture(self.camera_index)
-        if not cap.isOpened():
+        """Run face detection and recognition with bounding boxes on every selected camera."""
+        # Initialize cameras
+        captures = {}
+        for camera_index in self.camera_indices:
+            cap = cv2.VideoCapture(camera_index)
+            if not cap.isOpened():
+                print(f"Failed to open camera {camera_index}")
+                continue
+
+            # Set camera properties
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            captures[camera_index] = cap
+
+        if not captures:
             messagebox.showerror("Error", "Failed to open camera. Please check camera connection.")
             return
     
-        # Set camera properties
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    
-        # Initialize variables
-        face_system = self.face_system
+        # Capture, detection and recognition run on their own threads, 
+        # so the preview is never blocked by recognition.
+        # Every camera has its own capture and detection threads, the recognition stages
+        # and the gallery are shared and all recognitions go to one detected_students set
         self.detected_students = set()
-        last_detection_time = time.time()
-        detection_interval = 5.0  # Detection performed every 5 seconds
+        self.face_system.voter.reset()
         
-        # Main processing loop
-        while self.detection_active:
-            ret, frame = cap.read()
-            if not ret:
-                print("Failed to grab frame")
-                break
-            
-            display_frame = frame.copy()  # Create a copy for display purposes
-            current_time = time.time()
-            
-            # Detect faces in every frame for drawing bounding boxes
-            faces = face_system.detect_faces(frame)
-            
-            # Draw bounding boxes for all detected faces
-            if faces is not None:
-                for face in faces:
-                    # Extract face coordinates
-                    x, y, w, h = face[:4]  # First 4 elements should be bounding box coordinates
-                    
-                    # Draw rectangle around face
-                    cv2.rectangle(display_frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+        # Match and quality decisions of the session, written in the background for threshold tuning
+        self.face_system.trace.start_writer(os.path.join(self.json_save_path, "traces", "decisions.jsonl"))
+        pipeline = RecognitionPipeline(self.face_system, on_recognized=self.process_recognized_students)
+        for i, (camera_index, cap) in enumerate(captures.items()):
+            # Cameras detect concurrently, so each camera after the first gets its own YuNet instance
+            frame_detector = None if i == 0 else model_registry.create_face_detector(self.face_system.model_path)
+            pipeline.add_camera(
+                camera_index,
+                cap,
+                scheduler=RecognitionScheduler(max_passes_per_second=4.0),  # Recognition CPU budget
+                detector=AdaptiveFaceDetector(self.face_system, frame_detector=frame_detector)  # Reduced-scale detection around tracked faces
+            )
+        self.pipeline = pipeline.start()
+        
+        # Preview loop, one window per camera
+        last_indices = {camera_index: -1 for camera_index in captures}
+        while self.detection_active and pipeline.is_running:
+            previews = pipeline.next_previews(last_indices)
+            for camera_index, packet in previews.items():
+                last_indices[camera_index] = packet["index"]
             
-            # Perform recognition only every 5 seconds
-            if current_time - last_detection_time >= detection_interval:
-                # Process frame for recognition
-                _, recognized_ids = face_system.process_frame(frame)
-                last_detection_time = current_time
-                
-                # Update UI with newly detected students
-                self.process_recognized_students(recognized_ids)
-                    
-            # Display frame with bounding boxes
-            cv2.imshow('Camera Feed', display_frame)
+                # Display frame with bounding boxes labelled with the recognized students
+                labels = [self.student_label(student_id) for student_id in packet["identities"]]
+                cv2.imshow(f'Camera {camera_index}', draw_faces(packet["frame"], packet["faces"], labels, in_place=not packet["frame_in_use"]))
             
             # Check for quit command
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
             
         # Clean up
-        cap.release()
+        pipeline.stop()
+        pipeline.print_stats()
+        self.face_system.metrics.print_stats()
+        self.face_system.trace.stop_writer()
+        for cap in captures.values():
+            cap.release()
         cv2.destroyAllWindows()
     
+    def student_label(self, student_id):
+        """Name shown above a recognized face, None for unrecognized faces."""
+        if student_id is None:
+            return None
+        student = self.local_data['students'][self.study_type][self.branch_type].get(student_id)
+        return student['name'] if student else student_id
+
     def process_recognized_students(self, recognized_ids):
         """Process recognized student IDs and update UI."""
         for student_id in recognized_ids:
@@ -818,8 +861,10 @@ class SignInApp:
 
     def on_submit_camera(self):
         """Handles camera selection and starts detection."""
-        camera_str = self.camera_variable.get()
-        self.camera_index = int(camera_str.split()[-1])
+        self.camera_indices = [index for index, var in self.camera_variables.items() if var.get()]
+        if not self.camera_indices:
+            messagebox.showerror("Error", "Please select at least one camera")
+            return
         self.show_detection_frame()
 
     def show_attendance_frame(self):
@@ -1081,8 +1126,10 @@ class SignInApp:
         '''
         Handles the submission of camera selection.
         '''
-        camera_str = self.camera_variable.get()
-        self.camera_index = int(camera_str.split()[-1])
+        self.camera_indices = [index for index, var in self.camera_variables.items() if var.get()]
+        if not self.camera_indices:
+            messagebox.showerror("Error", "Please select at least one camera")
+            return
 
         # Proceed to the attendance frame
         self.show_detection_frame()
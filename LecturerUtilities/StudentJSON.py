@@ -3,6 +3,8 @@ import logging
 import os
 import stat
 
+from GeneralUtilities.ClassCache import refresh_sources
+
 class AttendanceManager:
     def __init__(self, database, lecturer_id, lecturer_token=None, local_data_path=None):
         """
@@ -141,6 +143,10 @@ class AttendanceManager:
         
         except Exception as e:
             logging.error(f"Failed to save students locally: {e}")
+            return
+
+        # Attendance updates leave the embeddings alone, keep the compiled class galleries valid
+        refresh_sources(full_filepath, self.local_students)
 
     def load_local_students(self, filename="Students.json"):
         """
@@ -178,6 +184,48 @@ class AttendanceManager:
             logging.error(f"Failed to load local students: {e}")
             return None
         
+    def mark_attendance(self, class_name, week, student_ids):
+        """
+        Mark students present for one week of a class in the local students data
+
+        Args:
+            class_name (str): Class to mark attendance for
+            week (int): Week number, starting at 1
+            student_ids (iterable): IDs of the students that attended
+
+        Returns:
+            int: Number of students marked present
+        """
+        if self.local_students is None:
+            raise ValueError("No students loaded. Call fetch_students() or load_local_students() first.")
+
+        # Index every student once, students are grouped by study type and branch
+        all_students = {}
+        for branches in self.local_students["students"].values():
+            for branch_students in branches.values():
+                all_students.update(branch_students)
+
+        students_updated = 0
+        for student_id in student_ids:
+            student_info = all_students.get(student_id)
+            if student_info is None:
+                logging.warning(f"Student {student_id} not found in local data")
+                continue
+
+            attendance = student_info.get("classes", {}).get(class_name)
+            if attendance is None:
+                logging.warning(f"Class {class_name} not found for student {student_id}")
+                continue
+            if not 1 <= week <= len(attendance):
+                logging.warning(f"Week {week} out of range for student {student_id}")
+                continue
+
+            attendance[week - 1] = 1
+            students_updated += 1
+
+        logging.info(f"Marked {students_updated} students present for {class_name} week {week}")
+        return students_updated
+
     def upload_local_students(self):
         """
         Upload local students data to Firebase